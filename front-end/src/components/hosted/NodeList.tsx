@@ -14,8 +14,7 @@ export default function NodeList(){
         error: nodeError,
         isLoading: nodesLoading
     } = useFetchNodesQuery(user?.id, {
-        skip: !user?.id,
-        pollingInterval: 15000
+        skip: !user?.id
     });
 
     if(!isSignedIn) return null
@@ -37,8 +36,17 @@ export default function NodeList(){
                     <p className='mb-1 text-gray-500 text-xs'>{node.nodeId}</p>
                     <p className='mb-3 text-gray-700 text-xs'>Node Status: {node.status}</p>
                     <p className='my-1 text-gray-700 text-xs'>Model Status: {node.modelStatus || 'idle'}</p>
+                    {node.downloadProgress && (
+                        <p className='my-1 text-gray-700 text-xs'>Downloaded: {node.downloadProgress}%</p>
+                    )}
                     <p className='my-1 text-gray-700 text-xs'>Model Name: {node.activeModelName}</p>
                     <p className='my-1 text-gray-700 text-xs'>Model Id: {node.activeModelId}</p>
+                    {node.qualified === 'false' && (
+                        <p className='my-1 text-red-500 text-xs'>Below minimum performance for this model</p>
+                    )}
+                    {node.pendingModelStatus && (
+                        <p className='my-1 text-gray-700 text-xs'>Swapping to: {node.pendingModelName} ({node.pendingModelStatus})</p>
+                    )}
                 </div>
             );
         });
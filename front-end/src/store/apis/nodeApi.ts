@@ -1,9 +1,12 @@
 import { createApi, fetchBaseQuery } from '@reduxjs/toolkit/query/react';
+import { NodeModel } from '../../types';
+
+const baseUrl = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
 const nodeApi = createApi({
     reducerPath: 'node',
     baseQuery: fetchBaseQuery({
-        baseUrl: import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000'
+        baseUrl
     }),
     tagTypes: ['node'],
     endpoints (build){
@@ -29,7 +32,48 @@ const nodeApi = createApi({
                         method: 'GET'
                     }
                 },
-                providesTags: ['node']
+                providesTags: ['node'],
+                // Apply node status changes pushed by the router instead of polling
+                async onCacheEntryAdded(userId, { updateCachedData, cacheDataLoaded, cacheEntryRemoved, dispatch }) {
+                    const events = new EventSource(
+                        `${baseUrl}/user/me/nodes/events?userId=${encodeURIComponent(userId)}`
+                    );
+                    try {
+                        await cacheDataLoaded;
+
+                        events.addEventListener('node', (message) => {
+                            const { nodeId, fields } = JSON.parse(message.data);
+                            let known = false;
+                            updateCachedData((draft) => {
+                                const node = Array.isArray(draft)
+                                    ? draft.find((n: NodeModel) => n.nodeId === nodeId)
+                                    : undefined;
+                                if (node) {
+                                    Object.assign(node, fields);
+                                    known = true;
+                                }
+                            });
+                            if (!known) {
+                                dispatch(nodeApi.util.invalidateTags(['node']));
+                            }
+                        });
+                        events.addEventListener('resync', () => {
+                            dispatch(nodeApi.util.invalidateTags(['node']));
+                        });
+                        // The browser reconnects on its own; refetch anything missed meanwhile
+                        let connected = events.readyState === EventSource.OPEN;
+                        events.addEventListener('open', () => {
+                            if (connected) {
+                                dispatch(nodeApi.util.invalidateTags(['node']));
+                            }
+                            connected = true;
+                        });
+                    } catch {
+                        // cacheEntryRemoved resolved before cacheDataLoaded
+                    }
+                    await cacheEntryRemoved;
+                    events.close();
+                }
             }),
             assignModelToNode: build.mutation({
                 query: ({userId, nodeId, modelId}) => ({
@@ -41,7 +41,12 @@ export interface NodeModel {
     nodeUrl: string,
     activeModelId?: string,
     modelStatus?: string,
-    activeModelName?: string
+    activeModelName?: string,
+    pendingModelId?: string,
+    pendingModelName?: string,
+    pendingModelStatus?: string,
+    qualified?: string,
+    downloadProgress?: string
 }
 
 // Redux State interface
@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+
+from memory import gpu_memory, system_memory
+
+# Share of free memory the KV cache of admitted requests may use
+BUDGET_MEMORY_FRACTION = float(os.getenv("NODE_TOKEN_BUDGET_MEMORY_FRACTION", "0.8"))
+
+# Budget used when it can't be derived from the model and memory
+DEFAULT_TOKEN_BUDGET = 8192
+
+
+class TokenBudget:
+    """
+    Tracks committed work (prompt tokens + max new tokens of every admitted
+    request) against a fixed token capacity.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.committed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> int:
+        with self._lock:
+            return self.capacity - self.committed
+
+    def try_reserve(self, tokens: int) -> bool:
+        with self._lock:
+            if self.committed + tokens > self.capacity:
+                return False
+            self.committed += tokens
+            return True
+
+    def release(self, tokens: int):
+        with self._lock:
+            self.committed = max(self.committed - tokens, 0)
+
+    def resize(self, capacity: int):
+        """Change the capacity; work already committed stays committed"""
+        with self._lock:
+            self.capacity = capacity
+
+def available_memory_bytes(device: str) -> int:
+    """
+    Memory free for the KV cache after the model is loaded: free GPU memory
+    across the visible devices on CUDA, otherwise RAM within the container's
+    limit. The same numbers /memory reports to the router's fit check.
+    """
+    memory = gpu_memory() if device == "cuda" else system_memory()
+    return memory[1] if memory else 0
+
+def derive_token_budget(backend) -> int:
+    """
+    NODE_TOKEN_BUDGET if set, otherwise the number of KV cache tokens that fit
+    in the configured share of free memory.
+    """
+    if os.getenv("NODE_TOKEN_BUDGET"):
+        return int(os.getenv("NODE_TOKEN_BUDGET"))
+
+    fixed_budget = backend.fixed_token_budget()
+    if fixed_budget:
+        return fixed_budget
+
+    bytes_per_token = backend.kv_cache_bytes_per_token()
+    free_memory = available_memory_bytes(backend.device)
+    if not bytes_per_token or not free_memory:
+        logging.warning(f"Could not derive a token budget, using {DEFAULT_TOKEN_BUDGET}")
+        return DEFAULT_TOKEN_BUDGET
+
+    budget = int(free_memory * BUDGET_MEMORY_FRACTION / bytes_per_token)
+    logging.info(
+        f"Token budget: {budget} tokens ({bytes_per_token} KV bytes/token, "
+        f"{free_memory / 1024 ** 3:.1f} GiB free)"
+    )
+    return budget
+
+def estimate_wait_seconds(tokens_needed: int, available: int, tokens_per_second: float) -> int:
+    """Rough time until enough committed work completes to admit a request"""
+    shortfall = max(tokens_needed - available, 0)
+    return max(int(shortfall / max(tokens_per_second, 1.0)) + 1, 1)
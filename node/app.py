@@ -3,10 +3,11 @@
 from fastapi.responses import JSONResponse
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import uvicorn
 import logging
 import ipaddress
-import torch #type: ignore
+import threading
 import uuid
 from dotenv import load_dotenv #type: ignore
 from pathlib import Path
@@ -19,6 +20,9 @@ load_dotenv(env_path)
 import routers.setup as setup
 import routers.info as info
 import routers.generate as generate
+import routers.benchmark as benchmark
+import routers.drain as drain
+import routers.profile as profile
 from utils import get_node_api_key
 
 # Configure logging
@@ -30,8 +34,16 @@ logging.basicConfig(
     ]
 )
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Uvicorn has installed its signal handlers by now; wrap SIGTERM with a drain
+    drain.install_sigterm_handler()
+    yield
+    # Covers shutdowns that didn't go through SIGTERM; a no-op after a drain
+    drain.drain_node(timeout=0)
+
 # Initialize FastAPI app
-app = FastAPI(title="Node", version="1.0.0")
+app = FastAPI(title="Node", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -46,11 +58,30 @@ app.add_middleware(
 app.include_router(setup.router)
 app.include_router(info.router)
 app.include_router(generate.router)
+app.include_router(benchmark.router)
+app.include_router(drain.router)
+app.include_router(profile.router)
 
 # Global state
 loaded_model = {}
 node_id = str(uuid.uuid4())
 
+# None while serving, "draining" while in-flight work finishes, "offline" once drained
+drain_state = None
+
+# Held while a loaded model is made active and while a drain starts, so a load
+# that finishes during a drain can't put the node back into rotation
+activation_lock = threading.Lock()
+
+# Model being loaded in the background by an assignment, until it is made
+# active or fails. Set and cleared under activation_lock; one load runs at a time
+loading_model_id = None
+
+# Inference device, detected once by get_device(). torch and transformers are
+# imported lazily so the control endpoints answer as soon as the process starts
+device = None
+device_lock = threading.Lock()
+
 # API Key Authentication Middleware
 @app.middleware("http")
 async def verify_api_key(request: Request, call_next):
@@ -60,8 +91,8 @@ async def verify_api_key(request: Request, call_next):
         response = await call_next(request)
         return response
 
-    # Setup endpoints - localhost only, no API key required
-    if request.url.path.startswith("/setup"):
+    # Setup and drain endpoints - localhost only, no API key required
+    if request.url.path.startswith("/setup") or request.url.path == "/drain":
         client_host = request.client.host if request.client else None
         logging.info(client_host)
         try:
@@ -96,11 +127,23 @@ async def verify_api_key(request: Request, call_next):
     return response
 
 def get_device():
-    if torch.cuda.is_available() and torch.cuda.device_count() > 0:
-        return "cuda"
-    if torch.backends.mps.is_available():
-        return "mps"
-    return "cpu"
+    """Detect the inference device. Imports torch on the first call, so call it off the event loop"""
+    global device
+    with device_lock:
+        if device is None:
+            import torch #type: ignore
+            if torch.cuda.is_available() and torch.cuda.device_count() > 0:
+                device = "cuda"
+            elif torch.backends.mps.is_available():
+                device = "mps"
+            else:
+                device = "cpu"
+    return device
+
+def start_device_detection():
+    """Detect the device (and import torch) in a background thread if it isn't known yet"""
+    if device is None and not device_lock.locked():
+        threading.Thread(target=get_device, name="device-detection", daemon=True).start()
 
 if __name__ == "__main__":
     # For local development
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from backends.base import InferenceBackend
+
+DEFAULT_BACKEND = "transformers"
+
+def create_backend(name: Optional[str], device: str, **options) -> InferenceBackend:
+    """
+    Create an inference backend by name. Raises ValueError if the backend is
+    unknown or the options are unsupported on this device.
+    """
+    name = name or DEFAULT_BACKEND
+
+    if name == "transformers":
+        from backends.transformers_backend import TransformersBackend
+        return TransformersBackend(
+            device,
+            quantization=options.get("quantization"),
+            draft_model_name=options.get("draft_model_name")
+        )
+
+    if name == "llama.cpp":
+        from backends.llamacpp_backend import LlamaCppBackend
+        if options.get("quantization"):
+            raise ValueError("Quantization profiles don't apply to llama.cpp; choose a quantized GGUF file instead")
+        if options.get("draft_model_name"):
+            raise ValueError("Draft models are only supported by the transformers backend")
+        return LlamaCppBackend(device, gguf_file=options.get("gguf_file"))
+
+    raise ValueError(f"Unknown backend '{name}'. Supported: transformers, llama.cpp")
@@ -0,0 +1,136 @@
+import resource
+import sys
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+# Filler text used to build benchmark prompts of a given token length
+BENCHMARK_FILLER = "The quick brown fox jumps over the lazy dog while the router balances requests. "
+
+def peak_rss_bytes() -> int:
+    """Peak resident memory of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class GenerationResult:
+    """Output of one generate call"""
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    # "stop" for a stop sequence or end of sequence token, "length" for max_new_tokens
+    finish_reason: str
+
+def truncate_at_stop(text: str, stop: Optional[list]) -> tuple[str, bool]:
+    """Cut text before the earliest stop sequence. Returns the text and whether one was found"""
+    positions = [text.find(sequence) for sequence in stop or [] if sequence]
+    positions = [position for position in positions if position != -1]
+    if not positions:
+        return text, False
+    return text[:min(positions)], True
+
+
+class InferenceBackend(ABC):
+    """
+    An inference engine that can load one model and generate text with it.
+    Instances are stored in app.loaded_model["backend"] and used by /generate.
+    """
+
+    name = ""
+
+    def __init__(self, device: str):
+        self.device = device
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._generated_tokens = 0
+        self._generation_seconds = 0.0
+        self._early_stops = 0
+        self._decode_steps_saved = 0
+
+    def download_patterns(self) -> Optional[list]:
+        """File patterns to download from the model repo, or None for everything"""
+        return None
+
+    @abstractmethod
+    def load(self, model_name: str, model_path: str):
+        """Load the model. model_path is the local download directory"""
+
+    @abstractmethod
+    def generate(
+            self,
+            prompt: str,
+            max_new_tokens: int,
+            temperature: float,
+            do_sample: bool,
+            stop: Optional[list] = None
+        ) -> GenerationResult:
+        """
+        Generate a completion for prompt, excluding the prompt itself. Decoding
+        halts at end of sequence or at the first stop sequence, which is not
+        included in the text.
+        """
+
+    @abstractmethod
+    def memory_footprint(self) -> int:
+        """Bytes held by the loaded model's weights"""
+
+    @abstractmethod
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens the model's tokenizer produces for text"""
+
+    def kv_cache_bytes_per_token(self) -> int:
+        """KV cache memory one token of context needs, or 0 if unknown"""
+        return 0
+
+    def fixed_token_budget(self) -> Optional[int]:
+        """Token capacity for backends that preallocate their context, otherwise None"""
+        return None
+
+    @abstractmethod
+    def benchmark(self, prompt_tokens: int, decode_tokens: int, batch_sizes: list) -> dict:
+        """
+        Measure the loaded model. Returns prefillTokensPerSecond, ttftMs,
+        decodeTokensPerSecond keyed by batch size, and peakMemoryBytes.
+        """
+
+    def warmup(self):
+        """Run one short generation so the first real request doesn't pay for lazy initialization"""
+        self.generate("Hello", max_new_tokens=8, temperature=1.0, do_sample=False)
+        self.reset_stats()
+
+    def record_generation(self, generated_tokens: int, seconds: float, max_new_tokens: int = 0):
+        with self._stats_lock:
+            self._requests += 1
+            self._generated_tokens += generated_tokens
+            self._generation_seconds += seconds
+            # Decode steps not spent because generation ended before max_new_tokens
+            if max_new_tokens > generated_tokens:
+                self._early_stops += 1
+                self._decode_steps_saved += max_new_tokens - generated_tokens
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._requests = 0
+            self._generated_tokens = 0
+            self._generation_seconds = 0.0
+            self._early_stops = 0
+            self._decode_steps_saved = 0
+
+    def generation_stats(self) -> dict:
+        """Totals since the model was loaded"""
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "generatedTokens": self._generated_tokens,
+                "tokensPerSecond": round(self._generated_tokens / self._generation_seconds, 2)
+                    if self._generation_seconds else 0.0,
+                "earlyStops": self._early_stops,
+                "decodeStepsSaved": self._decode_steps_saved
+            }
+
+    def describe(self) -> dict:
+        """Backend details reported through /info"""
+        return {"name": self.name, "stats": self.generation_stats()}
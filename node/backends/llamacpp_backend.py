@@ -0,0 +1,134 @@
+import fnmatch
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from backends.base import InferenceBackend, GenerationResult, BENCHMARK_FILLER, peak_rss_bytes
+from cpu_profile import pin_cpu_affinity, cpu_thread_count
+
+# Used when an assignment doesn't name a GGUF file: a good size/quality default
+DEFAULT_GGUF_PATTERN = "*Q4_K_M.gguf"
+
+
+class LlamaCppBackend(InferenceBackend):
+    """Quantized GGUF models through the llama.cpp Python binding"""
+
+    name = "llama.cpp"
+
+    def __init__(self, device: str, gguf_file: Optional[str] = None):
+        super().__init__(device)
+        try:
+            import llama_cpp #type: ignore # noqa: F401
+        except ImportError:
+            raise ValueError("The llama.cpp backend requires llama-cpp-python to be installed")
+        self.gguf_pattern = gguf_file or DEFAULT_GGUF_PATTERN
+        self.gguf_path = None
+        self.llm = None
+        # A Llama instance isn't thread-safe; generations run one at a time
+        self.llm_lock = threading.Lock()
+
+    def download_patterns(self) -> Optional[list]:
+        return [self.gguf_pattern]
+
+    def find_gguf_file(self, model_path: str) -> str:
+        """Resolve the GGUF pattern against the downloaded files, case-insensitively"""
+        pattern = self.gguf_pattern.lower()
+        for root, _, files in os.walk(model_path):
+            for file_name in sorted(files):
+                if fnmatch.fnmatch(file_name.lower(), pattern):
+                    return os.path.join(root, file_name)
+        raise FileNotFoundError(f"No GGUF file matching '{self.gguf_pattern}' in {model_path}")
+
+    def load(self, model_name: str, model_path: str):
+        from llama_cpp import Llama #type: ignore
+
+        self.gguf_path = self.find_gguf_file(model_path)
+        pin_cpu_affinity()
+        n_threads = cpu_thread_count()
+        logging.info(f"Loading {self.gguf_path} with llama.cpp on {n_threads} threads...")
+
+        self.llm = Llama(
+            model_path=self.gguf_path,
+            n_ctx=int(os.getenv("LLAMA_CPP_N_CTX", "4096")),
+            n_threads=n_threads,
+            # Map the GGUF read-only so node containers on the host share its pages
+            use_mmap=True,
+            # Offload every layer when a GPU build of llama.cpp is available
+            n_gpu_layers=-1 if self.device == "cuda" else 0,
+            verbose=False
+        )
+
+    def generate(
+            self,
+            prompt: str,
+            max_new_tokens: int,
+            temperature: float,
+            do_sample: bool,
+            stop: Optional[list] = None
+        ) -> GenerationResult:
+        with self.llm_lock:
+            start = time.perf_counter()
+            # llama.cpp checks stop sequences incrementally and leaves them out of the text
+            output = self.llm(
+                prompt,
+                max_tokens=max_new_tokens,
+                temperature=temperature if do_sample else 0.0,
+                stop=[sequence for sequence in stop or [] if sequence]
+            )
+        usage = output["usage"]
+        self.record_generation(usage["completion_tokens"], time.perf_counter() - start, max_new_tokens)
+
+        choice = output["choices"][0]
+        return GenerationResult(
+            text=choice["text"],
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            finish_reason=choice["finish_reason"] or "length"
+        )
+
+    def benchmark(self, prompt_tokens: int, decode_tokens: int, batch_sizes: list) -> dict:
+        """llama.cpp serves one sequence at a time, so only batch size 1 is measured"""
+        with self.llm_lock:
+            return self._benchmark(prompt_tokens, decode_tokens)
+
+    def _benchmark(self, prompt_tokens: int, decode_tokens: int) -> dict:
+        tokens = self.llm.tokenize((BENCHMARK_FILLER * prompt_tokens).encode(), add_bos=False)[:prompt_tokens]
+        prompt = self.llm.detokenize(tokens).decode(errors="ignore")
+
+        # Reset between runs so the cached prompt prefix isn't reused
+        self.llm.reset()
+        start = time.perf_counter()
+        self.llm(prompt, max_tokens=1, temperature=0.0)
+        ttft_seconds = time.perf_counter() - start
+
+        self.llm.reset()
+        start = time.perf_counter()
+        output = self.llm(prompt, max_tokens=decode_tokens, temperature=0.0)
+        total = time.perf_counter() - start
+        generated = output["usage"]["completion_tokens"]
+        decode_seconds = max(total - ttft_seconds, 1e-9)
+
+        return {
+            # Time to first token is dominated by prompt evaluation
+            "prefillTokensPerSecond": round(len(tokens) / ttft_seconds, 2),
+            "ttftMs": round(ttft_seconds * 1000, 1),
+            "decodeTokensPerSecond": {"1": round(max(generated - 1, 0) / decode_seconds, 2)},
+            "peakMemoryBytes": peak_rss_bytes()
+        }
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode(), add_bos=False))
+
+    def fixed_token_budget(self) -> Optional[int]:
+        # The context is allocated up front and requests take turns using it,
+        # so admit enough work for a short queue of full-context requests
+        return self.llm.n_ctx() * int(os.getenv("LLAMA_CPP_MAX_QUEUED", "4"))
+
+    def memory_footprint(self) -> int:
+        # Weights are memory-mapped straight from the GGUF file
+        return os.path.getsize(self.gguf_path) if self.gguf_path else 0
+
+    def describe(self) -> dict:
+        return {**super().describe(), "ggufFile": os.path.basename(self.gguf_path) if self.gguf_path else ""}
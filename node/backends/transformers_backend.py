@@ -0,0 +1,326 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+import torch #type: ignore
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
+
+from backends.base import InferenceBackend, GenerationResult, BENCHMARK_FILLER, peak_rss_bytes, truncate_at_stop
+from cpu_profile import configure_cpu_threads, select_cpu_dtype, maybe_compile
+from quantization import (
+    validate_quantization, quantization_load_kwargs, apply_post_load_quantization, model_memory_footprint
+)
+
+
+class ForwardCounter:
+    """
+    Counts forward passes of a module per thread, so concurrent generations
+    each see only their own calls.
+    """
+
+    def __init__(self, module):
+        self._local = threading.local()
+        self.handle = module.register_forward_hook(self._hook)
+
+    def _hook(self, module, args, output):
+        self._local.count = self.count + 1
+
+    @property
+    def count(self) -> int:
+        return getattr(self._local, "count", 0)
+
+
+class StopSequenceCriteria(StoppingCriteria):
+    """
+    Stops generation once the output contains a stop sequence. Each step only
+    decodes the tokens added since the last check plus a window long enough to
+    hold a stop sequence, so the cost per step doesn't grow with output length.
+    """
+
+    def __init__(self, tokenizer, stop: list, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.stop = stop
+        self.prompt_length = prompt_length
+        self.checked_length = prompt_length
+        longest = max(len(tokenizer(sequence, add_special_tokens=False)["input_ids"]) for sequence in stop)
+        # Tokens can merge differently in context, so leave a margin
+        self.window = longest + 4
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # Assisted generation may append several tokens per step
+        start = max(self.prompt_length, self.checked_length - self.window)
+        self.checked_length = input_ids.shape[1]
+        tail = self.tokenizer.decode(input_ids[0, start:], skip_special_tokens=True)
+        done = any(sequence in tail for sequence in self.stop)
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+
+class TransformersBackend(InferenceBackend):
+    """Hugging Face transformers models, with optional speculative decoding from a draft model"""
+
+    name = "transformers"
+
+    def __init__(self, device: str, quantization: Optional[str] = None, draft_model_name: Optional[str] = None):
+        super().__init__(device)
+        validate_quantization(quantization, device)
+        self.quantization = quantization
+        self.draft_model_name = draft_model_name
+        self.model = None
+        self.tokenizer = None
+        self.draft_model = None
+        self.draft_status = "disabled"
+        self._target_steps = 0
+        self._draft_tokens = 0
+        self._accepted_tokens = 0
+
+    def device_load_kwargs(self) -> dict:
+        """from_pretrained kwargs for this device, before quantization"""
+        if self.device == "cuda":
+            return {
+                "torch_dtype": torch.float16,
+                "device_map": "auto",
+                "low_cpu_mem_usage": True
+            }
+        if self.device == "mps":
+            return {
+                "torch_dtype": torch.float16,
+                "device_map": "auto"
+            }
+        return {
+            "dtype": select_cpu_dtype(),
+            "low_cpu_mem_usage": True,
+            "device_map": "auto"
+        }
+
+    def load(self, model_name: str, model_path: str):
+        # Load from the store snapshot; safetensors weights are memory-mapped from its
+        # read-only files, so containers on the host share them in the page cache
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+        # Quantization overrides the default fp16 weights where requested
+        quantization_kwargs = quantization_load_kwargs(self.quantization)
+        if self.quantization:
+            logging.info(f"Using quantization profile: {self.quantization}")
+
+        # Load model with device-specific optimizations
+        if self.device == "cpu":
+            logging.info("Loading model for CPU...")
+            configure_cpu_threads()
+        else:
+            logging.info(f"Loading model with {self.device.upper()} optimizations...")
+
+        load_kwargs = self.device_load_kwargs()
+        load_kwargs.update(quantization_kwargs)
+        model = AutoModelForCausalLM.from_pretrained(model_path, **load_kwargs)
+        model = apply_post_load_quantization(model, self.quantization)
+        if self.device == "cpu":
+            model = maybe_compile(model)
+
+        self.model = model
+        self.target_counter = ForwardCounter(model)
+        logging.info(f"Model device: {model.device}")
+
+        if self.draft_model_name:
+            self.load_draft_model()
+
+    def load_draft_model(self):
+        """
+        Load the draft model for speculative decoding. Generation falls back to
+        plain decoding if it can't be loaded or doesn't share the target's tokenizer.
+        """
+        logging.info(f"Loading draft model {self.draft_model_name}...")
+        try:
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_name)
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                self.draft_status = "incompatible tokenizer"
+                logging.warning(
+                    f"Draft model {self.draft_model_name} doesn't share the target tokenizer, "
+                    f"speculative decoding disabled"
+                )
+                return
+
+            self.draft_model = AutoModelForCausalLM.from_pretrained(
+                self.draft_model_name,
+                **self.device_load_kwargs()
+            )
+            self.draft_counter = ForwardCounter(self.draft_model)
+            self.draft_status = "active"
+        except Exception as e:
+            self.draft_model = None
+            self.draft_status = "failed to load"
+            logging.warning(f"Failed to load draft model {self.draft_model_name}, speculative decoding disabled: {e}")
+
+    def generate(
+            self,
+            prompt: str,
+            max_new_tokens: int,
+            temperature: float,
+            do_sample: bool,
+            stop: Optional[list] = None
+        ) -> GenerationResult:
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+        prompt_length = inputs["input_ids"].shape[1]
+
+        generate_kwargs = {
+            "max_new_tokens": max_new_tokens,
+            "do_sample": do_sample,
+            "pad_token_id": self.tokenizer.eos_token_id
+        }
+        if do_sample:
+            generate_kwargs["temperature"] = temperature
+        # An empty stop string would match at every step
+        stop = [sequence for sequence in stop or [] if sequence]
+        if stop:
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList([
+                StopSequenceCriteria(self.tokenizer, stop, prompt_length)
+            ])
+        if self.draft_model is not None:
+            generate_kwargs["assistant_model"] = self.draft_model
+            target_steps_before = self.target_counter.count
+            draft_tokens_before = self.draft_counter.count
+
+        start = time.perf_counter()
+        with torch.inference_mode():
+            output = self.model.generate(**inputs, **generate_kwargs)
+        elapsed = time.perf_counter() - start
+
+        new_tokens = output[0, prompt_length:]
+        self.record_generation(len(new_tokens), elapsed, max_new_tokens)
+        if self.draft_model is not None:
+            self.record_speculation(
+                len(new_tokens),
+                self.target_counter.count - target_steps_before,
+                self.draft_counter.count - draft_tokens_before
+            )
+
+        text, stopped = truncate_at_stop(self.tokenizer.decode(new_tokens, skip_special_tokens=True), stop)
+        ended_with_eos = len(new_tokens) > 0 and int(new_tokens[-1]) in self.eos_token_ids()
+
+        return GenerationResult(
+            text=text,
+            prompt_tokens=prompt_length,
+            completion_tokens=len(new_tokens),
+            finish_reason="stop" if stopped or ended_with_eos else "length"
+        )
+
+    def eos_token_ids(self) -> set:
+        eos_token_id = self.model.generation_config.eos_token_id
+        if eos_token_id is None:
+            eos_token_id = self.tokenizer.eos_token_id
+        if isinstance(eos_token_id, int):
+            return {eos_token_id}
+        return set(eos_token_id or [])
+
+    def record_speculation(self, generated_tokens: int, target_steps: int, draft_tokens: int):
+        """
+        Each target forward pass verifies the draft's candidates and adds one token
+        of its own, so accepted draft tokens = generated tokens - target steps.
+        """
+        with self._stats_lock:
+            self._target_steps += target_steps
+            self._draft_tokens += draft_tokens
+            self._accepted_tokens += max(generated_tokens - target_steps, 0)
+
+    def reset_stats(self):
+        super().reset_stats()
+        with self._stats_lock:
+            self._target_steps = 0
+            self._draft_tokens = 0
+            self._accepted_tokens = 0
+
+    def speculation_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "draftModel": self.draft_model_name or "",
+                "status": self.draft_status,
+                "acceptanceRate": round(self._accepted_tokens / self._draft_tokens, 3)
+                    if self._draft_tokens else 0.0,
+                "tokensPerTargetStep": round((self._accepted_tokens + self._target_steps) / self._target_steps, 2)
+                    if self._target_steps else 0.0
+            }
+
+    def synchronize(self):
+        if self.device == "cuda":
+            torch.cuda.synchronize()
+
+    def timed_generate(self, input_ids, new_tokens: int) -> float:
+        """Seconds to greedily generate exactly new_tokens tokens for a batch"""
+        self.synchronize()
+        start = time.perf_counter()
+        self.model.generate(
+            input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+        self.synchronize()
+        return time.perf_counter() - start
+
+    def benchmark(self, prompt_tokens: int, decode_tokens: int, batch_sizes: list) -> dict:
+        filler_ids = self.tokenizer(BENCHMARK_FILLER * prompt_tokens)["input_ids"][:prompt_tokens]
+        input_ids = torch.tensor([filler_ids], device=self.model.device)
+
+        if self.device == "cuda":
+            torch.cuda.reset_peak_memory_stats()
+
+        with torch.inference_mode():
+            # Prefill is a single forward pass over the whole prompt
+            self.synchronize()
+            start = time.perf_counter()
+            self.model(input_ids)
+            self.synchronize()
+            prefill_seconds = time.perf_counter() - start
+
+            ttft_seconds = self.timed_generate(input_ids, 1)
+
+            # Decode throughput excludes the first token, which includes prefill
+            decode = {}
+            for batch_size in batch_sizes:
+                batch = input_ids.repeat(batch_size, 1)
+                first_token = self.timed_generate(batch, 1)
+                total = self.timed_generate(batch, decode_tokens)
+                decode_seconds = max(total - first_token, 1e-9)
+                decode[str(batch_size)] = round(batch_size * (decode_tokens - 1) / decode_seconds, 2)
+
+        if self.device == "cuda":
+            peak_memory = torch.cuda.max_memory_allocated()
+        else:
+            peak_memory = peak_rss_bytes()
+
+        return {
+            "prefillTokensPerSecond": round(len(filler_ids) / prefill_seconds, 2),
+            "ttftMs": round(ttft_seconds * 1000, 1),
+            "decodeTokensPerSecond": decode,
+            "peakMemoryBytes": peak_memory
+        }
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text)["input_ids"])
+
+    def kv_cache_bytes_per_token(self) -> int:
+        config = self.model.config.get_text_config()
+        attention_heads = getattr(config, "num_attention_heads", 0)
+        layers = getattr(config, "num_hidden_layers", 0)
+        if not attention_heads or not layers:
+            return 0
+
+        kv_heads = getattr(config, "num_key_value_heads", None) or attention_heads
+        head_dim = getattr(config, "head_dim", None) or config.hidden_size // attention_heads
+        dtype_bytes = torch.tensor([], dtype=self.model.dtype).element_size()
+        # One key and one value vector per layer and KV head
+        return 2 * layers * kv_heads * head_dim * dtype_bytes
+
+    def memory_footprint(self) -> int:
+        footprint = model_memory_footprint(self.model)
+        if self.draft_model is not None:
+            footprint += model_memory_footprint(self.draft_model)
+        return footprint
+
+    def describe(self) -> dict:
+        details = {**super().describe(), "quantization": self.quantization or ""}
+        if self.draft_model_name:
+            details["speculative"] = self.speculation_stats()
+        return details
@@ -0,0 +1,93 @@
+"""
+Compare CPU decode throughput of the old fp16 load path with the CPU profile.
+
+Run from the node directory:
+    python -m benchmarks.cpu_profile --model sshleifer/tiny-gpt2
+
+Each configuration is loaded in its own subprocess so thread pool settings
+don't leak between runs. Reported numbers are the first-request latency and
+the steady-state decode tokens/sec.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+PROMPT = "The history of distributed computing begins with"
+
+def run_configuration(model_name: str, profile: bool, max_new_tokens: int, runs: int) -> dict:
+    import torch #type: ignore
+    from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+
+    from cpu_profile import configure_cpu_threads, select_cpu_dtype, maybe_compile
+
+    if profile:
+        configure_cpu_threads()
+        dtype = select_cpu_dtype()
+    else:
+        dtype = torch.float16
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name, dtype=dtype, low_cpu_mem_usage=True)
+    if profile:
+        model = maybe_compile(model)
+    generator = pipeline("text-generation", model=model, tokenizer=tokenizer, device="cpu")
+
+    def generate():
+        start = time.perf_counter()
+        generator(
+            PROMPT,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id,
+            return_full_text=False
+        )
+        return time.perf_counter() - start
+
+    # The node runs a warmup generation before reporting ready
+    if profile:
+        generate()
+
+    first_request = generate()
+    elapsed = sum(generate() for _ in range(runs))
+
+    return {
+        "dtype": str(dtype).replace("torch.", ""),
+        "threads": torch.get_num_threads(),
+        "first_request_s": first_request,
+        "tokens_per_second": max_new_tokens * runs / elapsed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=["baseline", "profile"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_configuration(args.model, args.child == "profile", args.max_new_tokens, args.runs)
+        print(json.dumps(result))
+        return
+
+    print(f"{'config':<10}{'dtype':>10}{'threads':>9}{'first req s':>13}{'tokens/s':>10}")
+    for config in ("baseline", "profile"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.cpu_profile", "--child", config,
+             "--model", args.model, "--max-new-tokens", str(args.max_new_tokens), "--runs", str(args.runs)],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(
+            f"{config:<10}{result['dtype']:>10}{result['threads']:>9}"
+            f"{result['first_request_s']:>13.3f}{result['tokens_per_second']:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
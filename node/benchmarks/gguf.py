@@ -0,0 +1,69 @@
+"""
+Compare decode throughput of the llama.cpp backend on a GGUF model with the
+transformers backend on CPU.
+
+Run from the node directory:
+    python -m benchmarks.gguf \\
+        --hf-model Qwen/Qwen2.5-0.5B-Instruct \\
+        --gguf-model Qwen/Qwen2.5-0.5B-Instruct-GGUF --gguf-file "*q4_k_m.gguf"
+
+Both backends are loaded exactly as a node would load them, including the
+CPU profile and warmup.
+"""
+
+import argparse
+import os
+import subprocess
+import time
+
+from backends import create_backend
+
+PROMPT = "Explain in a few sentences why the sky is blue."
+
+def download(model_name: str, patterns, cache_dir: str) -> str:
+    model_path = os.path.join(cache_dir, model_name)
+    command = ["huggingface-cli", "download", model_name, "--local-dir", model_path]
+    if patterns:
+        command += ["--include", *patterns]
+    subprocess.run(command, check=True, capture_output=True)
+    return model_path
+
+def measure(backend, max_new_tokens: int, runs: int) -> float:
+    for _ in range(runs):
+        backend.generate(PROMPT, max_new_tokens=max_new_tokens, temperature=1.0, do_sample=False)
+    return backend.generation_stats()["tokensPerSecond"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hf-model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--gguf-model", default="Qwen/Qwen2.5-0.5B-Instruct-GGUF")
+    parser.add_argument("--gguf-file", default="*q4_k_m.gguf")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cache-dir", default="/tmp/gguf-benchmark")
+    args = parser.parse_args()
+
+    configurations = [
+        ("transformers", args.hf_model, {}),
+        ("llama.cpp", args.gguf_model, {"gguf_file": args.gguf_file}),
+    ]
+
+    print(f"{'backend':<14}{'load s':>8}{'memory MiB':>12}{'tokens/s':>10}")
+    for name, model_name, options in configurations:
+        backend = create_backend(name, "cpu", **options)
+        model_path = download(model_name, backend.download_patterns(), args.cache_dir)
+
+        start = time.perf_counter()
+        backend.load(model_name, model_path)
+        backend.warmup()
+        load_seconds = time.perf_counter() - start
+
+        tokens_per_second = measure(backend, args.max_new_tokens, args.runs)
+        print(
+            f"{name:<14}{load_seconds:>8.1f}{backend.memory_footprint() / 1024 ** 2:>12.1f}"
+            f"{tokens_per_second:>10.1f}"
+        )
+        del backend
+
+if __name__ == "__main__":
+    main()
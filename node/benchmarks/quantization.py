@@ -0,0 +1,109 @@
+"""
+Compare quantization profiles for a model on quality and throughput.
+
+Run from the node directory:
+    python -m benchmarks.quantization --model sshleifer/tiny-gpt2 --profiles none int8-dynamic
+
+For each profile this reports the weight memory footprint, perplexity on a
+fixed text sample, greedy-decode agreement with the first profile and
+decode tokens/sec. Everything runs on CPU unless --device is given.
+"""
+
+import argparse
+import time
+
+import torch #type: ignore
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from quantization import (
+    validate_quantization, quantization_load_kwargs, apply_post_load_quantization, model_memory_footprint
+)
+
+EVAL_TEXT = (
+    "The quick brown fox jumps over the lazy dog. Distributed inference lets many small "
+    "machines serve requests that would otherwise need one large server. Each node loads "
+    "a model, answers generation requests and reports its status to a central router."
+)
+
+PROMPTS = [
+    "The capital of France is",
+    "def fibonacci(n):",
+    "Once upon a time",
+]
+
+def load(model_name: str, profile: str, device: str):
+    quantization = None if profile == "none" else profile
+    validate_quantization(quantization, device)
+
+    # fp32 is the unquantized reference on CPU, fp16 elsewhere
+    load_kwargs = {"dtype": torch.float16 if device != "cpu" else torch.float32, "low_cpu_mem_usage": True}
+    load_kwargs.update(quantization_load_kwargs(quantization))
+    model = AutoModelForCausalLM.from_pretrained(model_name, **load_kwargs)
+    if "quantization_config" not in load_kwargs:
+        model = model.to(device)
+    model = apply_post_load_quantization(model, quantization)
+    model.eval()
+    return model
+
+@torch.inference_mode()
+def perplexity(model, tokenizer, device: str) -> float:
+    inputs = tokenizer(EVAL_TEXT, return_tensors="pt").to(device)
+    outputs = model(**inputs, labels=inputs["input_ids"])
+    return float(torch.exp(outputs.loss))
+
+@torch.inference_mode()
+def greedy_outputs(model, tokenizer, device: str, max_new_tokens: int) -> tuple[list, float]:
+    """Greedy completions for PROMPTS and the decode tokens/sec across them"""
+    completions = []
+    generated = 0
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        inputs = tokenizer(prompt, return_tensors="pt").to(device)
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+        new_tokens = output[0, inputs["input_ids"].shape[1]:].tolist()
+        completions.append(new_tokens)
+        generated += len(new_tokens)
+    elapsed = time.perf_counter() - start
+    return completions, generated / elapsed
+
+def agreement(reference: list, candidate: list) -> float:
+    """Fraction of greedy tokens identical to the reference profile"""
+    matches = total = 0
+    for ref, cand in zip(reference, candidate):
+        total += len(ref)
+        matches += sum(1 for a, b in zip(ref, cand) if a == b)
+    return matches / total if total else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--profiles", nargs="+", default=["none", "int8-dynamic"])
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+
+    reference = None
+    print(f"{'profile':<14}{'memory MiB':>12}{'perplexity':>12}{'agreement':>11}{'tokens/s':>10}")
+    for profile in args.profiles:
+        model = load(args.model, profile, args.device)
+        footprint = model_memory_footprint(model) / 1024 ** 2
+        ppl = perplexity(model, tokenizer, args.device)
+        completions, tokens_per_second = greedy_outputs(model, tokenizer, args.device, args.max_new_tokens)
+        if reference is None:
+            reference = completions
+        print(
+            f"{profile:<14}{footprint:>12.1f}{ppl:>12.2f}"
+            f"{agreement(reference, completions):>11.1%}{tokens_per_second:>10.1f}"
+        )
+        del model
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure speculative decoding with a draft model against plain decoding.
+
+Run from the node directory:
+    python -m benchmarks.speculative \\
+        --model HuggingFaceTB/SmolLM2-360M --draft-model HuggingFaceTB/SmolLM2-135M
+
+Runs on CPU by default. Reports decode tokens/sec for both configurations,
+and the draft acceptance rate and tokens per target step with speculation.
+"""
+
+import argparse
+
+from backends.transformers_backend import TransformersBackend
+
+PROMPTS = [
+    "def quicksort(arr):",
+    "The three primary colors are",
+    "Write a short story about a lighthouse keeper.",
+]
+
+def run(model_name: str, draft_model_name, device: str, max_new_tokens: int) -> dict:
+    backend = TransformersBackend(device, draft_model_name=draft_model_name)
+    backend.load(model_name, model_name)
+    backend.warmup()
+    for prompt in PROMPTS:
+        backend.generate(prompt, max_new_tokens=max_new_tokens, temperature=1.0, do_sample=False)
+    return backend.describe()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-360M")
+    parser.add_argument("--draft-model", default="HuggingFaceTB/SmolLM2-135M")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    baseline = run(args.model, None, args.device, args.max_new_tokens)
+    speculative = run(args.model, args.draft_model, args.device, args.max_new_tokens)
+
+    baseline_tps = baseline["stats"]["tokensPerSecond"]
+    speculative_tps = speculative["stats"]["tokensPerSecond"]
+    print(f"plain decoding:       {baseline_tps:.1f} tokens/s")
+    print(f"speculative decoding: {speculative_tps:.1f} tokens/s ({speculative['speculative']['status']})")
+    if baseline_tps:
+        print(f"speedup:              {speculative_tps / baseline_tps:.2f}x")
+    print(f"acceptance rate:      {speculative['speculative']['acceptanceRate']:.1%}")
+    print(f"tokens/target step:   {speculative['speculative']['tokensPerTargetStep']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Track how long the node takes to import before it can serve control endpoints.
+
+Run from the node directory:
+    python -m benchmarks.startup --budget-ms 500
+
+Imports app in fresh interpreters, reports the median wall time and the
+slowest imports from -X importtime, and exits non-zero if the median is over
+budget or if torch/transformers were imported at startup.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "transformers", "llama_cpp", "bitsandbytes")
+
+TIMING_SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+def time_import() -> tuple[float, list]:
+    output = subprocess.run(
+        [sys.executable, "-c", TIMING_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    elapsed, _, heavy = output.stdout.strip().splitlines()[-1].partition(" ")
+    return float(elapsed) * 1000, [m for m in heavy.split(",") if m]
+
+def slowest_imports(count: int) -> list:
+    """(cumulative microseconds, module) for the slowest imports under -X importtime"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    timings = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line.split("|", 2)
+        timings.append((int(cumulative_us), module.rstrip()))
+    return sorted(timings, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    results = [time_import() for _ in range(args.runs)]
+    median_ms = statistics.median(elapsed for elapsed, _ in results)
+    heavy = sorted({module for _, modules in results for module in modules})
+
+    print(f"import app: median {median_ms:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print("slowest imports (cumulative):")
+    for cumulative_us, module in slowest_imports(args.top):
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {module}")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: imported at startup: {', '.join(heavy)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print("FAIL: over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
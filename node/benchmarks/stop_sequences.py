@@ -0,0 +1,60 @@
+"""
+Measure decode steps saved by stop sequences and EOS-aware termination.
+
+Run from the node directory:
+    python -m benchmarks.stop_sequences --model HuggingFaceTB/SmolLM2-135M
+
+Runs a mixed workload of requests that want one line, one JSON object or
+free text, once without stop sequences (decoding to max tokens and trimming
+client-side, as before) and once with them. Reports decode steps and time.
+"""
+
+import argparse
+import time
+
+from backends.transformers_backend import TransformersBackend
+
+# (prompt, stop sequences, max new tokens)
+WORKLOAD = [
+    ("Q: What is the capital of France?\nA:", ["\n"], 128),
+    ("Q: Name a prime number larger than 10.\nA:", ["\n"], 128),
+    ('Return the user as JSON: {"name": "Ada", "age":', ["}"], 256),
+    ('Return the config as JSON: {"debug":', ["}"], 256),
+    ("def add(a, b):\n", ["\ndef ", "\nclass "], 256),
+    ("Write a long story about a dragon.", None, 128),
+]
+
+def run(backend, use_stop: bool) -> tuple[int, int, float]:
+    """Total decode steps, requests stopped early and seconds for the workload"""
+    steps = stopped = 0
+    start = time.perf_counter()
+    for prompt, stop, max_new_tokens in WORKLOAD:
+        result = backend.generate(
+            prompt,
+            max_new_tokens=max_new_tokens,
+            temperature=1.0,
+            do_sample=False,
+            stop=stop if use_stop else None
+        )
+        steps += result.completion_tokens
+        stopped += result.finish_reason == "stop"
+    return steps, stopped, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    backend = TransformersBackend(args.device)
+    backend.load(args.model, args.model)
+    backend.warmup()
+
+    budget = sum(max_new_tokens for _, _, max_new_tokens in WORKLOAD)
+    print(f"{'config':<16}{'decode steps':>14}{'of budget':>11}{'stopped':>9}{'seconds':>9}")
+    for label, use_stop in (("trim client-side", False), ("stop sequences", True)):
+        steps, stopped, seconds = run(backend, use_stop)
+        print(f"{label:<16}{steps:>14}{steps / budget:>11.0%}{stopped:>9}{seconds:>9.2f}")
+
+if __name__ == "__main__":
+    main()
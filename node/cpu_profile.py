@@ -0,0 +1,112 @@
+import logging
+import os
+import platform
+
+# Set once per process; torch refuses to resize the inter-op pool after first use
+_affinity_pinned = False
+_threads_configured = False
+
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU has native bf16 matmul support (AVX512-BF16/AMX on x86, BF16 on Arm)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpuinfo = f.read()
+    except OSError:
+        # Apple silicon has native bf16 from M2 onwards, but not every build of torch uses it
+        return platform.system() == "Darwin" and platform.machine() == "arm64"
+
+    flags = set()
+    for line in cpuinfo.splitlines():
+        if line.startswith(("flags", "Features")):
+            flags.update(line.split(":", 1)[1].split())
+    return bool(flags & {"avx512_bf16", "amx_bf16", "bf16"})
+
+def select_cpu_dtype():
+    """
+    Pick the CPU weight dtype. fp16 matmuls are emulated on most x86 CPUs, so
+    use bf16 where the hardware supports it and fp32 otherwise. NODE_CPU_DTYPE
+    overrides the detection.
+    """
+    import torch #type: ignore
+
+    override = os.getenv("NODE_CPU_DTYPE")
+    if override:
+        return getattr(torch, override)
+    return torch.bfloat16 if cpu_supports_bf16() else torch.float32
+
+def parse_cpu_list(cpu_list: str) -> set:
+    """Parse a cpuset string like '0-3,8,10-11'"""
+    cpus = set()
+    for part in cpu_list.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def cpu_thread_count() -> int:
+    """NODE_NUM_THREADS, or the number of CPUs this process may run on"""
+    if os.getenv("NODE_NUM_THREADS"):
+        return int(os.getenv("NODE_NUM_THREADS"))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def pin_cpu_affinity():
+    """
+    Pin the process to NODE_CPU_AFFINITY, if set. Needs no torch, so the
+    llama.cpp backend can call it without pulling torch in.
+    """
+    global _affinity_pinned
+    if _affinity_pinned:
+        return
+    _affinity_pinned = True
+
+    affinity = os.getenv("NODE_CPU_AFFINITY")
+    if affinity and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, parse_cpu_list(affinity))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Failed to set CPU affinity '{affinity}': {e}")
+
+def configure_cpu_threads():
+    """
+    Pin the process to NODE_CPU_AFFINITY (if set) and size torch's thread pools
+    to the CPUs this container may use, so node containers sharing a host don't
+    oversubscribe cores. NODE_NUM_THREADS overrides the intra-op thread count.
+    """
+    import torch #type: ignore
+
+    global _threads_configured
+    pin_cpu_affinity()
+    if _threads_configured:
+        return
+    _threads_configured = True
+
+    num_threads = cpu_thread_count()
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Inter-op pool was already used; the intra-op setting still applies
+        pass
+
+    logging.info(f"CPU profile: {num_threads} threads")
+
+def maybe_compile(model):
+    """Compile the model's forward pass when NODE_TORCH_COMPILE is enabled"""
+    if os.getenv("NODE_TORCH_COMPILE", "").lower() not in ("1", "true", "yes"):
+        return model
+
+    import torch #type: ignore
+
+    try:
+        model.forward = torch.compile(model.forward, dynamic=True)
+        logging.info("Compiled model forward with torch.compile")
+    except Exception as e:
+        logging.warning(f"torch.compile failed, using eager mode: {e}")
+    return model
@@ -0,0 +1,79 @@
+import fnmatch
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from typing import Callable, Optional
+
+# How often download progress is sampled and published
+PROGRESS_INTERVAL = float(os.getenv("NODE_DOWNLOAD_PROGRESS_INTERVAL", "2"))
+
+def expected_download_bytes(model_name: str, patterns: list) -> Optional[int]:
+    """Total size of the repo files the download will fetch, or None if the Hub can't tell us"""
+    try:
+        from huggingface_hub import HfApi
+        info = HfApi().model_info(model_name, files_metadata=True)
+    except Exception as e:
+        logging.warning(f"Could not get file sizes for {model_name}: {e}")
+        return None
+
+    total = 0
+    for sibling in info.siblings or []:
+        if patterns and not any(fnmatch.fnmatch(sibling.rfilename, pattern) for pattern in patterns):
+            continue
+        total += sibling.size or 0
+    return total or None
+
+def directory_bytes(path: str) -> int:
+    """Bytes on disk under path, including partial downloads"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def download_model(
+        model_name: str,
+        model_path: str,
+        patterns: list,
+        on_progress: Callable[[int], None],
+        revision: Optional[str] = None,
+        expected: Optional[int] = None
+    ) -> bool:
+    """
+    Download the model with huggingface-cli, calling on_progress with the
+    percentage downloaded whenever it changes. Returns False if the download fails.
+    """
+    command = ["huggingface-cli", "download", model_name, "--local-dir", model_path]
+    if revision:
+        command += ["--revision", revision]
+    if patterns:
+        command += ["--include", *patterns]
+
+    if expected is None:
+        expected = expected_download_bytes(model_name, patterns)
+
+    # huggingface-cli writes progress bars to stderr; a file can't fill up and block it like a pipe
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=stderr, text=True)
+
+        last_percent = None
+        while process.poll() is None:
+            if expected:
+                percent = min(int(directory_bytes(model_path) * 100 / expected), 99)
+                if percent != last_percent:
+                    on_progress(percent)
+                    last_percent = percent
+            time.sleep(PROGRESS_INTERVAL)
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            logging.error(f"Failed to download model: {stderr.read()[-4000:]}")
+            return False
+
+    on_progress(100)
+    return True
@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class InFlightCounter:
+    """
+    Thread-safe count of generate calls currently running against a model.
+    Used to drain a model before its memory is released.
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            self._count += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._condition:
+            self._count -= 1
+            if self._count == 0:
+                self._condition.notify_all()
+        return False
+
+    @property
+    def count(self) -> int:
+        with self._condition:
+            return self._count
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Block until no calls are running. Returns False if the timeout expired first."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._count > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
@@ -0,0 +1,97 @@
+from typing import Optional
+
+def read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+def cgroup_memory() -> Optional[tuple[int, int]]:
+    """
+    (limit, usage) of the container's memory cgroup, or None without a limit.
+    Inactive page cache is left out of usage since the kernel reclaims it
+    before the container runs out, the same way `docker stats` counts it.
+    """
+    for limit_path, usage_path, stat_path, inactive_field in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current",
+         "/sys/fs/cgroup/memory.stat", "inactive_file"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+         "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"),
+    ):
+        limit = read_int(limit_path)
+        usage = read_int(usage_path)
+        if limit is None or usage is None:
+            continue
+        # cgroup v1 reports "no limit" as a huge number rather than "max"
+        if limit >= 1 << 60:
+            return None
+
+        inactive = 0
+        try:
+            with open(stat_path) as f:
+                for line in f:
+                    name, _, value = line.partition(" ")
+                    if name == inactive_field:
+                        inactive = int(value)
+        except OSError:
+            pass
+        return limit, max(usage - inactive, 0)
+    return None
+
+def system_memory() -> Optional[tuple[int, int]]:
+    """(total, available) bytes of RAM the process can use, within the container's limit"""
+    meminfo = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                meminfo[name] = int(value.split()[0]) * 1024
+    except OSError:
+        return None
+    if "MemTotal" not in meminfo:
+        return None
+
+    total = meminfo["MemTotal"]
+    available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+    limits = cgroup_memory()
+    if limits:
+        limit, usage = limits
+        total = min(total, limit)
+        available = min(available, max(limit - usage, 0))
+    return total, available
+
+def gpu_memory() -> Optional[tuple[int, int]]:
+    """(total, free) bytes across the visible GPUs. device_map="auto" spreads a model over all of them"""
+    import torch #type: ignore
+    if not torch.cuda.is_available():
+        return None
+    total = 0
+    free = 0
+    for index in range(torch.cuda.device_count()):
+        device_free, device_total = torch.cuda.mem_get_info(index)
+        free += device_free
+        total += device_total
+    return total, free
+
+def weight_dtype(device: str) -> str:
+    """The dtype a transformers model is loaded in on this device without a quantization profile"""
+    if device in ("cuda", "mps"):
+        return "float16"
+    from cpu_profile import select_cpu_dtype
+    return str(select_cpu_dtype()).removeprefix("torch.")
+
+def memory_report(device: str) -> dict:
+    """
+    Memory a model assigned to this node could use. Weights go to the GPU on
+    CUDA; on CPU and Apple silicon (unified memory) they take system RAM.
+    """
+    memory = gpu_memory() if device == "cuda" else system_memory()
+    total, free = memory or (None, None)
+    return {
+        "device": device,
+        "weightDtype": weight_dtype(device),
+        "totalBytes": total,
+        "freeBytes": free
+    }
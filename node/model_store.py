@@ -0,0 +1,336 @@
+"""
+Content-addressed model store shared by every node container on a host.
+
+    blobs/sha256/ab/abcdef...              file contents, named by sha256, read-only
+    snapshots/{model}/{revision}/...       the repo's files, hard links to blobs
+    manifests/{model}/{revision}.json      path -> sha256 and size for a snapshot
+
+Identical files are stored once across model revisions and containers, and
+since every container opens the same inode, memory-mapped weights share one
+copy in the OS page cache. A blob's link count is its reference count: once
+no snapshot links to it, garbage collection deletes it.
+
+Containers hold a shared lock on a snapshot while a model loaded from it is in
+use. The kernel drops the lock when a container dies, so garbage collection
+never needs to know which containers exist.
+
+Run inside a node container to inspect or clean the store:
+    python model_store.py list
+    python model_store.py gc
+"""
+
+import argparse
+import contextlib
+import fcntl
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Callable, Optional
+
+from download import download_model
+
+STORE_DIR = os.getenv("MODEL_STORE_DIR", "/model-store")
+
+# Snapshots no container uses are kept this long after their last use
+RETENTION = float(os.getenv("MODEL_STORE_RETENTION", str(24 * 3600)))
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def matches(path: str, patterns: Optional[list]) -> bool:
+    return not patterns or any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+class SnapshotLease:
+    """A container's reference to a snapshot, held until the model loaded from it is released"""
+
+    def __init__(self, path: str, lock_file):
+        self.path = path
+        self.lock_file = lock_file
+
+    def release(self):
+        if self.lock_file is None:
+            return
+        # Touch on release so retention counts from the last use, not the first
+        os.utime(self.lock_file.fileno())
+        self.lock_file.close()
+        self.lock_file = None
+
+class ModelStore:
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", "sha256", sha256[:2], sha256)
+
+    def snapshot_path(self, model_name: str, revision: str) -> str:
+        return os.path.join(self.root, "snapshots", model_name, revision)
+
+    def manifest_path(self, model_name: str, revision: str) -> str:
+        return os.path.join(self.root, "manifests", model_name, f"{revision}.json")
+
+    def refs_path(self, model_name: str, revision: str) -> str:
+        return os.path.join(self.root, "manifests", model_name, f"{revision}.refs")
+
+    @contextlib.contextmanager
+    def locked(self, name: str, mode: int):
+        """flock on a file under locks/, shared or exclusive across containers"""
+        path = os.path.join(self.root, "locks", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, mode)
+            yield
+
+    def read_manifest(self, model_name: str, revision: str) -> Optional[dict]:
+        try:
+            with open(self.manifest_path(model_name, revision)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_manifest(self, manifest: dict):
+        path = self.manifest_path(manifest["model"], manifest["revision"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, path)
+
+    def link(self, manifest: dict, path: str, sha256: str, size: int):
+        """Add a blob to the snapshot under path"""
+        target = os.path.join(self.snapshot_path(manifest["model"], manifest["revision"]), path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.unlink(target)
+        os.link(self.blob_path(sha256), target)
+        manifest["files"][path] = {"sha256": sha256, "size": size}
+
+    def add_blob(self, source: str) -> str:
+        """Move a downloaded file into the store, or drop it if the store already has it"""
+        sha256 = file_sha256(source)
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            os.unlink(source)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.chmod(source, 0o444)
+            os.replace(source, blob)
+        return sha256
+
+    def remote_files(self, model_name: str, patterns: Optional[list]) -> tuple[str, dict]:
+        """(revision, {path: (size, sha256 or None)}) for the repo files matching patterns"""
+        from huggingface_hub import HfApi
+        info = HfApi().model_info(model_name, files_metadata=True)
+        files = {}
+        for sibling in info.siblings or []:
+            if matches(sibling.rfilename, patterns):
+                # The Hub only reports sha256 for LFS files, which are the large ones
+                sha256 = sibling.lfs.sha256 if sibling.lfs else None
+                files[sibling.rfilename] = (sibling.size or 0, sha256)
+        return info.sha, files
+
+    def local_revision(self, model_name: str, patterns: Optional[list]) -> Optional[str]:
+        """Newest stored revision that has everything patterns asks for, when the Hub can't be reached"""
+        manifest_dir = os.path.join(self.root, "manifests", model_name)
+        try:
+            names = [name for name in os.listdir(manifest_dir) if name.endswith(".json")]
+        except FileNotFoundError:
+            return None
+
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(manifest_dir, name)), reverse=True)
+        for name in names:
+            manifest = self.read_manifest(model_name, name[:-len(".json")])
+            if patterns is None and manifest.get("complete"):
+                return manifest["revision"]
+            if patterns and all(any(matches(path, [pattern]) for path in manifest["files"]) for pattern in patterns):
+                return manifest["revision"]
+        return None
+
+    def prepare(
+            self,
+            model_name: str,
+            patterns: Optional[list],
+            on_progress: Callable[[int], None]
+        ) -> SnapshotLease:
+        """
+        Make the model's files available in a snapshot, downloading only what
+        the store doesn't already have, and take a reference to it. Concurrent
+        containers preparing the same revision wait for the first one.
+        """
+        try:
+            revision, wanted = self.remote_files(model_name, patterns)
+        except Exception as e:
+            revision = self.local_revision(model_name, patterns)
+            if revision is None:
+                raise RuntimeError(f"Could not resolve {model_name} on the Hub and it isn't in the store: {e}")
+            logging.warning(f"Could not reach the Hub for {model_name}, using stored revision {revision}: {e}")
+            wanted = {}
+
+        # A shared store lock keeps garbage collection out while files are linked in
+        with self.locked("store", fcntl.LOCK_SH), self.locked(f"{model_name}/{revision}", fcntl.LOCK_EX):
+            manifest = self.read_manifest(model_name, revision) or {
+                "model": model_name, "revision": revision, "files": {}, "complete": False
+            }
+
+            missing = {}
+            for path, (size, sha256) in wanted.items():
+                if path in manifest["files"]:
+                    continue
+                if sha256 and os.path.exists(self.blob_path(sha256)):
+                    # Unchanged since another revision, or fetched by another model
+                    self.link(manifest, path, sha256, size)
+                else:
+                    missing[path] = size
+
+            if missing:
+                self.fetch(manifest, missing, on_progress)
+            if patterns is None and wanted:
+                manifest["complete"] = True
+            self.write_manifest(manifest)
+
+            return self.acquire(model_name, revision)
+
+    def fetch(self, manifest: dict, missing: dict, on_progress: Callable[[int], None]):
+        staging = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        logging.info(
+            f"Downloading {len(missing)} files ({sum(missing.values()) / 1024 ** 2:.1f} MiB) "
+            f"of {manifest['model']}@{manifest['revision'][:12]}"
+        )
+        try:
+            downloaded = download_model(
+                manifest["model"],
+                staging,
+                list(missing),
+                on_progress,
+                revision=manifest["revision"],
+                expected=sum(missing.values())
+            )
+            if not downloaded:
+                raise RuntimeError(f"Failed to download {manifest['model']}")
+
+            for path, size in missing.items():
+                source = os.path.join(staging, path)
+                self.link(manifest, path, self.add_blob(source), size)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def acquire(self, model_name: str, revision: str) -> SnapshotLease:
+        lock_file = open(self.refs_path(model_name, revision), "a")
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        os.utime(lock_file.fileno())
+        return SnapshotLease(self.snapshot_path(model_name, revision), lock_file)
+
+    def snapshots(self) -> list:
+        """(model name, revision) of every stored snapshot"""
+        manifest_root = os.path.join(self.root, "manifests")
+        found = []
+        for directory, _, files in os.walk(manifest_root):
+            for name in files:
+                if name.endswith(".json"):
+                    found.append((os.path.relpath(directory, manifest_root), name[:-len(".json")]))
+        return sorted(found)
+
+    def in_use(self, model_name: str, revision: str) -> bool:
+        """True if any container holds a reference. Only valid under the exclusive store lock."""
+        try:
+            with open(self.refs_path(model_name, revision), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+                return False
+        except BlockingIOError:
+            return True
+
+    def last_used(self, model_name: str, revision: str) -> float:
+        try:
+            return os.path.getmtime(self.refs_path(model_name, revision))
+        except FileNotFoundError:
+            return os.path.getmtime(self.manifest_path(model_name, revision))
+
+    def collect_garbage(self, retention: float = RETENTION, wait: bool = False) -> Optional[dict]:
+        """
+        Delete snapshots nobody has used for retention seconds, then every blob
+        no snapshot links to. Skipped (returns None) if another container is
+        preparing a model, unless wait is set.
+        """
+        mode = fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            with self.locked("store", mode):
+                snapshots_removed = 0
+                for model_name, revision in self.snapshots():
+                    if self.in_use(model_name, revision):
+                        continue
+                    if time.time() - self.last_used(model_name, revision) < retention:
+                        continue
+                    shutil.rmtree(self.snapshot_path(model_name, revision), ignore_errors=True)
+                    for path in (
+                        self.manifest_path(model_name, revision),
+                        self.refs_path(model_name, revision),
+                        os.path.join(self.root, "locks", model_name, revision)
+                    ):
+                        with contextlib.suppress(FileNotFoundError):
+                            os.unlink(path)
+                    snapshots_removed += 1
+
+                blobs_removed = 0
+                bytes_freed = 0
+                for directory, _, files in os.walk(os.path.join(self.root, "blobs")):
+                    for name in files:
+                        path = os.path.join(directory, name)
+                        stat = os.stat(path)
+                        if stat.st_nlink == 1:
+                            os.unlink(path)
+                            blobs_removed += 1
+                            bytes_freed += stat.st_size
+
+                # Staging left behind by containers that died mid-download
+                shutil.rmtree(os.path.join(self.root, "tmp"), ignore_errors=True)
+        except BlockingIOError:
+            return None
+
+        return {"snapshots": snapshots_removed, "blobs": blobs_removed, "bytesFreed": bytes_freed}
+
+    def usage(self) -> dict:
+        """Bytes the snapshots would take as separate copies vs. bytes actually stored"""
+        logical = 0
+        for model_name, revision in self.snapshots():
+            manifest = self.read_manifest(model_name, revision) or {"files": {}}
+            logical += sum(entry["size"] for entry in manifest["files"].values())
+        stored = 0
+        for directory, _, files in os.walk(os.path.join(self.root, "blobs")):
+            stored += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        return {"logicalBytes": logical, "storedBytes": stored}
+
+model_store = ModelStore()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["list", "gc"])
+    parser.add_argument("--retention", type=float, default=RETENTION, help="seconds an unused snapshot is kept")
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        result = model_store.collect_garbage(args.retention, wait=True)
+        print(f"Removed {result['snapshots']} snapshots and {result['blobs']} blobs, "
+              f"freed {result['bytesFreed'] / 1024 ** 2:.1f} MiB")
+        return
+
+    for model_name, revision in model_store.snapshots():
+        manifest = model_store.read_manifest(model_name, revision)
+        size = sum(entry["size"] for entry in manifest["files"].values())
+        state = "in use" if model_store.in_use(model_name, revision) else "unused"
+        print(f"{model_name}@{revision[:12]}  {len(manifest['files'])} files  {size / 1024 ** 2:.1f} MiB  {state}")
+    usage = model_store.usage()
+    print(f"{usage['logicalBytes'] / 1024 ** 2:.1f} MiB in snapshots, {usage['storedBytes'] / 1024 ** 2:.1f} MiB stored")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 # Pydantic models
 class GenerateRequest(BaseModel):
@@ -7,10 +7,15 @@ class GenerateRequest(BaseModel):
     max_new_tokens: int = 512
     temperature: float = 0.7
     do_sample: bool = True
+    model_id: Optional[str] = None
+    stop: Optional[List[str]] = None
 
 class GenerateResponse(BaseModel):
     generated_text: str
     model: str
+    finish_reason: str
+    prompt_tokens: int
+    completion_tokens: int
 
 class AuthenticateRequest(BaseModel):
     userId: str
@@ -20,8 +25,19 @@ class NodeStatusResponse(BaseModel):
     userId: Optional[str] = None
     nodeId: Optional[str] = None
 
+class ProfileRequest(BaseModel):
+    mode: str = "sampling"
+    requests: Optional[int] = None
+    seconds: float = 30.0
+    intervalMs: float = 5.0
+
 class AssignModel(BaseModel):
     modelName: str
     nodeId: str
     modelId: str
     huggingFaceModelId: str
+    hotSwap: bool = False
+    quantization: Optional[str] = None
+    backend: Optional[str] = None
+    ggufFile: Optional[str] = None
+    draftModelName: Optional[str] = None
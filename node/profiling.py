@@ -0,0 +1,195 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from typing import Callable, Optional
+
+# Upper bound on how long one profile may run
+PROFILE_MAX_SECONDS = float(os.getenv("NODE_PROFILE_MAX_SECONDS", "300"))
+
+# How often the event loop is checked for lag while profiling
+LOOP_LAG_INTERVAL = 0.01
+
+PROFILE_MODES = ("sampling", "torch")
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread from a background thread. Nothing
+    is hooked into the interpreter, so sampled code runs at full speed, and
+    there is no cost at all while no sampler is running.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Collapsed stacks ("thread;outer;...;inner count"), as read by flamegraph.pl and speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """
+    One bounded profile: runs until max_requests generate calls have finished
+    or the time is up, whichever comes first.
+
+    sampling: stacks of every thread, sampled every interval seconds
+    torch:    a torch profiler trace of each generate call, one call at a time
+    """
+
+    def __init__(self, mode: str, max_requests: Optional[int], seconds: float, interval: float):
+        self.mode = mode
+        self.max_requests = max_requests
+        self.seconds = seconds
+        self.requests = 0
+        self.started_at = time.time()
+        self.ended_at = None
+        self.sampler = StackSampler(interval) if mode == "sampling" else None
+        self.traces = []
+        self.loop_lags = []
+        self._finished = asyncio.Event()
+        self._trace_lock = threading.Lock()
+
+    def request_finished(self):
+        """Called on the event loop as each generate request completes"""
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            self._finished.set()
+
+    def trace(self, generate: Callable, *args, **kwargs):
+        """
+        Run a generate call under the torch profiler. The profiler can't trace
+        overlapping calls, so calls made while one is traced run untraced.
+        """
+        if not self._trace_lock.acquire(blocking=False):
+            return generate(*args, **kwargs)
+        try:
+            import torch #type: ignore
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+            with torch.profiler.profile(activities=activities, record_shapes=True) as profiler:
+                with torch.profiler.record_function("generate"):
+                    result = generate(*args, **kwargs)
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "trace.json")
+                profiler.export_chrome_trace(path)
+                with open(path, "rb") as f:
+                    self.traces.append(f.read())
+            return result
+        finally:
+            self._trace_lock.release()
+
+    async def monitor_event_loop(self):
+        """How late the loop wakes a sleeping task: time other code held the loop without yielding"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lags.append(loop.time() - start - LOOP_LAG_INTERVAL)
+
+    async def run(self) -> bytes:
+        if self.sampler:
+            self.sampler.start()
+        monitor = asyncio.create_task(self.monitor_event_loop())
+        try:
+            await asyncio.wait_for(self._finished.wait(), timeout=self.seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            monitor.cancel()
+            self.ended_at = time.time()
+            if self.sampler:
+                await asyncio.to_thread(self.sampler.stop)
+        return self.artifact()
+
+    def summary(self) -> dict:
+        lags = sorted(self.loop_lags)
+        return {
+            "mode": self.mode,
+            "startedAt": int(self.started_at),
+            "durationSeconds": round((self.ended_at or time.time()) - self.started_at, 3),
+            "requests": self.requests,
+            "samples": self.sampler.samples if self.sampler else 0,
+            "traces": len(self.traces),
+            "eventLoopLagMs": {
+                "p50": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+                "p99": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+                "max": round(lags[-1] * 1000, 2) if lags else 0.0
+            }
+        }
+
+    def artifact(self) -> bytes:
+        """A zip with summary.json and the profile: stacks.folded, or one Chrome trace per traced call"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("summary.json", json.dumps(self.summary(), indent=2))
+            if self.sampler:
+                archive.writestr("stacks.folded", self.sampler.folded())
+            for index, trace in enumerate(self.traces):
+                archive.writestr(f"trace-{index + 1}.json", trace)
+        return buffer.getvalue()
+
+
+# The running profile, if any. Request paths only check it for None.
+active_session: Optional[ProfileSession] = None
+
+def request_finished():
+    if active_session is not None:
+        active_session.request_finished()
+
+def traced(generate: Callable) -> Callable:
+    """generate itself, or a wrapper tracing it while a torch profile is running"""
+    session = active_session
+    if session is None or session.mode != "torch":
+        return generate
+    return lambda *args, **kwargs: session.trace(generate, *args, **kwargs)
+
+async def run_profile(mode: str, max_requests: Optional[int], seconds: float, interval: float) -> tuple[bytes, dict]:
+    """Profile until the session ends and return (zip artifact, summary). One profile runs at a time."""
+    global active_session
+    if active_session is not None:
+        raise RuntimeError("A profile is already running")
+
+    session = ProfileSession(mode, max_requests, seconds, interval)
+    active_session = session
+    try:
+        artifact = await session.run()
+    finally:
+        active_session = None
+    return artifact, session.summary()
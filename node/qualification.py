@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from utils import get_redis_client, update_node_fields_in_redis, model_key
+
+BENCHMARK_PROMPT_TOKENS = int(os.getenv("NODE_BENCHMARK_PROMPT_TOKENS", "128"))
+BENCHMARK_DECODE_TOKENS = int(os.getenv("NODE_BENCHMARK_DECODE_TOKENS", "32"))
+BENCHMARK_BATCH_SIZES = [int(size) for size in os.getenv("NODE_BENCHMARK_BATCH_SIZES", "1,4,8").split(",")]
+
+# Used when the model's library entry doesn't set minDecodeTokensPerSecond
+DEFAULT_MIN_DECODE_TPS = float(os.getenv("NODE_MIN_DECODE_TPS", "1.0"))
+
+# Only one benchmark may run at a time
+benchmark_lock = threading.Lock()
+
+def get_qualification_floor(model_id: str) -> dict:
+    """Per-model minimums from the model's Redis hash, falling back to node defaults"""
+    floor = {"minDecodeTokensPerSecond": DEFAULT_MIN_DECODE_TPS, "minPrefillTokensPerSecond": 0.0}
+    try:
+        client = get_redis_client()
+        model_data = client.hgetall(model_key(model_id))
+        for field in floor:
+            if model_data.get(field):
+                floor[field] = float(model_data[field])
+    except Exception as e:
+        logging.warning(f"Failed to read qualification floor for {model_id}: {e}")
+    return floor
+
+def is_qualified(results: dict, floor: dict) -> bool:
+    """Single-request decode and prefill throughput must meet the model's floor"""
+    decode_tps = results["decodeTokensPerSecond"].get("1", 0.0)
+    return (
+        decode_tps >= floor["minDecodeTokensPerSecond"]
+        and results["prefillTokensPerSecond"] >= floor["minPrefillTokensPerSecond"]
+    )
+
+def qualification_fields(results: Optional[dict]) -> dict:
+    """Node hash fields recording a benchmark, or clearing them without one"""
+    if not results:
+        return {"benchmark": "", "qualified": ""}
+    return {
+        "benchmark": json.dumps(results),
+        "qualified": "true" if results["qualified"] else "false"
+    }
+
+def run_benchmark(node_id: str, model_id: str, backend, pending: bool = False) -> dict:
+    """
+    Benchmark the loaded model, store the results in the node's Redis hash and
+    mark the node qualified or not. With pending (a hot swap's replacement
+    model), the results go to pendingBenchmark/pendingQualified so the model
+    still being served keeps its qualification. Raises RuntimeError if a
+    benchmark is already running.
+    """
+    if not benchmark_lock.acquire(blocking=False):
+        raise RuntimeError("A benchmark is already running")
+
+    try:
+        logging.info(f"Benchmarking model {model_id}...")
+        results = backend.benchmark(BENCHMARK_PROMPT_TOKENS, BENCHMARK_DECODE_TOKENS, BENCHMARK_BATCH_SIZES)
+        floor = get_qualification_floor(model_id)
+        qualified = is_qualified(results, floor)
+
+        results.update({
+            "modelId": model_id,
+            "promptTokens": BENCHMARK_PROMPT_TOKENS,
+            "decodeTokens": BENCHMARK_DECODE_TOKENS,
+            "floor": floor,
+            "qualified": qualified,
+            "benchmarkedAt": int(time.time())
+        })
+
+        fields = qualification_fields(results)
+        if pending:
+            fields = {"pendingBenchmark": fields["benchmark"], "pendingQualified": fields["qualified"]}
+        update_node_fields_in_redis(node_id, fields)
+
+        if qualified:
+            logging.info(f"Benchmark results: {results}")
+        else:
+            logging.warning(f"Node does not meet the floor for {model_id}: {results}")
+
+        return results
+    finally:
+        benchmark_lock.release()
@@ -0,0 +1,86 @@
+import logging
+from typing import Optional
+
+import torch #type: ignore
+
+# Quantization profiles that can be requested per assignment
+#   int8-dynamic: int8 dynamic quantization of nn.Linear layers (CPU only)
+#   int8:         bitsandbytes 8-bit weight-only quantization (CUDA only)
+#   int4:         bitsandbytes 4-bit NF4 weight-only quantization (CUDA only)
+QUANTIZATION_DEVICES = {
+    "int8-dynamic": ("cpu",),
+    "int8": ("cuda",),
+    "int4": ("cuda",),
+}
+
+def validate_quantization(quantization: Optional[str], device: str):
+    """Raise ValueError if the profile is unknown or unsupported on this device"""
+    if not quantization:
+        return
+
+    if quantization not in QUANTIZATION_DEVICES:
+        raise ValueError(
+            f"Unknown quantization '{quantization}'. "
+            f"Supported: {', '.join(QUANTIZATION_DEVICES)}"
+        )
+
+    if device not in QUANTIZATION_DEVICES[quantization]:
+        raise ValueError(f"Quantization '{quantization}' is not supported on {device}")
+
+    if quantization in ("int8", "int4"):
+        try:
+            import bitsandbytes #type: ignore # noqa: F401
+        except ImportError:
+            raise ValueError(f"Quantization '{quantization}' requires bitsandbytes to be installed")
+
+def quantization_load_kwargs(quantization: Optional[str]) -> dict:
+    """Extra from_pretrained kwargs for a quantization profile"""
+    if quantization == "int8-dynamic":
+        # quantize_dynamic only accepts float32 modules
+        return {"dtype": torch.float32}
+
+    if quantization in ("int8", "int4"):
+        from transformers import BitsAndBytesConfig
+
+        if quantization == "int8":
+            config = BitsAndBytesConfig(load_in_8bit=True)
+        else:
+            config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.float16
+            )
+        return {"quantization_config": config}
+
+    return {}
+
+def apply_post_load_quantization(model, quantization: Optional[str]):
+    """Quantize a loaded model in place for profiles that are applied after loading"""
+    if quantization == "int8-dynamic":
+        logging.info("Applying int8 dynamic quantization to linear layers...")
+        model = torch.ao.quantization.quantize_dynamic(
+            model,
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+            inplace=True
+        )
+    return model
+
+def model_memory_footprint(model) -> int:
+    """
+    Bytes held by a model's weights and buffers, including the packed weights
+    of dynamically quantized layers, which are not registered as parameters.
+    """
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+
+    for module in model.modules():
+        if hasattr(module, "_packed_params") and callable(getattr(module, "weight", None)):
+            weight = module.weight()
+            total += weight.numel() * weight.element_size()
+            bias = module.bias()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+
+    return total
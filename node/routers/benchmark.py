@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException
+from utils import is_node_authenticated, get_node_details
+from qualification import run_benchmark
+import asyncio
+import json
+import app
+
+router = APIRouter(
+    prefix="",
+    tags=["benchmark"]
+)
+
+@router.post("/benchmark")
+async def post_benchmark():
+    """
+    Benchmark the loaded model now and update the node's qualification
+    """
+    if not is_node_authenticated(app.node_id):
+        raise HTTPException(status_code=403, detail="Node not authenticated")
+
+    if not app.loaded_model:
+        raise HTTPException(status_code=503, detail="No model loaded")
+
+    active_model_data = app.loaded_model
+
+    # Counted as in-flight work so a swap or drain waits for it
+    with active_model_data["in_flight"]:
+        try:
+            return await asyncio.to_thread(
+                run_benchmark,
+                app.node_id,
+                active_model_data["model_id"],
+                active_model_data["backend"]
+            )
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Benchmark failed: {str(e)}")
+
+@router.get("/benchmark")
+async def get_benchmark():
+    """
+    Results of the most recent benchmark
+    """
+    node_details = get_node_details(app.node_id)
+    if not node_details.get('benchmark'):
+        raise HTTPException(status_code=404, detail="No benchmark results")
+
+    return json.loads(node_details['benchmark'])
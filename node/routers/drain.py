@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from utils import update_node_fields_in_redis
+from routers.setup import unload_model
+
+import app
+
+router = APIRouter(
+    prefix="",
+    tags=["drain"]
+)
+
+# How long in-flight generations may run after a drain starts
+DRAIN_TIMEOUT = float(os.getenv("NODE_DRAIN_TIMEOUT", "120"))
+
+drain_lock = threading.Lock()
+drain_finished = threading.Event()
+
+def begin_drain() -> bool:
+    """
+    Mark the node as draining in Redis so the router stops selecting it.
+    Returns False if the node is already draining or offline.
+    """
+    with drain_lock, app.activation_lock:
+        if app.drain_state is not None:
+            return False
+        app.drain_state = "draining"
+        drain_finished.clear()
+
+        update_node_fields_in_redis(app.node_id, {
+            "status": "draining",
+            "modelStatus": "draining"
+        })
+
+    logging.info("Node draining, no longer accepting routed traffic")
+    return True
+
+def finish_drain(deadline: float):
+    """
+    Wait for in-flight generations to finish (until the monotonic deadline),
+    release the model and mark the node offline.
+    """
+    active_model_data = app.loaded_model
+    if active_model_data:
+        remaining = max(deadline - time.monotonic(), 0)
+        if not active_model_data["in_flight"].wait_idle(remaining):
+            logging.warning(
+                f"{active_model_data['in_flight'].count} generations still running "
+                f"at the drain deadline, releasing the model anyway"
+            )
+
+        model_id = active_model_data["model_id"]
+        del active_model_data
+        unload_model(model_id)
+
+    update_node_fields_in_redis(app.node_id, {
+        "status": "offline",
+        "modelStatus": "idle",
+        "activeModelId": "",
+        "activeModelName": ""
+    })
+
+    app.drain_state = "offline"
+    drain_finished.set()
+    logging.info("Node drained and offline")
+
+def drain_node(timeout: float = DRAIN_TIMEOUT):
+    """Drain synchronously, or wait for a drain that is already running"""
+    deadline = time.monotonic() + timeout
+    if begin_drain():
+        finish_drain(deadline)
+    elif app.drain_state == "draining":
+        drain_finished.wait(timeout)
+
+def install_sigterm_handler():
+    """
+    Drain on SIGTERM before handing the signal to uvicorn. Must be installed
+    after uvicorn has set its own handlers, i.e. from the app's lifespan.
+
+    Uvicorn stops accepting connections as soon as it sees the signal, so it is
+    only passed on once in-flight work has drained. Requests the router sent
+    just before it saw the draining status are still served.
+    """
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        def drain_then_exit():
+            drain_node()
+            if callable(previous_handler):
+                previous_handler(signum, frame)
+
+        threading.Thread(target=drain_then_exit, name="sigterm-drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+@router.post("/drain")
+async def post_drain(timeoutSeconds: Optional[float] = None):
+    """
+    Take the node out of rotation. In-flight generations may finish until the
+    timeout, then the model is released and the node is marked offline.
+    Assigning a model brings the node back.
+    """
+    timeout = DRAIN_TIMEOUT if timeoutSeconds is None else timeoutSeconds
+    deadline = time.monotonic() + timeout
+    if not begin_drain():
+        raise HTTPException(status_code=409, detail=f"Node is already {app.drain_state}")
+    asyncio.create_task(asyncio.to_thread(finish_drain, deadline))
+
+    return JSONResponse(
+        content={
+            "detail": f"Node draining, model will be released within {timeout:.0f}s",
+            "status": "draining"
+        },
+        status_code=202
+    )
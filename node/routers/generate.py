@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from utils import is_node_authenticated
+from utils import is_node_authenticated, update_node_fields_in_redis
+from admission import estimate_wait_seconds
+import profiling
+import asyncio
+import time
 import app
 
 from models.models import GenerateRequest, GenerateResponse
@@ -9,6 +13,32 @@ router = APIRouter(
     tags=["generate"]
 )
 
+# Generation metrics are written to the node's Redis hash at most this often
+STATS_PUBLISH_INTERVAL = 30.0
+last_stats_publish = 0.0
+
+def publish_generation_stats(backend):
+    global last_stats_publish
+
+    now = time.monotonic()
+    if now - last_stats_publish < STATS_PUBLISH_INTERVAL:
+        return
+    last_stats_publish = now
+
+    details = backend.describe()
+    fields = {
+        "tokensPerSecond": str(details["stats"]["tokensPerSecond"]),
+        "decodeStepsSaved": str(details["stats"]["decodeStepsSaved"])
+    }
+    if "speculative" in details:
+        fields["speculativeAcceptanceRate"] = str(details["speculative"]["acceptanceRate"])
+    update_node_fields_in_redis(app.node_id, fields)
+
+async def publish_token_budget(token_budget):
+    """Keep the router's view of this node's free capacity current, without blocking the event loop"""
+    fields = {"availableTokenBudget": str(token_budget.available)}
+    await asyncio.to_thread(update_node_fields_in_redis, app.node_id, fields)
+
 @router.post("/generate", response_model=GenerateResponse)
 async def generate_text(request: GenerateRequest):
     if not is_node_authenticated(app.node_id):
@@ -19,26 +49,64 @@ async def generate_text(request: GenerateRequest):
         raise HTTPException(status_code=503, detail="No model loaded")
 
     active_model_data = app.loaded_model
-    generator = active_model_data["generator"]
-    tokenizer = active_model_data["tokenizer"]
 
-    try:
-        # Generate text
-        outputs = generator(
-            request.prompt,
-            max_new_tokens=request.max_new_tokens,
-            temperature=request.temperature,
-            do_sample=request.do_sample,
-            pad_token_id=tokenizer.eos_token_id if tokenizer else None,
-            return_full_text=False
+    # The router names the model it routed for; reject if a hot swap changed it
+    if request.model_id and request.model_id != active_model_data["model_id"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Model {request.model_id} is no longer loaded on this node"
         )
 
-        generated_text = outputs[0]["generated_text"]
+    backend = active_model_data["backend"]
+    token_budget = active_model_data["token_budget"]
 
-        return GenerateResponse(
-            generated_text=generated_text,
-            model=active_model_data["model_name"]
+    # Admission control: commit prompt plus max new tokens against the budget
+    committed_tokens = backend.count_tokens(request.prompt) + request.max_new_tokens
+    if committed_tokens > token_budget.capacity:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request needs {committed_tokens} tokens, node capacity is {token_budget.capacity}"
+        )
+    if not token_budget.try_reserve(committed_tokens):
+        wait_seconds = estimate_wait_seconds(
+            committed_tokens,
+            token_budget.available,
+            backend.generation_stats()["tokensPerSecond"]
         )
+        raise HTTPException(
+            status_code=429,
+            detail=f"Node at capacity, retry in about {wait_seconds}s",
+            headers={"Retry-After": str(wait_seconds)}
+        )
+
+    try:
+        await publish_token_budget(token_budget)
+
+        # Count the request against this model so a hot swap can drain it
+        with active_model_data["in_flight"]:
+            # Generate text off the event loop so requests run concurrently
+            result = await asyncio.to_thread(
+                profiling.traced(backend.generate),
+                request.prompt,
+                max_new_tokens=request.max_new_tokens,
+                temperature=request.temperature,
+                do_sample=request.do_sample,
+                stop=request.stop
+            )
+
+            publish_generation_stats(backend)
+
+            return GenerateResponse(
+                generated_text=result.text,
+                model=active_model_data["model_name"],
+                finish_reason=result.finish_reason,
+                prompt_tokens=result.prompt_tokens,
+                completion_tokens=result.completion_tokens
+            )
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+    finally:
+        token_budget.release(committed_tokens)
+        await publish_token_budget(token_budget)
+        profiling.request_finished()
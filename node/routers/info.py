@@ -1,5 +1,7 @@
+import asyncio
 from fastapi import APIRouter
 from utils import is_node_authenticated, get_node_details
+from memory import memory_report
 import app
 
 router = APIRouter(
@@ -12,6 +14,9 @@ async def info():
 
     node_details = get_node_details(app.node_id)
 
+    # Device stays null until detection finishes in the background
+    app.start_device_detection()
+
     return {
         "node_name": node_details.get('nodeName'),
         "node_status": node_details.get('status'),
@@ -19,5 +24,21 @@ async def info():
         "active_model_id": node_details.get('activeModelId'),
         "model_status": node_details.get('modelStatus'),
         "authenticated": is_node_authenticated(app.node_id),
-        "device": app.get_device()
-    }
\ No newline at end of file
+        "device": app.device,
+        "backend": app.loaded_model["backend"].describe() if app.loaded_model else None,
+        "memory_footprint_bytes": app.loaded_model.get('memory_footprint')
+    }
+
+@router.get("/memory")
+async def memory():
+    """
+    Memory available to a model assigned now. The router checks it against the
+    model's estimated footprint before sending an assignment. A model that is
+    replaced without a hot swap is unloaded first, so its weights count as usable.
+    """
+
+    # Detecting the device imports torch, which the assignment that follows needs anyway
+    device = await asyncio.to_thread(app.get_device)
+    report = await asyncio.to_thread(memory_report, device)
+    report["loadedModelBytes"] = app.loaded_model.get('memory_footprint') or 0
+    return report
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+import json
+import app
+
+import profiling
+from models.models import ProfileRequest
+
+router = APIRouter(
+    prefix="",
+    tags=["profile"]
+)
+
+@router.post("/profile")
+async def post_profile(request: ProfileRequest):
+    """
+    Profile the node for the next `requests` generate calls or `seconds`,
+    whichever ends first, and return the profile as a zip. `sampling` samples
+    every thread's Python stack (a flame graph of tokenization, generation and
+    event loop work); `torch` records a torch profiler trace of each generate call.
+    """
+    if request.mode not in profiling.PROFILE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown mode '{request.mode}'. Supported: {', '.join(profiling.PROFILE_MODES)}"
+        )
+    if not 0 < request.seconds <= profiling.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be between 0 and {profiling.PROFILE_MAX_SECONDS:.0f}"
+        )
+    if request.requests is not None and request.requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+    if not 1 <= request.intervalMs <= 1000:
+        raise HTTPException(status_code=400, detail="intervalMs must be between 1 and 1000")
+
+    if request.mode == "torch":
+        backend = app.loaded_model.get("backend") if app.loaded_model else None
+        if backend is None or backend.name != "transformers":
+            raise HTTPException(status_code=409, detail="torch profiles need a model loaded with the transformers backend")
+
+    try:
+        artifact, summary = await profiling.run_profile(
+            request.mode, request.requests, request.seconds, request.intervalMs / 1000
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return Response(
+        content=artifact,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="node-profile-{request.mode}-{summary["startedAt"]}.zip"',
+            "X-Profile-Summary": json.dumps(summary)
+        }
+    )
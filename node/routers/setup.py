@@ -3,15 +3,30 @@ import random
 import asyncio
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
-from utils import get_redis_client, is_node_authenticated, get_node_user_id, update_node_status_in_redis
+from utils import (
+    get_redis_client, is_node_authenticated, get_node_user_id, update_node_status_in_redis,
+    update_pending_model_status_in_redis, activate_model_in_redis, update_node_fields_in_redis,
+    node_key, setup_key, PENDING_SWAP_FIELDS
+)
 import logging
 import os
-import torch #type: ignore
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import gc
+import sys
 
 import app
+from inflight import InFlightCounter
+from backends import create_backend, InferenceBackend
+from qualification import run_benchmark, qualification_fields
+from admission import TokenBudget, derive_token_budget
+from model_store import model_store
 from models.models import AssignModel
 
+# How long a replaced model may keep finishing in-flight requests after a hot swap
+SWAP_DRAIN_TIMEOUT = float(os.getenv("SWAP_DRAIN_TIMEOUT", "300"))
+
+# Benchmark every model after it loads and before it is marked ready
+BENCHMARK_ON_LOAD = os.getenv("NODE_BENCHMARK_ON_LOAD", "true").lower() in ("1", "true", "yes")
+
 router = APIRouter(
     prefix="",
     tags=["setup"]
@@ -80,9 +95,11 @@ async def get_setup_info(request: Request):
 
     try:
         client = get_redis_client()
-        client.setex(f'setup_token:{setup_token}', 3600, app.node_id)
-        client.setex(f'setup_token_name:{setup_token}', 3600, node_name)
-        client.setex(f'setup_node_url:{setup_token}', 3600, node_url)
+        pipe = client.pipeline()
+        pipe.setex(setup_key(setup_token, 'nodeId'), 3600, app.node_id)
+        pipe.setex(setup_key(setup_token, 'name'), 3600, node_name)
+        pipe.setex(setup_key(setup_token, 'url'), 3600, node_url)
+        pipe.execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate setup token: {str(e)}")
 
@@ -109,138 +126,285 @@ async def post_assign_model(request: AssignModel):
             detail="This node is not authenticated.  Please authenticate by calling http://localhost:PORT/setup."
         )
 
+    if app.drain_state == "draining":
+        raise HTTPException(
+            status_code=409,
+            detail="Node is draining. Wait for it to go offline before assigning a model."
+        )
+
+    # Reject unsupported backend options before anything is unloaded. Creating the
+    # first backend imports the ML libraries, so do it off the event loop
+    try:
+        backend = await asyncio.to_thread(create_backend_for_assignment, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     client = get_redis_client()
-    node = client.hgetall(f'node:{request.nodeId}')
+    node = client.hgetall(node_key(request.nodeId))
 
-    if node.get('activeModelId'):
-        if app.loaded_model.get('model_id') == request.modelId:
-            return JSONResponse(
-                content={"detail": f"{request.modelId} is currently loaded"},
-                status_code=208
+    if node.get('activeModelId') and app.loaded_model.get('model_id') == request.modelId:
+        return JSONResponse(
+            content={"detail": f"{request.modelId} is currently loaded"},
+            status_code=208
+        )
+
+    # Claimed in-process, so concurrent assignments can't both start a load
+    with app.activation_lock:
+        if app.loading_model_id:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Loading {app.loading_model_id} is already in progress."
             )
+        app.loading_model_id = request.modelId
+
+    hot_swap = False
+    if node.get('activeModelId'):
+        if request.hotSwap and app.loaded_model:
+            # Keep serving the current model until the replacement is ready
+            hot_swap = True
         else:
             unload_model(request.modelId)
 
+    # Assigning a model brings a drained node back into rotation
+    if app.drain_state == "offline":
+        app.drain_state = None
+        update_node_fields_in_redis(app.node_id, {"status": "active"})
+
     # Set initial status in Redis
-    update_node_status_in_redis(app.node_id, "queued", request.modelId, request.modelName)
+    if hot_swap:
+        update_pending_model_status_in_redis(app.node_id, "queued", request.modelId, request.modelName)
+    else:
+        # Also clears what a failed hot swap left behind
+        update_node_fields_in_redis(app.node_id, {
+            "modelStatus": "queued",
+            "activeModelId": request.modelId,
+            "activeModelName": request.modelName,
+            **PENDING_SWAP_FIELDS
+        })
 
     # Start the model loading in the background
-    asyncio.create_task(load_model_async(request.modelId, request.modelName))
+    asyncio.create_task(load_model_async(request.modelId, request.modelName, backend, hot_swap))
 
     # Return immediately with 202 Accepted
     return JSONResponse(
         content={
             "detail": f"Model {request.modelId} loading started.",
-            "status": "queued"
+            "status": "queued",
+            "hotSwap": hot_swap
         },
         status_code=202
     )
 
-async def load_model_async(model_id: str, model_name: str):
+def create_backend_for_assignment(request: AssignModel) -> InferenceBackend:
+    return create_backend(
+        request.backend,
+        app.get_device(),
+        quantization=request.quantization,
+        gguf_file=request.ggufFile,
+        draft_model_name=request.draftModelName
+    )
+
+async def load_model_async(model_id: str, model_name: str, backend: InferenceBackend, hot_swap: bool = False):
     """Async wrapper for load_model to run in background"""
-    await asyncio.to_thread(load_model, model_id, model_name)
+    await asyncio.to_thread(load_model, model_id, model_name, backend, hot_swap)
+
+def publish_download_progress(percent: int):
+    update_node_fields_in_redis(app.node_id, {"downloadProgress": str(percent)})
 
 def load_model(
         model_id: str,
-        model_name: str
+        model_name: str,
+        backend: InferenceBackend,
+        hot_swap: bool = False
     ) -> bool:
 
+    # During a hot swap progress goes to the pending fields so the router
+    # keeps routing to the model that is still being served
+    if hot_swap:
+        update_status = update_pending_model_status_in_redis
+    else:
+        update_status = update_node_status_in_redis
+
+    snapshot = None
     try:
-        update_node_status_in_redis(app.node_id, "downloading", model_id, model_name)
-        model_path = f"/models/{model_name}"
-
-        # Download model if not exists
-        if not os.path.exists(model_path):
-            logging.info(f"Downloading model {model_name} to {model_path}...")
-            import subprocess
-            result = subprocess.run(
-                ["huggingface-cli", "download", model_name, "--local-dir", model_path],
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
-                logging.error(f"Failed to download model: {result.stderr}")
-                update_node_status_in_redis(app.node_id, "error", "", "")
-                return False
+        update_status(app.node_id, "downloading", model_id, model_name)
 
-        update_node_status_in_redis(app.node_id, "loading", model_id, model_name)
-        device = app.get_device()
-        logging.info(f"Loading model {model_name} from {model_path}...")
-        logging.info(f"Using device: {device}")
-
-        # Load tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-
-        # Load model with device-specific optimizations
-        if device == "cuda":
-            logging.info("Loading model with CUDA optimizations...")
-            model = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                low_cpu_mem_usage=True
-            )
-            generator = pipeline(
-                "text-generation",
-                model=model,
-                tokenizer=tokenizer
-            )
-        elif device == "mps":
-            logging.info("Loading model with MPS optimizations...")
-            model = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16,
-                device_map="auto"
-            )
-            generator = pipeline(
-                "text-generation",
-                model=model,
-                tokenizer=tokenizer
-            )
-        else:
-            logging.info("Loading model for CPU...")
-            model = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                dtype=torch.float16,
-                low_cpu_mem_usage=True,
-                device_map="auto"
-            )
-            generator = pipeline(
-                "text-generation",
-                model=model,
-                tokenizer=tokenizer
-            )
+        # Resolve the model in the host's shared store, downloading only files it doesn't have
+        try:
+            snapshot = model_store.prepare(model_name, backend.download_patterns(), publish_download_progress)
+        finally:
+            update_node_fields_in_redis(app.node_id, {"downloadProgress": ""})
+        model_path = snapshot.path
 
-        # Store in loaded_models dictionary
-        app.loaded_model = {
-            "model": model,
-            "tokenizer": tokenizer,
-            "generator": generator,
+        update_status(app.node_id, "loading", model_id, model_name)
+        logging.info(f"Loading model {model_name} from {model_path}...")
+        logging.info(f"Using device: {backend.device}, backend: {backend.name}")
+
+        backend.load(model_name, model_path)
+
+        # Pay one-off initialization before the model is marked ready
+        try:
+            backend.warmup()
+        except Exception as e:
+            logging.warning(f"Model warmup failed: {e}")
+
+        # Qualify the node for this model before it is marked ready. During a hot
+        # swap the results are held back until the swap, so the model still
+        # being served keeps its qualification
+        results = None
+        if BENCHMARK_ON_LOAD:
+            update_status(app.node_id, "benchmarking", model_id, model_name)
+            try:
+                results = run_benchmark(app.node_id, model_id, backend, pending=hot_swap)
+            except Exception as e:
+                logging.warning(f"Benchmark of {model_name} failed: {e}")
+        qualification = qualification_fields(results)
+        if not hot_swap:
+            update_node_fields_in_redis(app.node_id, qualification)
+        elif results and not results["qualified"]:
+            # Keep serving the current model rather than swap to one the node can't serve
+            raise RuntimeError(f"Node does not meet the qualification floor for {model_name}")
+
+        memory_footprint = backend.memory_footprint()
+        logging.info(f"Model memory footprint: {memory_footprint / 1024 ** 2:.1f} MiB")
+
+        new_model = {
+            "backend": backend,
             "model_name": model_name,
-            "model_id": model_id
+            "model_id": model_id,
+            "memory_footprint": memory_footprint,
+            "snapshot": snapshot,
+            "in_flight": InFlightCounter(),
+            "token_budget": TokenBudget(derive_token_budget(backend)),
+            "qualification": qualification
         }
 
-        update_node_status_in_redis(app.node_id, "ready", model_id, model_name)
-
         logging.info(f"Model {model_name} loaded successfully!")
-        logging.info(f"Model device: {model.device}")
+        collect_store_garbage()
+
+        if hot_swap:
+            activated = swap_model(new_model)
+        else:
+            with app.activation_lock:
+                app.loading_model_id = None
+                activated = app.drain_state is None
+                if activated:
+                    app.loaded_model = new_model
+                    activate_model_in_redis(app.node_id, model_id, model_name)
+
+        if not activated:
+            # The node started draining while the model loaded; don't bring it back
+            logging.info(f"Node drained while {model_name} loaded, discarding it")
+            discard_model(new_model, hot_swap)
+            return False
+
+        details = backend.describe()
+        update_node_fields_in_redis(app.node_id, {
+            "backend": backend.name,
+            "quantization": details.get("quantization", ""),
+            "draftModelStatus": details.get("speculative", {}).get("status", ""),
+            "memoryFootprintBytes": str(memory_footprint),
+            "tokenBudget": str(new_model["token_budget"].capacity),
+            "availableTokenBudget": str(new_model["token_budget"].available)
+        })
 
         return True
 
     except Exception as e:
         logging.error(f"Failed to load model {model_name}: {str(e)}")
-        update_node_status_in_redis(app.node_id, "error", "", "")
+        if snapshot:
+            snapshot.release()
+        update_status(app.node_id, "error", "", "")
+        with app.activation_lock:
+            if app.loading_model_id == model_id:
+                app.loading_model_id = None
         return False
-    
+
+def swap_model(new_model: dict):
+    """
+    Atomically make new_model the active model, then drain and release the old one.
+    Requests that already started on the old model keep their reference to it and
+    finish normally. Returns False without swapping if the node is draining.
+    """
+
+    with app.activation_lock:
+        app.loading_model_id = None
+        if app.drain_state is not None:
+            return False
+        old_model = app.loaded_model
+        app.loaded_model = new_model
+        activate_model_in_redis(
+            app.node_id, new_model["model_id"], new_model["model_name"], new_model["qualification"]
+        )
+
+    if not old_model:
+        return True
+
+    old_model_id = old_model.get("model_id")
+    logging.info(f"Swapped to {new_model['model_id']}, draining {old_model_id}...")
+    if not old_model["in_flight"].wait_idle(SWAP_DRAIN_TIMEOUT):
+        logging.warning(
+            f"Model {old_model_id} still has {old_model['in_flight'].count} in-flight "
+            f"requests after {SWAP_DRAIN_TIMEOUT}s, releasing anyway"
+        )
+
+    # Memory is freed once the last in-flight request drops its reference
+    release_snapshot(old_model)
+    del old_model
+    release_model_memory()
+    logging.info(f"Model {old_model_id} released")
+
+    # The budget was derived while the old model still held its memory
+    new_model["token_budget"].resize(derive_token_budget(new_model["backend"]))
+    return True
+
+def discard_model(model: dict, hot_swap: bool):
+    """
+    Release the store snapshot of a loaded model that was never made active
+    and clear its status. Its weights are freed once the load drops its references.
+    """
+    release_snapshot(model)
+    if hot_swap:
+        update_node_fields_in_redis(app.node_id, PENDING_SWAP_FIELDS)
+    else:
+        update_node_status_in_redis(app.node_id, "idle", "", "")
+
 def unload_model(new_model_id: str):
     """Unload a model from memory to free resources"""
 
     logging.info(f"Unloading model {new_model_id}...")
 
+    old_model = app.loaded_model
     app.loaded_model = {}
+    release_snapshot(old_model)
+    release_model_memory()
 
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
+    logging.info(f'Model {new_model_id} unloaded successfully')
 
-    logging.info(f'Model {new_model_id} unloaded successfully')  
+def release_snapshot(model: dict):
+    """Drop the model's reference to its files in the store so they can be garbage collected"""
+    snapshot = model.get("snapshot") if model else None
+    if snapshot:
+        snapshot.release()
+
+def collect_store_garbage():
+    """Best effort: skipped when another container on the host is preparing a model"""
+    try:
+        result = model_store.collect_garbage()
+    except Exception as e:
+        logging.warning(f"Model store garbage collection failed: {e}")
+        return
+    if result and (result["snapshots"] or result["blobs"]):
+        logging.info(
+            f"Model store: removed {result['snapshots']} snapshots and {result['blobs']} blobs, "
+            f"freed {result['bytesFreed'] / 1024 ** 2:.1f} MiB"
+        )
+
+def release_model_memory():
+    """Return memory held by models that are no longer referenced"""
+    gc.collect()
+    # torch is only imported once a model has been loaded
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
@@ -1,22 +1,112 @@
 import redis
+import json
 import logging
 import os
 from typing import Optional
 from fastapi import HTTPException
 
+# Shared client: a cluster client discovers the slot layout when created
+_client = None
+
 def get_redis_client():
     # Use environment variables for flexibility
     # Default to host.docker.internal for Docker, but allow override for local dev
-    host = os.getenv('REDIS_HOST')
-    if not host:
-        raise HTTPException(status_code=500, detail="REDIS_HOST environment variable is not set")
-    port = int(os.getenv('REDIS_PORT'))
-    return redis.Redis(host=host, port=port, decode_responses=True)
+    # With REDIS_CLUSTER set, REDIS_HOST/REDIS_PORT is any node of the cluster
+    global _client
+    if _client is None:
+        host = os.getenv('REDIS_HOST')
+        if not host:
+            raise HTTPException(status_code=500, detail="REDIS_HOST environment variable is not set")
+        port = int(os.getenv('REDIS_PORT'))
+        if os.getenv('REDIS_CLUSTER', 'false').lower() in ('1', 'true', 'yes'):
+            from redis.cluster import RedisCluster
+            _client = RedisCluster(host=host, port=port, decode_responses=True)
+        else:
+            _client = redis.Redis(host=host, port=port, decode_responses=True)
+    return _client
+
+# Key layout shared with the router (router/src/utils/keys.py). The id in
+# braces is the hash tag, keeping each entity's keys in one cluster slot
+def node_key(node_id: str) -> str:
+    return f'node:{{{node_id}}}'
+
+def user_key(user_id: str, field: str) -> str:
+    return f'user:{{{user_id}}}:{field}'
+
+def model_key(model_id: str) -> str:
+    return f'model:{{{model_id}}}'
+
+def model_nodes_key(model_id: str) -> str:
+    """Nodes whose active model is model_id; the router picks nodes from it"""
+    return f'model:{{{model_id}}}:nodes'
+
+def setup_key(setup_token: str, field: str) -> str:
+    return f'setup:{{{setup_token}}}:{field}'
+
+# Node hash fields the dashboard shows. Changing one bumps the owner's nodes
+# version so unchanged dashboard polls can be answered with 304 Not Modified,
+# and publishes the change to routers streaming status to open dashboards
+DASHBOARD_FIELDS = {
+    "nodeId", "nodeName", "status", "modelStatus", "activeModelId", "activeModelName",
+    "pendingModelId", "pendingModelName", "pendingModelStatus", "qualified", "downloadProgress"
+}
+
+NODE_EVENTS_CHANNEL = "nodeEvents"
+
+# node id -> owning user id, cached since a node's owner doesn't change
+node_owners = {}
+
+def write_node_fields(client, node_id: str, fields: dict):
+    """
+    Write fields to the node's hash. If the dashboard shows any of them, bump
+    the owner's nodes version in the same round trip, then publish the change.
+    A change of active model also moves the node between the models' node sets.
+    """
+    visible = {field: value for field, value in fields.items() if field in DASHBOARD_FIELDS}
+    if not visible:
+        client.hset(node_key(node_id), mapping=fields)
+        return
+
+    owner = node_owners.get(node_id)
+    previous_model_id = None
+    if not owner or "activeModelId" in fields:
+        owner, previous_model_id = client.hmget(node_key(node_id), 'userId', 'activeModelId')
+        if owner:
+            node_owners[node_id] = owner
+
+    # Keys live in different slots, so this is a plain pipeline rather than a transaction
+    pipe = client.pipeline(transaction=False)
+    pipe.hset(node_key(node_id), mapping=fields)
+    if "activeModelId" in fields and fields["activeModelId"] != previous_model_id:
+        if previous_model_id:
+            pipe.srem(model_nodes_key(previous_model_id), node_id)
+        if fields["activeModelId"]:
+            pipe.sadd(model_nodes_key(fields["activeModelId"]), node_id)
+    if owner:
+        pipe.incr(user_key(owner, 'nodesVersion'))
+    pipe.execute()
+
+    # Cluster pipelines refuse PUBLISH, so it goes out on its own
+    if owner:
+        client.publish(NODE_EVENTS_CHANNEL, json.dumps({
+            "userId": owner,
+            "nodeId": node_id,
+            "fields": visible
+        }))
+
+# Node hash fields describing a hot swap, cleared once it ends
+PENDING_SWAP_FIELDS = {
+    "pendingModelStatus": "",
+    "pendingModelId": "",
+    "pendingModelName": "",
+    "pendingBenchmark": "",
+    "pendingQualified": ""
+}
 
 def update_node_status_in_redis(node_id: str, status: str, model_id: str = "", model_name: str = ""):
     try:
         client = get_redis_client()
-        client.hset(f'node:{node_id}', mapping={
+        write_node_fields(client, node_id, {
             "modelStatus": status,
             "activeModelId": model_id,
             "activeModelName": model_name
@@ -25,10 +115,52 @@ def update_node_status_in_redis(node_id: str, status: str, model_id: str = "", m
     except Exception as e:
         logging.warning(f"Failed to update Redis with status '{status}': {e}")
 
+def update_pending_model_status_in_redis(node_id: str, status: str, model_id: str = "", model_name: str = ""):
+    """
+    Publish the progress of a hot swap. The active model fields are left alone so
+    the router keeps routing to the model that is still serving.
+    """
+    try:
+        client = get_redis_client()
+        write_node_fields(client, node_id, {
+            "pendingModelStatus": status,
+            "pendingModelId": model_id,
+            "pendingModelName": model_name
+        })
+        logging.debug(f"Updated Redis: pendingModelStatus={status}, pendingModelId={model_id}")
+    except Exception as e:
+        logging.warning(f"Failed to update Redis with pending status '{status}': {e}")
+
+def activate_model_in_redis(node_id: str, model_id: str, model_name: str, qualification: Optional[dict] = None):
+    """
+    Switch the active model, promote its qualification and clear the pending
+    swap fields in a single write
+    """
+    try:
+        client = get_redis_client()
+        write_node_fields(client, node_id, {
+            "modelStatus": "ready",
+            "activeModelId": model_id,
+            "activeModelName": model_name,
+            **(qualification or {}),
+            **PENDING_SWAP_FIELDS
+        })
+        logging.debug(f"Updated Redis: activated {model_id}")
+    except Exception as e:
+        logging.warning(f"Failed to update Redis when activating '{model_id}': {e}")
+
+def update_node_fields_in_redis(node_id: str, fields: dict):
+    try:
+        client = get_redis_client()
+        write_node_fields(client, node_id, fields)
+        logging.debug(f"Updated Redis: {', '.join(fields)}")
+    except Exception as e:
+        logging.warning(f"Failed to update Redis fields {list(fields)}: {e}")
+
 def is_node_authenticated(node_id: str) -> bool:
     try:
         client = get_redis_client()
-        node_data = client.hgetall(f'node:{node_id}')
+        node_data = client.hgetall(node_key(node_id))
         return bool(node_data and node_data.get('userId'))
     except Exception as e:
         logging.warning(f"Failed to check authentication status: {e}")
@@ -37,7 +169,7 @@ def is_node_authenticated(node_id: str) -> bool:
 def get_node_user_id(node_id: str) -> Optional[str]:
     try:
         client = get_redis_client()
-        node_data = client.hgetall(f'node:{node_id}')
+        node_data = client.hgetall(node_key(node_id))
         return node_data.get('userId')
     except Exception as e:
         logging.warning(f"Failed to get user ID: {e}")
@@ -46,7 +178,7 @@ def get_node_user_id(node_id: str) -> Optional[str]:
 def get_node_api_key(node_id: str) -> Optional[str]:
     try:
         client = get_redis_client()
-        node_data = client.hgetall(f'node:{node_id}')
+        node_data = client.hgetall(node_key(node_id))
         return node_data.get('apiKey')
     except Exception as e:
         logging.warning(f"Failed to get API key: {e}")
@@ -55,7 +187,7 @@ def get_node_api_key(node_id: str) -> Optional[str]:
 def get_node_details(node_id: str) -> dict:
     try:
         client = get_redis_client()
-        node_data = client.hgetall(f'node:{node_id}')
+        node_data = client.hgetall(node_key(node_id))
         return node_data
     except Exception as e:
         logging.warning(f"Failed to get node details: {e}")
@@ -0,0 +1,110 @@
+"""
+Exercise the router's Redis access patterns against a Redis Cluster.
+
+Start a local cluster and run from router/src:
+    ./scripts/redis-cluster.sh start
+    REDIS_CLUSTER=true REDIS_HOST=127.0.0.1 REDIS_PORT=7000 python -m benchmarks.cluster_check
+
+Adds a model to a throwaway user's library, authenticates a node with a setup
+token, marks it ready with the node's own write_node_fields (node/utils.py)
+and routes to it by id and by name.
+Along the way it checks the dashboard ETags. Any cross-slot command fails
+loudly under a cluster. Everything created is deleted at the end.
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import uuid
+
+from fastapi.testclient import TestClient
+
+from main import app
+from routers.completion import find_node_with_model
+from utils.redis import get_redis_client, redis_cluster_enabled
+from utils.keys import node_key, model_key, model_nodes_key, user_key, setup_key, NODES_INDEX, MODELS_BY_NAME
+
+def load_node_utils():
+    """node/utils.py, loaded by path since the router has its own utils package"""
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "node", "utils.py")
+    spec = importlib.util.spec_from_file_location("node_utils", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def check(label: str, condition: bool):
+    print(f"{'✓' if condition else '✗'} {label}")
+    if not condition:
+        sys.exit(1)
+
+def main():
+    if not redis_cluster_enabled():
+        print("note: REDIS_CLUSTER is not set, checking against a single instance")
+
+    client = get_redis_client()
+    http = TestClient(app)
+    user_id = f"cluster-check-{uuid.uuid4()}"
+    model_name = f"cluster-check-model-{uuid.uuid4().hex[:8]}"
+    node_id = str(uuid.uuid4())
+    setup_token = str(uuid.uuid4())
+    model_id = None
+
+    try:
+        response = http.post("/user/me/library", json={
+            "userId": user_id, "modelId": "sshleifer/tiny-gpt2", "modelName": model_name, "isSet": True
+        })
+        check("add model to library", response.status_code == 200)
+
+        response = http.get("/user/me/library", params={"userId": user_id})
+        check("read library", response.status_code == 200 and len(response.json()) == 1)
+        model_id = response.json()[0]["modelId"]
+        etag = response.headers["ETag"]
+        response = http.get("/user/me/library", params={"userId": user_id}, headers={"If-None-Match": etag})
+        check("unchanged library answers 304", response.status_code == 304)
+
+        pipe = client.pipeline()
+        pipe.setex(setup_key(setup_token, 'nodeId'), 60, node_id)
+        pipe.setex(setup_key(setup_token, 'name'), 60, "cluster-check-node")
+        pipe.setex(setup_key(setup_token, 'url'), 60, "http://127.0.0.1:1")
+        pipe.execute()
+        response = http.post("/user/me/node/authenticate", json={"userId": user_id, "setupToken": setup_token})
+        check("authenticate node", response.status_code == 200)
+        check("setup token consumed", not client.exists(setup_key(setup_token, 'nodeId')))
+
+        # What the node writes once a model is loaded
+        load_node_utils().write_node_fields(client, node_id, {
+            "modelStatus": "ready", "activeModelId": model_id, "activeModelName": model_name
+        })
+        check("node joins the model's node set", client.sismember(model_nodes_key(model_id), node_id))
+
+        response = http.get("/user/me/nodes", params={"userId": user_id})
+        check("read nodes", response.status_code == 200 and response.json()[0]["modelStatus"] == "ready")
+        etag = response.headers["ETag"]
+        response = http.get("/user/me/nodes", params={"userId": user_id}, headers={"If-None-Match": etag})
+        check("unchanged nodes answer 304", response.status_code == 304)
+
+        selected = asyncio.run(find_node_with_model(model_id))
+        check("route by model id", selected["nodeId"] == node_id)
+        selected = asyncio.run(find_node_with_model(model_name))
+        check("route by model name", selected["nodeId"] == node_id)
+
+        response = http.post("/user/me/library", json={
+            "userId": user_id, "modelId": "sshleifer/tiny-gpt2", "modelName": model_name, "isSet": False
+        })
+        check("remove model from library", response.status_code == 200)
+        check("name index cleaned up", client.hget(MODELS_BY_NAME, model_name) is None)
+    finally:
+        pipe = client.pipeline(transaction=False)
+        pipe.delete(node_key(node_id))
+        pipe.srem(NODES_INDEX, node_id)
+        for field in ('nodes', 'nodeNames', 'nodesVersion', 'models', 'libraryVersion'):
+            pipe.delete(user_key(user_id, field))
+        if model_id:
+            pipe.delete(model_key(model_id), model_nodes_key(model_id))
+        pipe.execute()
+
+    print("All checks passed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Simulate demand-driven placement against recorded traffic.
+
+Run from router/src:
+    python -m benchmarks.placement --traffic traffic.jsonl --fleet fleet.json
+    python -m benchmarks.placement --from-redis --minutes 120
+
+Traffic is either a JSONL file with one request per line ({"ts": <unix
+seconds>, "model": <model id>}), or the per-minute demand buckets the router
+records in Redis. The fleet is a JSON list of node hashes (nodeId,
+activeModelId, modelStatus, status, autoAssign), or the current nodes in Redis.
+
+Every minute of traffic is served by the nodes ready for each model, up to
+--node-rpm requests per node. The rest count as 404s (no ready node) or
+capacity rejections. The scheduler plans every --interval minutes, and its
+assignments become ready --load-minutes later. The report compares this
+against the static placement the fleet started with.
+"""
+
+import argparse
+import copy
+import json
+from collections import defaultdict
+
+from utils.placement import plan_placements, get_fleet, current_minute, DEMAND_WINDOW_MINUTES, TARGET_RPM_PER_NODE
+from utils.keys import demand_key, DEMAND_MODELS
+
+def load_traffic_file(path: str) -> dict:
+    """{minute: {model id: requests}} from a JSONL request log"""
+    traffic = defaultdict(lambda: defaultdict(int))
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            traffic[int(event["ts"] // 60)][event["model"]] += 1
+    return traffic
+
+def load_traffic_redis(client, minutes: int) -> dict:
+    """{minute: {model id: requests}} from the router's demand buckets"""
+    end_minute = current_minute()
+    start_minute = end_minute - minutes + 1
+    model_ids = client.zrangebyscore(DEMAND_MODELS, start_minute, '+inf')
+
+    pipe = client.pipeline(transaction=False)
+    for model_id in model_ids:
+        for minute in range(start_minute, end_minute + 1):
+            pipe.hget(demand_key(model_id, minute), 'requests')
+    counts = iter(pipe.execute())
+
+    traffic = defaultdict(lambda: defaultdict(int))
+    for model_id in model_ids:
+        for minute in range(start_minute, end_minute + 1):
+            requests = int(next(counts) or 0)
+            if requests:
+                traffic[minute][model_id] += requests
+    return traffic
+
+def simulate(traffic: dict, fleet: list, node_rpm: int, interval: int, window: int, load_minutes: int, schedule: bool) -> dict:
+    nodes = {node['nodeId']: copy.deepcopy(node) for node in fleet}
+    history = []  # per-minute demand dicts, most recent last
+    becomes_ready = defaultdict(list)  # minute -> node ids
+    totals = {"requests": 0, "served": 0, "notLoaded": 0, "atCapacity": 0, "assignments": 0}
+
+    minutes = sorted(traffic)
+    if not minutes:
+        return totals
+
+    for minute in range(minutes[0], minutes[-1] + 1):
+        for node_id in becomes_ready.pop(minute, []):
+            nodes[node_id]['modelStatus'] = 'ready'
+
+        ready = defaultdict(int)
+        for node in nodes.values():
+            if node.get('modelStatus') == 'ready' and node.get('activeModelId'):
+                ready[node['activeModelId']] += 1
+
+        demand = {}
+        for model_id, requests in traffic.get(minute, {}).items():
+            capacity = ready[model_id] * node_rpm
+            served = min(requests, capacity)
+            not_loaded = requests if not ready[model_id] else 0
+            at_capacity = requests - served - not_loaded
+            demand[model_id] = {"requests": requests, "notLoaded": not_loaded, "atCapacity": at_capacity, "latencyMs": 0}
+
+            totals["requests"] += requests
+            totals["served"] += served
+            totals["notLoaded"] += not_loaded
+            totals["atCapacity"] += at_capacity
+        history.append(demand)
+
+        if schedule and (minute - minutes[0]) % interval == interval - 1:
+            window_demand = defaultdict(lambda: {"requests": 0, "notLoaded": 0, "atCapacity": 0, "latencyMs": 0})
+            for bucket in history[-window:]:
+                for model_id, stats in bucket.items():
+                    for field, value in stats.items():
+                        window_demand[model_id][field] += value
+
+            plan = plan_placements(dict(window_demand), list(nodes.values()), window, node_rpm)
+            for node_id, model_id in plan["assignments"]:
+                nodes[node_id].update({"activeModelId": model_id, "modelStatus": "loading"})
+                becomes_ready[minute + load_minutes].append(node_id)
+                totals["assignments"] += 1
+
+    return totals
+
+def load_fleet(args) -> list:
+    if args.fleet:
+        with open(args.fleet) as f:
+            return json.load(f)
+    from utils.redis import get_redis_client
+    return get_fleet(get_redis_client())
+
+def print_totals(label: str, totals: dict):
+    requests = max(totals["requests"], 1)
+    print(
+        f"{label:<10} served {totals['served'] / requests:>6.1%}  "
+        f"404 {totals['notLoaded'] / requests:>6.1%}  "
+        f"at capacity {totals['atCapacity'] / requests:>6.1%}  "
+        f"assignments {totals['assignments']}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traffic", help="JSONL request log")
+    parser.add_argument("--from-redis", action="store_true", help="Replay the router's recorded demand buckets")
+    parser.add_argument("--minutes", type=int, default=120, help="Minutes of recorded demand to replay")
+    parser.add_argument("--fleet", help="JSON list of node hashes; the current Redis fleet if not given")
+    parser.add_argument("--node-rpm", type=int, default=int(TARGET_RPM_PER_NODE))
+    parser.add_argument("--interval", type=int, default=1, help="Minutes between scheduler runs")
+    parser.add_argument("--window", type=int, default=DEMAND_WINDOW_MINUTES)
+    parser.add_argument("--load-minutes", type=int, default=3, help="Minutes from assignment to ready")
+    args = parser.parse_args()
+
+    if args.traffic:
+        traffic = load_traffic_file(args.traffic)
+    elif args.from_redis:
+        from utils.redis import get_redis_client
+        traffic = load_traffic_redis(get_redis_client(), args.minutes)
+    else:
+        parser.error("one of --traffic or --from-redis is required")
+
+    fleet = load_fleet(args)
+    total_requests = sum(sum(models.values()) for models in traffic.values())
+    print(f"{total_requests} requests over {len(traffic)} minutes, {len(fleet)} nodes")
+
+    static = simulate(traffic, fleet, args.node_rpm, args.interval, args.window, args.load_minutes, schedule=False)
+    scheduled = simulate(traffic, fleet, args.node_rpm, args.interval, args.window, args.load_minutes, schedule=True)
+    print_totals("static", static)
+    print_totals("scheduled", scheduled)
+
+    opted_in = sum(1 for node in fleet if node.get('autoAssign') == 'true')
+    if not opted_in:
+        print("note: no node in the fleet has autoAssign=true, so the scheduler can't place anything")
+
+if __name__ == "__main__":
+    main()
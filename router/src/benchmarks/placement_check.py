@@ -0,0 +1,82 @@
+"""
+Check that the placement scheduler skips nodes a model doesn't fit on.
+
+Run from router/src against any Redis:
+    REDIS_HOST=127.0.0.1 python -m benchmarks.placement_check
+
+Plans two scheduler assignments of a 7B model: one to a node reporting 4 GiB
+free, one to a node reporting 64 GiB. Nodes are answered in-process, so no
+node or Hub access is needed. The small node must be skipped with the memory
+error while the large one is still assigned. Everything created is deleted at
+the end.
+"""
+
+import asyncio
+import json
+import sys
+import time
+import uuid
+
+import httpx #type: ignore
+
+import utils.assignment as assignment
+from utils.footprint import footprint_from_counts
+from utils.placement import apply_assignments
+from utils.redis import get_redis_client
+from utils.keys import model_key
+
+GIB = 1024 ** 3
+
+def check(label: str, condition: bool):
+    print(f"{'✓' if condition else '✗'} {label}")
+    if not condition:
+        sys.exit(1)
+
+def main():
+    client = get_redis_client()
+    model_id = str(uuid.uuid4())
+    repo = "placement-check/model-7b"
+    small_node = {"nodeId": str(uuid.uuid4()), "nodeUrl": "http://small-node", "apiKey": "small"}
+    large_node = {"nodeId": str(uuid.uuid4()), "nodeUrl": "http://large-node", "apiKey": "large"}
+    free_bytes = {"small-node": 4 * GIB, "large-node": 64 * GIB}
+    assigned = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/memory":
+            return httpx.Response(200, json={
+                "device": "cuda", "weightDtype": "float16",
+                "totalBytes": free_bytes[request.url.host], "freeBytes": free_bytes[request.url.host]
+            })
+        assigned.append(request.url.host)
+        return httpx.Response(200, json={"status": "queued"})
+
+    footprint = footprint_from_counts({"parameters": {"BF16": 7_000_000_000}, "ggufSizes": {}})
+    client.hset(model_key(model_id), mapping={
+        "modelId": model_id,
+        "userId": f"placement-check-{uuid.uuid4()}",
+        "modelName": repo,
+        "huggingFaceModelId": repo,
+        "footprint": json.dumps(footprint),
+        "footprintRepo": repo,
+        "footprintComputedAt": int(time.time())
+    })
+    assignment._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+    try:
+        results = asyncio.run(apply_assignments(
+            client,
+            [(small_node["nodeId"], model_id), (large_node["nodeId"], model_id)],
+            [small_node, large_node]
+        ))
+        by_node = {result["nodeId"]: result["result"] for result in results}
+        check("both assignments reported", len(results) == 2)
+        check("small node skipped for memory", "GiB usable" in by_node.get(small_node["nodeId"], ""))
+        check("large node assigned", by_node.get(large_node["nodeId"]) == "sent")
+        check("only the large node was sent the model", assigned == ["large-node"])
+    finally:
+        client.delete(model_key(model_id))
+
+    print("All checks passed")
+
+if __name__ == "__main__":
+    main()
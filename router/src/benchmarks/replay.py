@@ -0,0 +1,349 @@
+"""
+Replay captured completion traffic against a router and compare runs.
+
+Capture traffic by starting the router with ROUTER_CAPTURE_FILE (and
+optionally ROUTER_CAPTURE_SAMPLE_RATE), then run from router/src:
+
+    python -m benchmarks.replay run --trace trace.jsonl.gz --stubs-per-model 2 --output baseline.json
+    python -m benchmarks.replay run --trace trace.jsonl.gz --stubs-per-model 2 --speed 2 --output fast.json
+    python -m benchmarks.replay compare baseline.json fast.json
+
+Requests are re-issued open loop at their recorded offsets, divided by
+--speed, with synthetic prompts of the recorded length. With --stubs-per-model
+the replayer starts local stub nodes that sleep in proportion to prompt and
+output tokens, and registers them in the router's Redis under throwaway model
+names, which are removed afterwards. The router under test must reach the
+stubs at --stub-host. Without stubs, every request goes to --model, e.g. a
+tiny model on real nodes.
+
+Each run reports latency percentiles, throughput and status counts, and can be
+saved with --output for comparison. Any rate limits set on the router apply
+to replayed traffic; leave them unset on the router under test to measure
+without them.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx #type: ignore
+
+from utils.capture import read_trace
+from utils.redis import get_redis_client
+from utils.keys import node_key, model_key, model_nodes_key, MODELS_BY_NAME
+
+# Stub nodes generate this many tokens when the prompt asks for them
+OUTPUT_MARKER = re.compile(r"^\[\[replay:(\d+)\]\]")
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "p50": round(values[len(values) // 2], 1),
+        "p90": round(values[int(len(values) * 0.9)], 1),
+        "p99": round(values[int(len(values) * 0.99)], 1),
+        "max": round(values[-1], 1)
+    }
+
+def synthetic_prompt(record: dict) -> str:
+    """A prompt of about the recorded length (one token per word, four characters per token)"""
+    return f"[[replay:{record.get('completionTokens') or 0}]]" + " the" * max(record.get("promptTokens") or 0, 1)
+
+def run_stub(args):
+    """A node that answers /generate after a delay proportional to prompt and output tokens"""
+    import uvicorn
+    from fastapi import FastAPI, Request
+
+    app = FastAPI()
+    slots = asyncio.Semaphore(args.concurrency)
+
+    @app.get("/info")
+    async def info():
+        return {"node_status": "stub"}
+
+    @app.post("/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        prompt = body["prompt"]
+        match = OUTPUT_MARKER.match(prompt)
+        max_new_tokens = body.get("max_new_tokens") or 0
+        output_tokens = min(int(match.group(1)), max_new_tokens) if match else max_new_tokens
+        prompt_tokens = len(prompt.split())
+
+        async with slots:
+            await asyncio.sleep((prompt_tokens * args.prefill_ms + output_tokens * args.decode_ms) / 1000)
+
+        return {
+            "generated_text": " x" * output_tokens,
+            "model": body.get("model_id") or "stub",
+            "finish_reason": "length" if output_tokens >= max_new_tokens else "stop",
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": output_tokens
+        }
+
+    uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="warning")
+
+class StubFleet:
+    """Stub node processes registered in Redis as ready nodes for each traced model"""
+
+    def __init__(self, args, models: list):
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.user_id = f"replay-{self.run_id}"
+        self.model_names = {model: f"replay-{self.run_id}/{model}" for model in models}
+        self.model_ids = {model: str(uuid.uuid4()) for model in models}
+        self.node_ids = []
+        self.processes = []
+
+    def start(self):
+        port = self.args.stub_port
+        for _ in range(len(self.model_names) * self.args.stubs_per_model):
+            self.processes.append(subprocess.Popen([
+                sys.executable, "-m", "benchmarks.replay", "stub",
+                "--port", str(port),
+                "--prefill-ms", str(self.args.prefill_ms),
+                "--decode-ms", str(self.args.decode_ms),
+                "--concurrency", str(self.args.stub_concurrency)
+            ]))
+            port += 1
+        self.wait_until_listening()
+        self.register()
+
+    def wait_until_listening(self):
+        deadline = time.monotonic() + 30
+        for index in range(len(self.processes)):
+            url = f"http://127.0.0.1:{self.args.stub_port + index}/info"
+            while True:
+                try:
+                    httpx.get(url, timeout=1.0).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Stub node at {url} didn't start")
+                    time.sleep(0.2)
+
+    def register(self):
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        models = list(self.model_names)
+        for model in models:
+            pipe.hset(model_key(self.model_ids[model]), mapping={
+                "modelId": self.model_ids[model],
+                "userId": self.user_id,
+                "modelName": self.model_names[model],
+                "huggingFaceModelId": model
+            })
+            pipe.hsetnx(MODELS_BY_NAME, self.model_names[model], self.model_ids[model])
+
+        for index in range(len(self.processes)):
+            model = models[index % len(models)]
+            node_id = str(uuid.uuid4())
+            self.node_ids.append(node_id)
+            pipe.hset(node_key(node_id), mapping={
+                "nodeId": node_id,
+                "userId": self.user_id,
+                "nodeName": f"replay-stub-{index}",
+                "nodeUrl": f"http://{self.args.stub_host}:{self.args.stub_port + index}",
+                "apiKey": uuid.uuid4().hex,
+                "status": "active",
+                "modelStatus": "ready",
+                "activeModelId": self.model_ids[model],
+                "activeModelName": self.model_names[model]
+            })
+            pipe.sadd(model_nodes_key(self.model_ids[model]), node_id)
+        pipe.execute()
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for node_id in self.node_ids:
+            pipe.delete(node_key(node_id))
+        for model, model_id in self.model_ids.items():
+            pipe.delete(model_key(model_id))
+            pipe.delete(model_nodes_key(model_id))
+            pipe.hdel(MODELS_BY_NAME, self.model_names[model])
+        pipe.execute()
+
+async def replay(records: list, router: str, model_for, speed: float, max_in_flight: int) -> dict:
+    """Issue every record at its offset / speed and collect per-request results"""
+    slots = asyncio.Semaphore(max_in_flight)
+    results = []
+    start_lags = []
+    first_ts = records[0]["ts"]
+
+    async with httpx.AsyncClient(
+        base_url=router,
+        timeout=300.0,
+        limits=httpx.Limits(max_connections=max_in_flight)
+    ) as http:
+        async def send(record: dict, due: float):
+            async with slots:
+                start_lags.append((time.monotonic() - due) * 1000)
+                started = time.monotonic()
+                try:
+                    response = await http.post("/completions/", json={
+                        "prompt": synthetic_prompt(record),
+                        "model": model_for(record["model"]),
+                        "temperature": record.get("temperature"),
+                        "max_tokens": record.get("maxTokens") or 16
+                    }, headers={"Authorization": f"Bearer replay-{record.get('key', 'anonymous')}"})
+                    status = response.status_code
+                    usage = response.json().get("usage", {}) if status == 200 else {}
+                except httpx.HTTPError:
+                    status = 0
+                    usage = {}
+                results.append({
+                    "status": status,
+                    "latencyMs": (time.monotonic() - started) * 1000,
+                    "completionTokens": usage.get("completion_tokens", 0)
+                })
+
+        begin = time.monotonic()
+        tasks = []
+        for record in records:
+            due = begin + (record["ts"] - first_ts) / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(record, due)))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - begin
+
+    return {"results": results, "elapsed": elapsed, "startLags": start_lags}
+
+def summarize(records: list, run: dict, speed: float, trace: str) -> dict:
+    results = run["results"]
+    ok = [result for result in results if result["status"] == 200]
+    statuses = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+
+    span = (records[-1]["ts"] - records[0]["ts"]) / speed
+    return {
+        "trace": trace,
+        "speed": speed,
+        "requests": len(results),
+        "statuses": statuses,
+        "durationSeconds": round(run["elapsed"], 2),
+        "offeredRps": round(len(records) / span, 2) if span > 0 else None,
+        "throughputRps": round(len(ok) / run["elapsed"], 2),
+        "completionTokensPerSecond": round(sum(result["completionTokens"] for result in ok) / run["elapsed"], 1),
+        "latencyMs": percentiles([result["latencyMs"] for result in ok]),
+        "recordedLatencyMs": percentiles([record["latencyMs"] for record in records if record.get("status") == 200]),
+        # How late the replayer itself started requests; high values mean the numbers understate load
+        "startLagMs": percentiles(run["startLags"])
+    }
+
+def print_summary(summary: dict):
+    print(f"{summary['requests']} requests over {summary['durationSeconds']}s at {summary['speed']}x")
+    print(f"  statuses:            {summary['statuses']}")
+    print(f"  offered:             {summary['offeredRps']} req/s")
+    print(f"  throughput:          {summary['throughputRps']} req/s, {summary['completionTokensPerSecond']} tokens/s")
+    for label, key in (("latency", "latencyMs"), ("recorded latency", "recordedLatencyMs"), ("replayer start lag", "startLagMs")):
+        values = summary[key]
+        print(f"  {label + ':':<21}p50 {values['p50']} ms, p90 {values['p90']} ms, p99 {values['p99']} ms, max {values['max']} ms")
+
+def run_replay(args):
+    records = read_trace(args.trace)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        sys.exit(f"No requests in {args.trace}")
+    models = sorted({record["model"] for record in records})
+
+    fleet = None
+    if args.stubs_per_model:
+        fleet = StubFleet(args, models)
+        model_for = fleet.model_names.get
+    elif args.model:
+        model_for = lambda model: args.model
+    else:
+        sys.exit("Pass --stubs-per-model to replay against stub nodes, or --model to send everything to one model")
+
+    try:
+        if fleet:
+            fleet.start()
+        run = asyncio.run(replay(records, args.router, model_for, args.speed, args.max_in_flight))
+    finally:
+        if fleet:
+            fleet.stop()
+
+    summary = summarize(records, run, args.speed, args.trace)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+def compare(args):
+    runs = []
+    for path in args.runs:
+        with open(path) as f:
+            runs.append(json.load(f))
+
+    rows = [
+        ("throughput req/s", lambda run: run["throughputRps"]),
+        ("tokens/s", lambda run: run["completionTokensPerSecond"]),
+        ("latency p50 ms", lambda run: run["latencyMs"]["p50"]),
+        ("latency p90 ms", lambda run: run["latencyMs"]["p90"]),
+        ("latency p99 ms", lambda run: run["latencyMs"]["p99"]),
+        ("ok share", lambda run: round(run["statuses"].get("200", 0) / run["requests"], 3)),
+    ]
+    print(f"{'':<18}" + "".join(f"{path[-20:]:>22}" for path in args.runs))
+    for label, value in rows:
+        baseline = value(runs[0])
+        cells = [f"{baseline:>22}"]
+        for run in runs[1:]:
+            current = value(run)
+            change = f" ({(current - baseline) / baseline * 100:+.1f}%)" if baseline else ""
+            cells.append(f"{str(current) + change:>22}")
+        print(f"{label:<18}" + "".join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="replay a trace")
+    run.add_argument("--trace", required=True)
+    run.add_argument("--router", default="http://localhost:8000")
+    run.add_argument("--speed", type=float, default=1.0, help="2 replays twice as fast as recorded")
+    run.add_argument("--limit", type=int, default=0, help="replay only the first N requests")
+    run.add_argument("--max-in-flight", type=int, default=256)
+    run.add_argument("--model", help="send every request to this model instead of stub nodes")
+    run.add_argument("--stubs-per-model", type=int, default=0)
+    run.add_argument("--stub-host", default="127.0.0.1", help="host the router reaches the stubs at")
+    run.add_argument("--stub-port", type=int, default=9100)
+    run.add_argument("--stub-concurrency", type=int, default=4, help="generations a stub node runs at once")
+    run.add_argument("--prefill-ms", type=float, default=0.2, help="stub time per prompt token")
+    run.add_argument("--decode-ms", type=float, default=20.0, help="stub time per output token")
+    run.add_argument("--output", help="save the summary as JSON")
+
+    stub = commands.add_parser("stub", help="run one stub node (started by run)")
+    stub.add_argument("--port", type=int, required=True)
+    stub.add_argument("--prefill-ms", type=float, default=0.2)
+    stub.add_argument("--decode-ms", type=float, default=20.0)
+    stub.add_argument("--concurrency", type=int, default=4)
+
+    compare_parser = commands.add_parser("compare", help="compare saved summaries, the first being the baseline")
+    compare_parser.add_argument("runs", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_replay(args)
+    elif args.command == "stub":
+        run_stub(args)
+    else:
+        compare(args)
+
+if __name__ == "__main__":
+    main()
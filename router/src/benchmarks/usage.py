@@ -0,0 +1,93 @@
+"""
+Measure what usage metering costs a request and how many events/sec it sustains.
+
+Run from router/src against the configured Redis:
+    python -m benchmarks.usage --events 100000
+
+Reports the in-handler cost of record_usage (a buffer append), the rate the
+background flusher appends events to the stream, and the rate the usage
+worker aggregates them. Events go to a throwaway stream, which is deleted at
+the end.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import utils.usage
+import usage_worker
+from utils.redis import get_redis_client
+from utils.keys import usage_key
+
+async def measure_record_overhead(events: int) -> tuple[float, float]:
+    """(median, p99) nanoseconds per record_usage call, then flush"""
+    samples = []
+    for i in range(events):
+        start = time.perf_counter_ns()
+        utils.usage.record_usage("bench", "bench-model", f"bench-node-{i % 16}", 100, 50, 120)
+        samples.append(time.perf_counter_ns() - start)
+    await utils.usage.usage_recorder.flush()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+async def measure_append_rate(events: int) -> float:
+    """Events/sec through the buffered pipeline writer"""
+    recorder = utils.usage.usage_recorder
+    start = time.perf_counter()
+    for i in range(events):
+        utils.usage.record_usage("bench", "bench-model", f"bench-node-{i % 16}", 100, 50, 120)
+        if i % 1000 == 999:
+            # Yield like a busy server would between requests
+            await asyncio.sleep(0)
+    while recorder.buffer or (recorder.task and not recorder.task.done()):
+        await asyncio.sleep(0.01)
+    return events / (time.perf_counter() - start)
+
+def measure_aggregate_rate(client, events: int) -> float:
+    """Events/sec the worker aggregates and acknowledges"""
+    aggregator = usage_worker.UsageAggregator(client, "bench")
+    start = time.perf_counter()
+    consumed = 0
+    while consumed < events:
+        response = client.xreadgroup(
+            usage_worker.USAGE_GROUP, "bench", {utils.usage.USAGE_STREAM: ">"}, count=usage_worker.BATCH_SIZE
+        )
+        if not response:
+            break
+        for _, batch in response:
+            aggregator.apply(batch)
+            consumed += len(batch)
+    return consumed / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100000)
+    args = parser.parse_args()
+
+    client = get_redis_client()
+    stream = f"usage:bench:{uuid.uuid4().hex[:8]}"
+    utils.usage.USAGE_STREAM = stream
+    usage_worker.USAGE_STREAM = stream
+    usage_worker.ensure_group(client)
+
+    try:
+        median_ns, p99_ns = asyncio.run(measure_record_overhead(min(args.events, 10000)))
+        print(f"record_usage in handler: median {median_ns / 1000:.2f} µs, p99 {p99_ns / 1000:.2f} µs")
+
+        append_rate = asyncio.run(measure_append_rate(args.events))
+        print(f"stream append: {append_rate:,.0f} events/sec")
+
+        aggregate_rate = measure_aggregate_rate(client, args.events + min(args.events, 10000))
+        print(f"worker aggregation: {aggregate_rate:,.0f} events/sec")
+    finally:
+        pipe = client.pipeline(transaction=False)
+        pipe.delete(stream)
+        pipe.delete(usage_key("key", "bench"))
+        for i in range(16):
+            pipe.delete(usage_key("node", f"bench-node-{i}"))
+        pipe.execute()
+
+if __name__ == "__main__":
+    main()
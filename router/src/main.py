@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import asyncio
 import logging
 from dotenv import load_dotenv
 from pathlib import Path
@@ -15,6 +17,11 @@ load_dotenv(env_path)
 from routers.users.me import library
 from routers.users.me import node
 from routers import completion
+from routers import scheduler
+from routers import profile
+from utils.placement import scheduler_loop, AUTO_PLACEMENT
+from utils.usage import usage_recorder
+from utils.capture import traffic_capture
 
 # Configure logging
 logging.basicConfig(
@@ -25,7 +32,17 @@ logging.basicConfig(
     ]
 )
 
-app = FastAPI(title="Router", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Demand-driven placement runs on one worker at a time, coordinated through Redis
+    scheduler_task = asyncio.create_task(scheduler_loop()) if AUTO_PLACEMENT else None
+    yield
+    if scheduler_task:
+        scheduler_task.cancel()
+    await usage_recorder.flush()
+    await traffic_capture.flush()
+
+app = FastAPI(title="Router", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -40,6 +57,8 @@ app.add_middleware(
 app.include_router(completion.router)
 app.include_router(library.router)
 app.include_router(node.router)
+app.include_router(scheduler.router)
+app.include_router(profile.router)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
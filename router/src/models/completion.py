@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Union, List
 
 # Pydantic models
 class CompletionRequest(BaseModel):
@@ -8,6 +8,7 @@ class CompletionRequest(BaseModel):
     model: str
     temperature: Optional[float] = 1.0
     max_tokens: Optional[int] = 4096
+    stop: Optional[Union[str, List[str]]] = None
 
 class CompletionResponse(BaseModel):
     id: str
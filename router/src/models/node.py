@@ -3,7 +3,7 @@ Pydantic models for node endpoints
 """
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class Node(BaseModel):
     nodeId: str
@@ -18,4 +18,30 @@ class AssignModelToNodeRequest(BaseModel):
     nodeId: str
     modelId: str
     modelName: Optional[str] = None
-    huggingFaceModelId: Optional[str] = None
\ No newline at end of file
+    huggingFaceModelId: Optional[str] = None
+    hotSwap: Optional[bool] = False
+    quantization: Optional[str] = None
+    backend: Optional[str] = None
+    ggufFile: Optional[str] = None
+    draftModelName: Optional[str] = None
+
+
+class BulkAssignModelRequest(BaseModel):
+    userId: str
+    modelId: str
+    # All of the user's nodes when not given
+    nodeIds: Optional[List[str]] = None
+    modelName: Optional[str] = None
+    huggingFaceModelId: Optional[str] = None
+    hotSwap: Optional[bool] = False
+    quantization: Optional[str] = None
+    backend: Optional[str] = None
+    ggufFile: Optional[str] = None
+    draftModelName: Optional[str] = None
+    # Nodes assigned per wave; a quarter of the fleet when not given
+    waveSize: Optional[int] = None
+
+class NodeAutoAssignRequest(BaseModel):
+    userId: str
+    nodeId: str
+    enabled: bool
@@ -0,0 +1,12 @@
+"""
+Pydantic models for the profile endpoint
+"""
+
+from pydantic import BaseModel
+from typing import Optional
+
+
+class ProfileRequest(BaseModel):
+    requests: Optional[int] = None
+    seconds: float = 30.0
+    intervalMs: float = 5.0
@@ -1,5 +1,6 @@
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from typing import Optional
 import os
 import httpx # type: ignore
 import redis
@@ -8,6 +9,12 @@ import logging
 
 from models.completion import *
 from utils.redis import get_redis_client
+from utils.keys import node_key, model_key, model_nodes_key, MODELS_BY_NAME
+from utils.placement import record_demand
+from utils.usage import record_usage, api_key_id
+from utils.ratelimit import enforce_rate_limit, rate_limiter
+from utils import profiling
+from utils.capture import traffic_capture
 
 NODE_URL = os.getenv("NODE_URL", "http://node:8005")
 
@@ -16,34 +23,30 @@ router = APIRouter(
     tags=["completions"]
 )
 
-async def find_node_with_model(model_name: str) -> dict:
+def estimate_request_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough committed work for a request (~4 characters per token), matched against node budgets"""
+    return len(prompt) // 4 + (max_tokens or 0)
+
+async def find_node_with_model(model_name: str, required_tokens: int = 0) -> dict:
     """
     Find a node that has the requested model loaded and ready.
 
     Returns dict with: nodeId, nodeUrl, modelId, modelName
     Raises HTTPException(404) if model not available
+    Raises HTTPException(429) if every node with the model is at capacity
     """
     try:
         client = get_redis_client()
 
         # Strategy 1: Try to find by model ID (exact match)
-        model_data = client.hgetall(f'model:{model_name}')
+        model_data = client.hgetall(model_key(model_name))
 
         if model_data:
             model_id = model_data['modelId']
             model_name = model_data.get('modelName', model_id)
         else:
-            # Strategy 2: Search by model name across all models
-            model_keys = client.keys('model:*')
-            found_model_id = None
-            found_model_name = None
-
-            for model_key in model_keys:
-                data = client.hgetall(model_key)
-                if data.get('modelName') == model_name:
-                    found_model_id = data['modelId']
-                    found_model_name = data['modelName']
-                    break
+            # Strategy 2: Look the model up by name
+            found_model_id = client.hget(MODELS_BY_NAME, model_name)
 
             if not found_model_id:
                 raise HTTPException(
@@ -52,25 +55,32 @@ async def find_node_with_model(model_name: str) -> dict:
                 )
 
             model_id = found_model_id
-            model_name = found_model_name
 
-        # Find all nodes with this model loaded and ready (LRU selection)
-        node_keys = client.keys('node:*')
-        node_keys = [k for k in node_keys if not k.endswith(':models')]
+        # Find all nodes with this model loaded and ready (LRU selection).
+        # The index can briefly lag the node hashes, so each node is still checked
+        node_ids = list(client.smembers(model_nodes_key(model_id)))
+        pipe = client.pipeline(transaction=False)
+        for node_id in node_ids:
+            pipe.hgetall(node_key(node_id))
 
         candidate_nodes = []
+        nodes_at_capacity = 0
 
-        for node_key in node_keys:
-            node_id = node_key.replace('node:', '')
-            node_data = client.hgetall(node_key)
-
+        for node_id, node_data in zip(node_ids, pipe.execute()):
             if (node_data.get('activeModelId') == model_id and
-                node_data.get('modelStatus') == 'ready'):
+                node_data.get('modelStatus') == 'ready' and
+                node_data.get('qualified') != 'false'):
 
                 node_api_key = node_data.get('apiKey')
                 if not node_api_key:
                     continue  # Skip nodes without API keys
 
+                # Skip nodes whose published token budget can't fit the request
+                available_budget = node_data.get('availableTokenBudget')
+                if available_budget and int(available_budget) < required_tokens:
+                    nodes_at_capacity += 1
+                    continue
+
                 # Parse lastUsedAt timestamp (default to 0 if missing/invalid)
                 last_used_str = node_data.get('lastUsedAt', '0')
                 try:
@@ -87,8 +97,17 @@ async def find_node_with_model(model_name: str) -> dict:
                     "lastUsedAt": last_used
                 })
 
+        if not candidate_nodes and nodes_at_capacity:
+            record_demand(model_id, requests=1, atCapacity=1)
+            raise HTTPException(
+                status_code=429,
+                detail=f"All nodes serving '{model_name}' are at capacity",
+                headers={"Retry-After": "1"}
+            )
+
         if not candidate_nodes:
             # Model exists but not loaded on any ready node
+            record_demand(model_id, requests=1, notLoaded=1)
             raise HTTPException(
                 status_code=404,
                 detail=f"Model '{model_name}' is not loaded on any ready node"
@@ -118,11 +137,26 @@ async def find_node_with_model(model_name: str) -> dict:
         )
 
 @router.post("/")
-async def completions(request: CompletionRequest):
+async def completions(request: CompletionRequest, authorization: Optional[str] = Header(default=None)):
     """Route completion requests to node with requested model"""
+    started = time.monotonic()
+    started_at = time.time()
+    key_id = api_key_id(authorization)
+
+    # Outcome, for the traffic capture
+    status = 500
+    prompt_tokens = None
+    completion_tokens = 0
+
     try:
+        # Token buckets per API key, shared by every router worker
+        await enforce_rate_limit(key_id, request.model)
+
         # Find node with the requested model
-        node_info = await find_node_with_model(request.model)
+        node_info = await find_node_with_model(
+            request.model,
+            estimate_request_tokens(request.prompt, request.max_tokens)
+        )
 
         # Prepare headers with node-specific API key
         headers = {"X-API-Key": node_info['apiKey']}
@@ -131,11 +165,16 @@ async def completions(request: CompletionRequest):
         # temperature=0 means deterministic (greedy), temperature>0 means sampling
         do_sample = request.temperature > 0
 
+        # OpenAI accepts a single stop string or a list
+        stop = [request.stop] if isinstance(request.stop, str) else request.stop
+
         node_request = {
             "prompt": request.prompt,
             "max_new_tokens": request.max_tokens,
             "temperature": request.temperature,
-            "do_sample": do_sample
+            "do_sample": do_sample,
+            "model_id": node_info['modelId'],
+            "stop": stop
         }
 
         # Make request to the selected node
@@ -147,19 +186,42 @@ async def completions(request: CompletionRequest):
                 timeout=300.0
             )
 
+            latency_ms = int((time.monotonic() - started) * 1000)
+            if response.status_code == 429:
+                record_demand(node_info['modelId'], requests=1, atCapacity=1)
+            else:
+                record_demand(node_info['modelId'], requests=1, latencyMs=latency_ms)
+
             if response.status_code != 200:
+                # Pass admission control back-off hints through to the client
+                retry_after = response.headers.get("Retry-After")
                 raise HTTPException(
                     status_code=response.status_code,
-                    detail=f"Node error: {response.text}"
+                    detail=f"Node error: {response.text}",
+                    headers={"Retry-After": retry_after} if retry_after else None
                 )
 
             node_response = response.json()
 
+            # Exact counts from the node's tokenizer; nodes predating them get a word count
+            completion_text = node_response["generated_text"]
+            prompt_tokens = node_response.get("prompt_tokens", len(request.prompt.split()))
+            completion_tokens = node_response.get("completion_tokens", len(completion_text.split()))
+            rate_limiter.charge_tokens(key_id, request.model, completion_tokens)
+            record_usage(
+                key_id,
+                node_info['modelId'],
+                node_info['nodeId'],
+                prompt_tokens,
+                completion_tokens,
+                latency_ms
+            )
+
             # Update node's lastUsedAt timestamp after successful completion
             try:
                 redis_client = get_redis_client()
                 redis_client.hset(
-                    f'node:{node_info["nodeId"]}',
+                    node_key(node_info["nodeId"]),
                     'lastUsedAt',
                     str(int(time.time()))
                 )
@@ -167,25 +229,43 @@ async def completions(request: CompletionRequest):
                 logging.warning(f"Failed to update lastUsedAt for node {node_info['nodeId']}: {str(e)}")
 
             # Convert to OpenAI format
+            status = 200
             return {
                 "id": f"req_{hash(request.prompt) % 10000}",
                 "object": "text_completion",
                 "model": node_info['modelName'],  # Use actual model name
                 "choices": [{
-                    "text": node_response["generated_text"],
+                    "text": completion_text,
                     "index": 0,
-                    "finish_reason": "stop"
+                    "finish_reason": node_response.get("finish_reason", "stop")
                 }],
                 "usage": {
-                    "completion_tokens": len(node_response["generated_text"].split()),
-                    "prompt_tokens": len(request.prompt.split()),
-                    "total_tokens": len(node_response["generated_text"].split()) + len(request.prompt.split())
+                    "completion_tokens": completion_tokens,
+                    "prompt_tokens": prompt_tokens,
+                    "total_tokens": completion_tokens + prompt_tokens
                 }
             }
 
     except httpx.RequestError as e:
+        status = 503
         raise HTTPException(status_code=503, detail=f"Node unavailable: {str(e)}")
-    except HTTPException:
+    except HTTPException as e:
+        status = e.status_code
         raise  # Re-raise HTTPExceptions from find_node_with_model
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Router error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Router error: {str(e)}")
+    finally:
+        profiling.request_finished()
+        if traffic_capture.enabled:
+            traffic_capture.record(
+                started_at,
+                request.model,
+                key_id,
+                prompt_tokens if prompt_tokens is not None else len(request.prompt) // 4,
+                request.max_tokens,
+                completion_tokens,
+                request.temperature,
+                1 if isinstance(request.stop, str) else len(request.stop or []),
+                status,
+                int((time.monotonic() - started) * 1000)
+            )
\ No newline at end of file
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
+from typing import Optional
+import hmac
+import json
+
+from models.profile import ProfileRequest
+from utils import profiling
+
+router = APIRouter(
+    prefix="",
+    tags=["profile"]
+)
+
+@router.post("/profile")
+async def post_profile(request: ProfileRequest, x_profile_token: Optional[str] = Header(default=None)):
+    """
+    Profile the event loop for the next `requests` completions or `seconds`,
+    whichever ends first, and return a zip with its lag and the collapsed
+    stacks of whatever blocked it. Requires the X-Profile-Token header to match
+    ROUTER_PROFILE_TOKEN; the endpoint doesn't exist while that is unset.
+    """
+    if not profiling.PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_profile_token or not hmac.compare_digest(x_profile_token, profiling.PROFILE_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid profile token")
+
+    if not 0 < request.seconds <= profiling.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be between 0 and {profiling.PROFILE_MAX_SECONDS:.0f}"
+        )
+    if request.requests is not None and request.requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+    if not 1 <= request.intervalMs <= 1000:
+        raise HTTPException(status_code=400, detail="intervalMs must be between 1 and 1000")
+
+    try:
+        artifact, summary = await profiling.run_profile(request.requests, request.seconds, request.intervalMs / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return Response(
+        content=artifact,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="router-profile-{summary["startedAt"]}.zip"',
+            "X-Profile-Summary": json.dumps(summary)
+        }
+    )
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+import json
+import redis
+
+from utils.redis import get_redis_client
+from utils.keys import SCHEDULER_LAST_RUN
+from utils.placement import run_scheduler_once
+
+router = APIRouter(
+    prefix="/scheduler",
+    tags=["scheduler"]
+)
+
+@router.get("/recommendations")
+async def get_recommendations():
+    """
+    Placement recommendations from current demand and capacity: per model, the
+    request rate, 404s, capacity rejections and how many more ready nodes it needs
+    """
+    try:
+        result = await run_scheduler_once(auto_assign=False)
+        return JSONResponse(
+            content=result["recommendations"],
+            status_code=200
+        )
+
+    except redis.exceptions.ConnectionError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Redis service unavailable: {str(e)}"
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        ) from e
+
+@router.get("/last-run")
+async def get_last_run():
+    """The most recent scheduler run, including any assignments it made"""
+    try:
+        client = get_redis_client()
+        last_run = client.get(SCHEDULER_LAST_RUN)
+        if not last_run:
+            raise HTTPException(
+                status_code=404,
+                detail="The scheduler hasn't run yet"
+            )
+        return JSONResponse(
+            content=json.loads(last_run),
+            status_code=200
+        )
+
+    except redis.exceptions.ConnectionError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Redis service unavailable: {str(e)}"
+        ) from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        ) from e
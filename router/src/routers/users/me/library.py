@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Optional
 import redis
 import uuid
 
 from models.library import SetModelRequest
 from utils.redis import get_redis_client
+from utils.keys import model_key, user_key, MODELS_BY_NAME
+from utils.etag import version_etag, etag_matches, not_modified
+from utils.footprint import schedule_footprint_estimate
 
 router = APIRouter(
     prefix="/user/me",
@@ -22,7 +27,7 @@ async def set_model(request: SetModelRequest):
             # Use pipeline to update both the model hash AND the user's set
             pipe = client.pipeline()
             pipe.hset(
-                f'model:{model_uuid}',
+                model_key(model_uuid),
                 mapping={
                     "modelId": model_uuid,
                     "userId": request.userId,
@@ -30,27 +35,42 @@ async def set_model(request: SetModelRequest):
                     "huggingFaceModelId": request.modelId
                 }
             )
-            pipe.sadd(f'user:{request.userId}:models', model_uuid)
+            pipe.sadd(user_key(request.userId, 'models'), model_uuid)
+            pipe.incr(user_key(request.userId, 'libraryVersion'))
+            # The first model registered under a name answers completions by that name
+            pipe.hsetnx(MODELS_BY_NAME, request.modelName, model_uuid)
             pipe.execute()
+
+            # Nodes download the repo named by modelName
+            schedule_footprint_estimate(model_uuid, request.modelName)
         else:
             # Remove from library by looking up the UUID via huggingFaceModelId + userId
             # 1. Get all model UUIDs for this user
-            user_models = client.smembers(f'user:{request.userId}:models')
+            user_models = list(client.smembers(user_key(request.userId, 'models')))
 
             # 2. Find the UUID that matches the huggingFaceModelId
-            target_uuid = None
+            pipe = client.pipeline()
             for model_uuid in user_models:
-                model_data = client.hgetall(f'model:{model_uuid}')
-                if model_data.get('huggingFaceModelId') == request.modelId:
+                pipe.hmget(model_key(model_uuid), 'huggingFaceModelId', 'modelName')
+
+            target_uuid = None
+            target_name = None
+            for model_uuid, (hugging_face_id, model_name) in zip(user_models, pipe.execute()):
+                if hugging_face_id == request.modelId:
                     target_uuid = model_uuid
+                    target_name = model_name
                     break
 
             # 3. Delete if found
             if target_uuid:
                 pipe = client.pipeline()
-                pipe.delete(f'model:{target_uuid}')
-                pipe.srem(f'user:{request.userId}:models', target_uuid)
+                pipe.delete(model_key(target_uuid))
+                pipe.srem(user_key(request.userId, 'models'), target_uuid)
+                pipe.incr(user_key(request.userId, 'libraryVersion'))
                 pipe.execute()
+
+                if target_name and client.hget(MODELS_BY_NAME, target_name) == target_uuid:
+                    client.hdel(MODELS_BY_NAME, target_name)
             else:
                 raise HTTPException(status_code=404, detail="Model not found in library")
 
@@ -71,22 +91,32 @@ async def set_model(request: SetModelRequest):
 
 
 @router.get("/library")
-async def get_library(userId: str):
-    """Get the user's library"""
+async def get_library(userId: str, if_none_match: Optional[str] = Header(default=None)):
+    """Get the user's library. Answers 304 when the library hasn't changed since the client's ETag."""
     try:
         client = get_redis_client()
 
-        # Get model IDs from the user's set
-        model_ids = client.smembers(f'user:{userId}:models')
+        # Version and model IDs in one round trip
+        pipe = client.pipeline()
+        pipe.get(user_key(userId, 'libraryVersion'))
+        pipe.smembers(user_key(userId, 'models'))
+        version, model_ids = pipe.execute()
 
-        # Fetch each model's data
-        models = []
-        for model_id in model_ids:
-            model = client.hgetall(f'model:{model_id}')
-            if model:  # Only add if model exists
-                models.append(model)
+        etag = version_etag("library", version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
 
-        return models
+        # Fetch every model's data in a single pipelined batch
+        pipe = client.pipeline()
+        for model_id in model_ids:
+            pipe.hgetall(model_key(model_id))
+        models = [model for model in pipe.execute() if model]  # Only add if model exists
+
+        return JSONResponse(
+            content=models,
+            status_code=200,
+            headers={"ETag": etag, "Cache-Control": "no-cache"}
+        )
 
     except redis.exceptions.ConnectionError as e:
         raise HTTPException(
@@ -1,39 +1,66 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
+import asyncio
+import json
 import redis
 import httpx #type: ignore
 import logging
 import time
 
-from models.node import AuthenticateNodeRequest, AssignModelToNodeRequest
+from models.node import AuthenticateNodeRequest, AssignModelToNodeRequest, BulkAssignModelRequest, NodeAutoAssignRequest
 from utils.crypto import generate_node_api_key
 from utils.redis import get_redis_client
+from utils.keys import node_key, model_key, user_key, setup_key, NODES_INDEX
+from utils.etag import version_etag, etag_matches, not_modified
+from utils.events import node_events
+from utils.assignment import build_assignment_payload, send_assignment, start_rollout, get_rollout_progress
+from utils.footprint import InsufficientMemoryError
 
 router = APIRouter(
     prefix="/user/me",
     tags=["nodes"]
 )
 
+# Comment sent on idle streams so proxies don't time them out
+SSE_KEEPALIVE_SECONDS = 15
+
 @router.get("/nodes")
-async def get_nodes(userId: str):
-    """Get all nodes for a user with their information"""
+async def get_nodes(userId: str, if_none_match: Optional[str] = Header(default=None)):
+    """
+    Get all nodes for a user with their information. Answers 304 when the
+    user's nodes version hasn't changed since the ETag the client sent.
+    """
 
     try:
         client = get_redis_client()
 
-        # Get all node IDs for this user
-        node_ids = client.smembers(f'user:{userId}:nodes')
+        # Version and node IDs in one round trip
+        pipe = client.pipeline()
+        pipe.get(user_key(userId, 'nodesVersion'))
+        pipe.smembers(user_key(userId, 'nodes'))
+        version, node_ids = pipe.execute()
+
+        etag = version_etag("nodes", version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
         # Check to see if the user even has any nodes
         if not node_ids:
             return JSONResponse(
                 content="",
-                status_code=200
+                status_code=200,
+                headers=headers
             )
 
-        # Fetch data for each node
-        nodes = []
+        # Fetch data for every node in a single pipelined batch
+        pipe = client.pipeline()
         for node_id in node_ids:
-            node_data = client.hgetall(f'node:{node_id}')
+            pipe.hgetall(node_key(node_id))
+
+        nodes = []
+        for node_data in pipe.execute():
             if node_data:
                 single_node = {
                     "activeModelName": node_data.get('activeModelName'),
@@ -41,14 +68,21 @@ async def get_nodes(userId: str):
                     "nodeId": node_data.get('nodeId'),
                     "nodeName": node_data.get('nodeName'),
                     "status": node_data.get('status'),
-                    "modelStatus": node_data.get('modelStatus')
+                    "modelStatus": node_data.get('modelStatus'),
+                    "pendingModelId": node_data.get('pendingModelId'),
+                    "pendingModelName": node_data.get('pendingModelName'),
+                    "pendingModelStatus": node_data.get('pendingModelStatus'),
+                    "qualified": node_data.get('qualified'),
+                    "downloadProgress": node_data.get('downloadProgress'),
+                    "autoAssign": node_data.get('autoAssign') == 'true'
                 }
                 nodes.append(single_node)
 
         # Return the complete list after the loop finishes
         return JSONResponse(
             content=nodes,
-            status_code=200
+            status_code=200,
+            headers=headers
         )
 
     except redis.exceptions.ConnectionError as e:
@@ -62,6 +96,58 @@ async def get_nodes(userId: str):
             detail=f"An unexpected error occurred: {str(e)}"
         ) from e
     
+@router.get("/nodes/events")
+async def stream_node_events(userId: str, request: Request):
+    """
+    Server-sent events with changes to the user's nodes as the nodes write them.
+    `node` events carry the changed fields; `resync` asks the client to refetch
+    the full list.
+    """
+    queue = node_events.subscribe(userId)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event["type"] == "closed":
+                    # Ending the stream makes the browser reconnect and resubscribe
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            node_events.unsubscribe(userId, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def get_node_names(client, user_id: str) -> set:
+    """
+    Names of the user's nodes. Kept in a set so checking for collisions doesn't
+    load every node; built from the node hashes the first time it is missing.
+    """
+    names = client.smembers(user_key(user_id, 'nodeNames'))
+    if names:
+        return names
+
+    node_ids = client.smembers(user_key(user_id, 'nodes'))
+    if not node_ids:
+        return set()
+
+    pipe = client.pipeline()
+    for node_id in node_ids:
+        pipe.hget(node_key(node_id), 'nodeName')
+    names = {name for name in pipe.execute() if name}
+    if names:
+        client.sadd(user_key(user_id, 'nodeNames'), *names)
+    return names
+
 @router.post("/node/authenticate")
 async def authenticate_node(request: AuthenticateNodeRequest):
     """Authenticate a node with a setup token"""
@@ -69,7 +155,7 @@ async def authenticate_node(request: AuthenticateNodeRequest):
         client = get_redis_client()
 
         # Verify the setup token exists and get the node_id
-        node_id = client.get(f'setup_token:{request.setupToken}')
+        node_id = client.get(setup_key(request.setupToken, 'nodeId'))
 
         if not node_id:
             raise HTTPException(
@@ -78,17 +164,13 @@ async def authenticate_node(request: AuthenticateNodeRequest):
             )
 
         # Retrieve the node name
-        node_name = client.get(f'setup_token_name:{request.setupToken}')
-        node_url = client.get(f'setup_node_url:{request.setupToken}')
+        node_name, node_url = client.mget(
+            setup_key(request.setupToken, 'name'),
+            setup_key(request.setupToken, 'url')
+        )
 
         # Ensure node name is unique for this user
-        existing_node_ids = client.smembers(f'user:{request.userId}:nodes')
-        existing_names = set()
-
-        for existing_node_id in existing_node_ids:
-            existing_node_data = client.hgetall(f'node:{existing_node_id}')
-            if existing_node_data and 'nodeName' in existing_node_data:
-                existing_names.add(existing_node_data['nodeName'])
+        existing_names = get_node_names(client, request.userId)
 
         # If name already exists, append a number to make it unique
         if node_name in existing_names:
@@ -114,16 +196,22 @@ async def authenticate_node(request: AuthenticateNodeRequest):
             "lastUsedAt": str(int(time.time()))
         }
 
-        # Store node data
-        client.hset(f'node:{node_id}', mapping=node_data)
-
-        # Add node to user's nodes set
-        client.sadd(f'user:{request.userId}:nodes', node_id)
+        # Store node data, add it to the user's nodes and names sets and bump
+        # the nodes version so dashboards refetch
+        pipe = client.pipeline()
+        pipe.hset(node_key(node_id), mapping=node_data)
+        pipe.sadd(user_key(request.userId, 'nodes'), node_id)
+        pipe.sadd(NODES_INDEX, node_id)
+        pipe.sadd(user_key(request.userId, 'nodeNames'), node_name)
+        pipe.incr(user_key(request.userId, 'nodesVersion'))
+        pipe.execute()
 
         # Delete the setup token and node name as they've been used
-        client.delete(f'setup_token:{request.setupToken}')
-        client.delete(f'setup_token_name:{request.setupToken}')
-        client.delete(f'setup_node_url:{request.setupToken}')
+        client.delete(
+            setup_key(request.setupToken, 'nodeId'),
+            setup_key(request.setupToken, 'name'),
+            setup_key(request.setupToken, 'url')
+        )
 
         return JSONResponse(
             content="Node authenticated successfully",
@@ -150,7 +238,7 @@ async def assign_model_to_node(request: AssignModelToNodeRequest):
         client = get_redis_client()
 
         # Verify node exists
-        node_data = client.hgetall(f'node:{request.nodeId}')
+        node_data = client.hgetall(node_key(request.nodeId))
         if not node_data:
             raise HTTPException(
                 status_code=404,
@@ -158,7 +246,7 @@ async def assign_model_to_node(request: AssignModelToNodeRequest):
             )
         
         # Verify user owns the node
-        user_nodes = client.smembers(f'user:{request.userId}:nodes')
+        user_nodes = client.smembers(user_key(request.userId, 'nodes'))
         if request.nodeId not in user_nodes:
             raise HTTPException(
                 status_code=404,
@@ -166,7 +254,7 @@ async def assign_model_to_node(request: AssignModelToNodeRequest):
             )
 
         # Verify model exists
-        model_data = client.hgetall(f'model:{request.modelId}')
+        model_data = client.hgetall(model_key(request.modelId))
         if not model_data:
             raise HTTPException(
                 status_code=404,
@@ -174,46 +262,35 @@ async def assign_model_to_node(request: AssignModelToNodeRequest):
             )
         
         # Verify the model is in the users library
-        user_models = client.smembers(f'user:{request.userId}:models')
+        user_models = client.smembers(user_key(request.userId, 'models'))
         if request.modelId not in user_models:
             raise HTTPException(
                 status_code=404,
                 detail="Model not found in user's library"
             )
 
-        # Call the node /assign-model endpoint
-        node_url = node_data.get('nodeUrl')
-        logging.info(node_url)
-        logging.info("Here")
-        
-        # Use provided values or look them up from Redis
-        model_name = request.modelName or model_data.get('modelName', '')
-        hugging_face_id = request.huggingFaceModelId or model_data.get('huggingFaceModelId', '')
-
-        payload = {
-            "modelName": model_name,
-            "nodeId": request.nodeId,
-            "modelId": request.modelId,
-            "huggingFaceModelId": hugging_face_id
-        }
+        payload = build_assignment_payload(
+            request.nodeId,
+            request.modelId,
+            model_data,
+            request.model_dump(exclude={"userId", "nodeId", "modelId"})
+        )
 
         # Get the node's API key for authentication
-        node_api_key = node_data.get('apiKey')
-        if not node_api_key:
+        if not node_data.get('apiKey'):
             raise HTTPException(
                 status_code=500,
                 detail="Node API key not found"
             )
 
+        # Call the node /assign-model endpoint
         try:
-            async with httpx.AsyncClient() as http_client:
-                node_response = await http_client.post(
-                    f"{node_url}/assign-model",
-                    json=payload,
-                    headers={"X-API-Key": node_api_key},
-                    timeout=30.0
-                )
-                node_response.raise_for_status()
+            await send_assignment(node_data, payload)
+        except InsufficientMemoryError as e:
+            raise HTTPException(
+                status_code=409,
+                detail=str(e)
+            )
         except httpx.HTTPError as e:
             raise HTTPException(
                 status_code=500,
@@ -242,4 +319,153 @@ async def assign_model_to_node(request: AssignModelToNodeRequest):
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred: {str(e)}"
-        ) from e
\ No newline at end of file
+        ) from e
+
+@router.post("/node/assign-model/bulk")
+async def bulk_assign_model(request: BulkAssignModelRequest):
+    """
+    Roll a model from the user's library out to many nodes. Assignments go out
+    concurrently in waves of waveSize nodes; each wave starts once the previous
+    one has loaded, so the rest of the fleet keeps serving meanwhile.
+    """
+    try:
+        if request.waveSize is not None and request.waveSize < 1:
+            raise HTTPException(
+                status_code=400,
+                detail="waveSize must be at least 1"
+            )
+
+        client = get_redis_client()
+
+        pipe = client.pipeline()
+        pipe.smembers(user_key(request.userId, 'nodes'))
+        pipe.smembers(user_key(request.userId, 'models'))
+        pipe.hgetall(model_key(request.modelId))
+        user_nodes, user_models, model_data = pipe.execute()
+
+        if not model_data:
+            raise HTTPException(
+                status_code=404,
+                detail="Model not found"
+            )
+        if request.modelId not in user_models:
+            raise HTTPException(
+                status_code=404,
+                detail="Model not found in user's library"
+            )
+
+        node_ids = list(dict.fromkeys(request.nodeIds)) if request.nodeIds is not None else sorted(user_nodes)
+        not_owned = [node_id for node_id in node_ids if node_id not in user_nodes]
+        if not_owned:
+            raise HTTPException(
+                status_code=404,
+                detail=f"User does not own nodes: {', '.join(not_owned)}"
+            )
+        if not node_ids:
+            raise HTTPException(
+                status_code=400,
+                detail="No nodes to assign"
+            )
+
+        wave_size = request.waveSize or max(len(node_ids) // 4, 1)
+
+        options = request.model_dump(exclude={"userId", "modelId", "nodeIds", "waveSize"})
+        rollout_id = start_rollout(client, request.userId, node_ids, request.modelId, model_data, options, wave_size)
+
+        return JSONResponse(
+            content={
+                "message": "Rollout started",
+                "rolloutId": rollout_id,
+                "nodeCount": len(node_ids),
+                "waveSize": wave_size
+            },
+            status_code=202
+        )
+
+    except redis.exceptions.ConnectionError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Redis service unavailable: {str(e)}"
+        ) from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        ) from e
+
+@router.get("/node/rollouts/{rolloutId}")
+async def get_rollout(rolloutId: str, userId: str):
+    """Progress of a rollout: per-node status and counts per status"""
+    try:
+        client = get_redis_client()
+
+        if not client.sismember(user_key(userId, 'rollouts'), rolloutId):
+            raise HTTPException(
+                status_code=404,
+                detail="Rollout not found"
+            )
+
+        progress = get_rollout_progress(client, rolloutId)
+        if not progress:
+            raise HTTPException(
+                status_code=404,
+                detail="Rollout not found"
+            )
+
+        return JSONResponse(
+            content=progress,
+            status_code=200
+        )
+
+    except redis.exceptions.ConnectionError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Redis service unavailable: {str(e)}"
+        ) from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        ) from e
+
+@router.post("/node/auto-assign")
+async def set_node_auto_assign(request: NodeAutoAssignRequest):
+    """
+    Opt a node in or out of automatic placement. When idle, opted-in nodes may
+    be assigned whichever model the placement scheduler finds most underserved.
+    """
+    try:
+        client = get_redis_client()
+
+        if not client.sismember(user_key(request.userId, 'nodes'), request.nodeId):
+            raise HTTPException(
+                status_code=404,
+                detail="User does not own this node"
+            )
+
+        pipe = client.pipeline()
+        pipe.hset(node_key(request.nodeId), 'autoAssign', 'true' if request.enabled else 'false')
+        pipe.incr(user_key(request.userId, 'nodesVersion'))
+        pipe.execute()
+
+        return JSONResponse(
+            content={"nodeId": request.nodeId, "autoAssign": request.enabled},
+            status_code=200
+        )
+
+    except redis.exceptions.ConnectionError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Redis service unavailable: {str(e)}"
+        ) from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An unexpected error occurred: {str(e)}"
+        ) from e
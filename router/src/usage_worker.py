@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Aggregate usage events from the router into per-key, per-node and per-host counters.
+
+    python usage_worker.py
+
+Runs as part of a consumer group, so several workers can share the stream.
+Each batch is read with XREADGROUP, summed in memory, and written as one
+pipeline of HINCRBYs before it is acknowledged. Delivery is at least once: a
+worker that dies between writing and acknowledging a batch has that batch
+counted again when it is reclaimed.
+"""
+
+import logging
+import os
+import socket
+import time
+
+import redis
+
+from utils.redis import get_redis_client
+from utils.keys import node_key, usage_key, USAGE_STREAM, USAGE_GROUP
+
+BATCH_SIZE = int(os.getenv("USAGE_WORKER_BATCH_SIZE", "1000"))
+BLOCK_MS = int(os.getenv("USAGE_WORKER_BLOCK_MS", "1000"))
+
+# Pending events of a dead consumer are reclaimed after this long
+RECLAIM_IDLE_MS = int(os.getenv("USAGE_WORKER_RECLAIM_IDLE_MS", "60000"))
+
+COUNTERS = ("promptTokens", "completionTokens", "latencyMs")
+
+def ensure_group(client):
+    try:
+        client.xgroup_create(USAGE_STREAM, USAGE_GROUP, id="0", mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+class UsageAggregator:
+    def __init__(self, client, consumer: str):
+        self.client = client
+        self.consumer = consumer
+        self.node_owners = {}
+
+    def node_owner(self, node_id: str) -> str:
+        if node_id not in self.node_owners:
+            self.node_owners[node_id] = self.client.hget(node_key(node_id), 'userId') or ""
+        return self.node_owners[node_id]
+
+    def aggregate(self, events: list) -> dict:
+        """{usage key: {field: total}} for a batch of (id, fields) stream entries"""
+        totals = {}
+        for _, event in events:
+            node_id = event.get("nodeId", "")
+            owners = [
+                usage_key("key", event.get("apiKey", "anonymous")),
+                usage_key("node", node_id),
+            ]
+            host = self.node_owner(node_id)
+            if host:
+                owners.append(usage_key("host", host))
+
+            for owner in owners:
+                counters = totals.setdefault(owner, {"requests": 0, **{field: 0 for field in COUNTERS}})
+                counters["requests"] += 1
+                for field in COUNTERS:
+                    counters[field] += int(event.get(field, 0))
+        return totals
+
+    def apply(self, events: list):
+        if not events:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for owner, counters in self.aggregate(events).items():
+            for field, amount in counters.items():
+                if amount:
+                    pipe.hincrby(owner, field, amount)
+        pipe.xack(USAGE_STREAM, USAGE_GROUP, *[event_id for event_id, _ in events])
+        pipe.execute()
+
+    def reclaim(self):
+        """Take over events another consumer read but never acknowledged"""
+        start = "0-0"
+        while True:
+            start, events, _ = self.client.xautoclaim(
+                USAGE_STREAM, USAGE_GROUP, self.consumer, RECLAIM_IDLE_MS, start_id=start, count=BATCH_SIZE
+            )
+            self.apply(events)
+            if start == "0-0" or not events:
+                return
+
+    def run(self):
+        self.reclaim()
+        last_reclaim = time.monotonic()
+        while True:
+            response = self.client.xreadgroup(
+                USAGE_GROUP, self.consumer, {USAGE_STREAM: ">"}, count=BATCH_SIZE, block=BLOCK_MS
+            )
+            for _, events in response or []:
+                self.apply(events)
+
+            if time.monotonic() - last_reclaim > RECLAIM_IDLE_MS / 1000:
+                self.reclaim()
+                last_reclaim = time.monotonic()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = get_redis_client()
+    ensure_group(client)
+
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    logging.info(f"Usage worker {consumer} consuming {USAGE_STREAM}")
+    UsageAggregator(client, consumer).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+import httpx #type: ignore
+
+from utils.redis import get_redis_client
+from utils.keys import node_key, user_key, rollout_key
+from utils.footprint import check_assignment_fits, InsufficientMemoryError
+
+# Bound on simultaneous /assign-model calls, shared by every rollout in this worker
+ASSIGN_CONCURRENCY = int(os.getenv("ROUTER_ASSIGN_CONCURRENCY", "20"))
+
+# How long a rollout waits for a wave of nodes to finish loading before moving on
+ROLLOUT_WAVE_TIMEOUT = float(os.getenv("ROUTER_ROLLOUT_WAVE_TIMEOUT", "1800"))
+ROLLOUT_POLL_INTERVAL = 5.0
+
+# Node statuses that end a node's part in a rollout
+FINISHED_STATUSES = ("ready", "error")
+
+# Connections to nodes are reused across assignments
+_http_client: Optional[httpx.AsyncClient] = None
+_assign_semaphore: Optional[asyncio.Semaphore] = None
+
+# Running rollouts, referenced so the tasks aren't garbage collected
+_rollout_tasks = set()
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=ASSIGN_CONCURRENCY * 2)
+        )
+    return _http_client
+
+def get_assign_semaphore() -> asyncio.Semaphore:
+    global _assign_semaphore
+    if _assign_semaphore is None:
+        _assign_semaphore = asyncio.Semaphore(ASSIGN_CONCURRENCY)
+    return _assign_semaphore
+
+def build_assignment_payload(node_id: str, model_id: str, model_data: dict, options: dict) -> dict:
+    """Body of a node's /assign-model call; options may override the library's model name and repo"""
+    return {
+        "modelName": options.get("modelName") or model_data.get('modelName', ''),
+        "nodeId": node_id,
+        "modelId": model_id,
+        "huggingFaceModelId": options.get("huggingFaceModelId") or model_data.get('huggingFaceModelId', ''),
+        "hotSwap": bool(options.get("hotSwap")),
+        "quantization": options.get("quantization"),
+        "backend": options.get("backend"),
+        "ggufFile": options.get("ggufFile"),
+        "draftModelName": options.get("draftModelName")
+    }
+
+async def send_assignment(node_data: dict, payload: dict):
+    """
+    Call the node's /assign-model endpoint. Raises InsufficientMemoryError if
+    the model won't fit on the node, httpx.HTTPError if the node refuses or
+    can't be reached.
+    """
+    await check_assignment_fits(get_http_client(), node_data, payload)
+    async with get_assign_semaphore():
+        node_response = await get_http_client().post(
+            f"{node_data.get('nodeUrl')}/assign-model",
+            json=payload,
+            headers={"X-API-Key": node_data.get('apiKey', '')}
+        )
+        node_response.raise_for_status()
+
+def node_rollout_status(node_data: dict, model_id: str) -> str:
+    """Where a node that was sent model_id is in loading it"""
+    if node_data.get('pendingModelId') == model_id and node_data.get('pendingModelStatus'):
+        return node_data['pendingModelStatus']
+    if node_data.get('activeModelId') == model_id:
+        return node_data.get('modelStatus') or "queued"
+    if node_data.get('modelStatus') == "error" or node_data.get('pendingModelStatus') == "error":
+        return "error"
+    return "queued"
+
+def get_rollout_progress(client, rollout_id: str) -> Optional[dict]:
+    """Rollout details with per-node and aggregate status, read in two pipelined round trips"""
+    pipe = client.pipeline()
+    pipe.hgetall(rollout_key(rollout_id))
+    pipe.hgetall(rollout_key(rollout_id, 'nodes'))
+    rollout, dispatch = pipe.execute()
+    if not rollout:
+        return None
+
+    node_ids = list(dispatch)
+    pipe = client.pipeline()
+    for node_id in node_ids:
+        pipe.hgetall(node_key(node_id))
+
+    nodes = {}
+    for node_id, node_data in zip(node_ids, pipe.execute()):
+        sent = dispatch[node_id]
+        if sent == "sent":
+            nodes[node_id] = node_rollout_status(node_data, rollout['modelId'])
+        elif sent == "pending":
+            nodes[node_id] = "pending"
+        else:
+            nodes[node_id] = "error"
+
+    counts = {}
+    for status in nodes.values():
+        counts[status] = counts.get(status, 0) + 1
+
+    return {
+        "rolloutId": rollout_id,
+        "modelId": rollout['modelId'],
+        "status": rollout.get('status'),
+        "waveSize": int(rollout.get('waveSize', 0)),
+        "currentWave": int(rollout.get('currentWave', 0)),
+        "createdAt": int(rollout.get('createdAt', 0)),
+        "counts": counts,
+        "nodes": nodes,
+        "errors": {node_id: sent for node_id, sent in dispatch.items() if sent not in ("pending", "sent")}
+    }
+
+async def wait_for_wave(client, node_ids: list, model_id: str, timeout: float) -> dict:
+    """Poll until every node in the wave is ready or errored, or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while True:
+        pipe = client.pipeline()
+        for node_id in node_ids:
+            pipe.hgetall(node_key(node_id))
+        statuses = {
+            node_id: node_rollout_status(node_data, model_id)
+            for node_id, node_data in zip(node_ids, await asyncio.to_thread(pipe.execute))
+        }
+        if all(status in FINISHED_STATUSES for status in statuses.values()) or time.monotonic() >= deadline:
+            return statuses
+        await asyncio.sleep(ROLLOUT_POLL_INTERVAL)
+
+async def run_rollout(rollout_id: str, node_ids: list, model_id: str, model_data: dict, options: dict, wave_size: int):
+    """
+    Assign the model wave by wave. Each wave's assignments go out concurrently,
+    and the next wave starts once the previous one has finished loading, so
+    nodes outside the current wave keep serving. The rollout stops if a whole
+    wave fails.
+    """
+    client = get_redis_client()
+
+    async def assign(node_id: str, node_data: dict):
+        payload = build_assignment_payload(node_id, model_id, model_data, options)
+        try:
+            await send_assignment(node_data, payload)
+            result = "sent"
+        except httpx.HTTPError as e:
+            logging.warning(f"Rollout {rollout_id}: failed to assign {model_id} to {node_id}: {e}")
+            result = f"Failed to communicate with node: {e}"
+        except InsufficientMemoryError as e:
+            logging.warning(f"Rollout {rollout_id}: {model_id} doesn't fit on {node_id}: {e}")
+            result = str(e)
+        await asyncio.to_thread(client.hset, rollout_key(rollout_id, 'nodes'), node_id, result)
+        return result
+
+    try:
+        waves = [node_ids[i:i + wave_size] for i in range(0, len(node_ids), wave_size)]
+        for index, wave in enumerate(waves):
+            await asyncio.to_thread(client.hset, rollout_key(rollout_id), 'currentWave', index + 1)
+
+            pipe = client.pipeline()
+            for node_id in wave:
+                pipe.hgetall(node_key(node_id))
+            wave_nodes = await asyncio.to_thread(pipe.execute)
+
+            results = await asyncio.gather(*(
+                assign(node_id, node_data) for node_id, node_data in zip(wave, wave_nodes)
+            ))
+            sent = [node_id for node_id, result in zip(wave, results) if result == "sent"]
+
+            if index == len(waves) - 1:
+                break
+
+            statuses = await wait_for_wave(client, sent, model_id, ROLLOUT_WAVE_TIMEOUT) if sent else {}
+            if not any(status == "ready" for status in statuses.values()):
+                logging.error(f"Rollout {rollout_id}: no node in wave {index + 1} became ready, stopping")
+                await asyncio.to_thread(client.hset, rollout_key(rollout_id), 'status', 'failed')
+                return
+
+        await asyncio.to_thread(client.hset, rollout_key(rollout_id), 'status', 'dispatched')
+    except Exception as e:
+        logging.error(f"Rollout {rollout_id} failed: {e}")
+        await asyncio.to_thread(client.hset, rollout_key(rollout_id), 'status', 'failed')
+
+def start_rollout(client, user_id: str, node_ids: list, model_id: str, model_data: dict, options: dict, wave_size: int) -> str:
+    """Record the rollout in Redis and run it in the background"""
+    rollout_id = str(uuid.uuid4())
+    pipe = client.pipeline()
+    pipe.hset(rollout_key(rollout_id), mapping={
+        "rolloutId": rollout_id,
+        "userId": user_id,
+        "modelId": model_id,
+        "status": "running",
+        "waveSize": wave_size,
+        "currentWave": 0,
+        "options": json.dumps(options),
+        "createdAt": int(time.time())
+    })
+    pipe.hset(rollout_key(rollout_id, 'nodes'), mapping={node_id: "pending" for node_id in node_ids})
+    pipe.sadd(user_key(user_id, 'rollouts'), rollout_id)
+    pipe.execute()
+
+    task = asyncio.create_task(run_rollout(rollout_id, node_ids, model_id, model_data, options, wave_size))
+    _rollout_tasks.add(task)
+    task.add_done_callback(_rollout_tasks.discard)
+    return rollout_id
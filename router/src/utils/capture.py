@@ -0,0 +1,108 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import secrets
+from typing import Optional
+
+# Append a sampled trace of completion requests to this file (JSONL, gzipped if
+# it ends in .gz). Capture is off while it is unset.
+CAPTURE_FILE = os.getenv("ROUTER_CAPTURE_FILE")
+
+# Share of completion requests recorded
+CAPTURE_SAMPLE_RATE = float(os.getenv("ROUTER_CAPTURE_SAMPLE_RATE", "0.1"))
+
+# API key ids are hashed again with this salt, so a trace can't be joined with
+# usage counters. Random per process unless set.
+CAPTURE_SALT = os.getenv("ROUTER_CAPTURE_SALT") or secrets.token_hex(16)
+
+# Buffered requests are written out this often
+FLUSH_INTERVAL = 1.0
+
+# Buffered records beyond this are dropped rather than growing without bound
+MAX_BUFFERED = 100000
+
+class TrafficCapture:
+    """
+    Records the shape of completion requests (timing, model, token counts and
+    sampling parameters) for benchmarks.replay. Prompt and output text are
+    never stored. Records are buffered and appended from a background task.
+    """
+
+    def __init__(self, path: Optional[str], sample_rate: float):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.buffer = []
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.sample_rate > 0
+
+    def anonymize(self, key_id: str) -> str:
+        return hashlib.sha256(f"{CAPTURE_SALT}:{key_id}".encode()).hexdigest()[:8]
+
+    def record(
+            self,
+            started: float,
+            model: str,
+            key_id: str,
+            prompt_tokens: int,
+            max_tokens: Optional[int],
+            completion_tokens: int,
+            temperature: Optional[float],
+            stops: int,
+            status: int,
+            latency_ms: int
+        ):
+        if random.random() >= self.sample_rate or len(self.buffer) >= MAX_BUFFERED:
+            return
+        self.buffer.append({
+            "ts": round(started, 3),
+            "model": model,
+            "key": self.anonymize(key_id),
+            "promptTokens": prompt_tokens,
+            "maxTokens": max_tokens,
+            "completionTokens": completion_tokens,
+            "temperature": temperature,
+            "stops": stops,
+            "status": status,
+            "latencyMs": latency_ms
+        })
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def write(self, records: list):
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        try:
+            # Each append to a .gz file adds a gzip member; readers see one stream
+            opener = gzip.open if self.path.endswith(".gz") else open
+            with opener(self.path, "at") as f:
+                f.write(lines)
+        except OSError as e:
+            logging.warning(f"Failed to write {len(records)} captured requests to {self.path}: {e}")
+
+    def take(self) -> list:
+        records, self.buffer = self.buffer, []
+        return records
+
+    async def run(self):
+        while self.buffer:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await asyncio.to_thread(self.write, self.take())
+
+    async def flush(self):
+        if self.buffer:
+            await asyncio.to_thread(self.write, self.take())
+
+traffic_capture = TrafficCapture(CAPTURE_FILE, CAPTURE_SAMPLE_RATE)
+
+def read_trace(path: str) -> list:
+    """Captured requests from a trace file, oldest first"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
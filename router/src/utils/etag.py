@@ -0,0 +1,16 @@
+from typing import Optional
+from fastapi import Response
+
+def version_etag(name: str, version) -> str:
+    """Weak ETag for a per-user version counter"""
+    return f'W/"{name}-{version or 0}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the given ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
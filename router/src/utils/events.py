@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from utils.redis import get_async_redis_client
+
+# Channel nodes publish dashboard-visible field changes to
+NODE_EVENTS_CHANNEL = "nodeEvents"
+
+# Events buffered per client before it is told to resync instead
+CLIENT_QUEUE_SIZE = 100
+
+class NodeEventBroadcaster:
+    """
+    One Redis subscription per worker, fanned out to a queue per connected
+    dashboard. The subscription is opened with the first client and closed
+    with the last.
+    """
+
+    def __init__(self):
+        self.queues = {}  # user id -> set of client queues
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.queues.setdefault(user_id, set()).add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.listen())
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        user_queues = self.queues.get(user_id)
+        if user_queues:
+            user_queues.discard(queue)
+            if not user_queues:
+                del self.queues[user_id]
+        if not self.queues and self.task:
+            self.task.cancel()
+            self.task = None
+
+    def dispatch(self, user_id: str, event: dict):
+        for queue in self.queues.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The client fell behind; drop what it has queued and have it refetch
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    async def listen(self):
+        client = get_async_redis_client()
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(NODE_EVENTS_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    event = json.loads(message["data"])
+                except ValueError:
+                    continue
+                self.dispatch(event.get("userId"), {
+                    "type": "node",
+                    "nodeId": event.get("nodeId"),
+                    "fields": event.get("fields", {})
+                })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Clients reconnect and refetch, which reopens the subscription
+            logging.warning(f"Node event subscription failed: {e}")
+            for user_id in list(self.queues):
+                self.dispatch(user_id, {"type": "closed"})
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+node_events = NodeEventBroadcaster()
@@ -0,0 +1,241 @@
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import struct
+import time
+from typing import Optional
+
+import httpx #type: ignore
+
+from utils.redis import get_redis_client
+from utils.keys import model_key, user_key
+
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co")
+HF_TOKEN = os.getenv("HF_TOKEN")
+
+# Headroom on top of the weights for activations, the KV cache and the runtime
+FOOTPRINT_OVERHEAD = float(os.getenv("ROUTER_FOOTPRINT_OVERHEAD", "0.2"))
+
+# Estimates are recomputed after this long, in case the repo changed
+FOOTPRINT_TTL = float(os.getenv("ROUTER_FOOTPRINT_TTL", str(7 * 24 * 3600)))
+
+# safetensors refuses headers over 100 MB
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+
+SAFETENSORS_DTYPE_BYTES = {
+    "F64": 8, "I64": 8, "U64": 8,
+    "F32": 4, "I32": 4, "U32": 4,
+    "F16": 2, "BF16": 2, "I16": 2, "U16": 2,
+    "F8_E4M3": 1, "F8_E5M2": 1, "I8": 1, "U8": 1, "BOOL": 1,
+}
+
+# Weight bytes per parameter once loaded. int8/int4 are bitsandbytes weight-only
+# profiles, which keep a few layers (embeddings, norms) in fp16; the overhead covers that.
+BYTES_PER_PARAMETER = {"float32": 4, "bfloat16": 2, "float16": 2, "int8": 1, "int4": 0.5}
+
+# What each quantization profile peaks at while loading. int8-dynamic loads the
+# model in fp32 and quantizes it afterwards.
+QUANTIZATION_PROFILES = {"int8-dynamic": "float32", "int8": "int8", "int4": "int4"}
+
+# Profiles worth suggesting per device, least lossy first
+SUGGESTED_QUANTIZATIONS = {"cuda": ("int8", "int4")}
+
+DEFAULT_GGUF_PATTERN = "*Q4_K_M.gguf"
+
+# Estimates being computed, so concurrent assignments of a model share one
+_estimates = {}
+
+class InsufficientMemoryError(Exception):
+    """The node doesn't have the memory the assignment needs"""
+
+    def __init__(self, required: int, usable: int, suggestion: Optional[str] = None):
+        self.required = required
+        self.usable = usable
+        self.suggestion = suggestion
+        message = f"Model needs ~{required / 1024 ** 3:.1f} GiB but the node has {usable / 1024 ** 3:.1f} GiB usable"
+        if suggestion:
+            message += f"; quantization '{suggestion}' would fit"
+        super().__init__(message)
+
+def hub_headers() -> dict:
+    return {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else {}
+
+async def read_safetensors_header(http: httpx.AsyncClient, repo: str, revision: str, file_name: str) -> dict:
+    """A safetensors file's header, fetched with two range requests instead of downloading the file"""
+    url = f"{HF_ENDPOINT}/{repo}/resolve/{revision}/{file_name}"
+    response = await http.get(url, headers={**hub_headers(), "Range": "bytes=0-7"})
+    response.raise_for_status()
+    (length,) = struct.unpack("<Q", response.content[:8])
+    if length > MAX_HEADER_BYTES:
+        raise ValueError(f"{file_name} has a {length} byte header")
+
+    response = await http.get(url, headers={**hub_headers(), "Range": f"bytes=8-{7 + length}"})
+    response.raise_for_status()
+    return json.loads(response.content)
+
+async def count_parameters(repo: str) -> dict:
+    """
+    Parameter counts by dtype and GGUF file sizes for a Hub repo. The Hub
+    reports safetensors parameter counts for most repos; otherwise they're
+    read from the header of each safetensors file.
+    """
+    async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as http:
+        response = await http.get(f"{HF_ENDPOINT}/api/models/{repo}", params={"blobs": "true"}, headers=hub_headers())
+        response.raise_for_status()
+        info = response.json()
+        siblings = info.get("siblings") or []
+
+        parameters = (info.get("safetensors") or {}).get("parameters")
+        if not parameters:
+            files = [s["rfilename"] for s in siblings if s["rfilename"].endswith(".safetensors")]
+            headers = await asyncio.gather(*(
+                read_safetensors_header(http, repo, info.get("sha") or "main", file_name) for file_name in files
+            ))
+            parameters = {}
+            for header in headers:
+                for name, tensor in header.items():
+                    if name == "__metadata__":
+                        continue
+                    count = 1
+                    for dimension in tensor["shape"]:
+                        count *= dimension
+                    parameters[tensor["dtype"]] = parameters.get(tensor["dtype"], 0) + count
+
+    return {
+        "parameters": parameters,
+        "ggufSizes": {s["rfilename"]: s.get("size") or 0 for s in siblings if s["rfilename"].lower().endswith(".gguf")}
+    }
+
+def footprint_from_counts(counts: dict) -> dict:
+    """Estimated weight bytes per load dtype/profile from parameter counts"""
+    total = sum(counts["parameters"].values())
+    return {
+        "parameterCount": total,
+        "storedBytes": sum(
+            count * SAFETENSORS_DTYPE_BYTES.get(dtype, 2) for dtype, count in counts["parameters"].items()
+        ),
+        "bytes": {profile: int(total * size) for profile, size in BYTES_PER_PARAMETER.items()},
+        "ggufSizes": counts["ggufSizes"]
+    }
+
+async def estimate_footprint(repo: str) -> dict:
+    """Compute a repo's footprint, sharing the work between concurrent callers"""
+    task = _estimates.get(repo)
+    if task is None:
+        async def compute():
+            try:
+                return footprint_from_counts(await count_parameters(repo))
+            finally:
+                _estimates.pop(repo, None)
+        task = asyncio.create_task(compute())
+        _estimates[repo] = task
+    return await task
+
+async def get_model_footprint(model_id: str, repo: str) -> Optional[dict]:
+    """
+    The footprint cached on the model:{id} hash, computed and cached on first
+    use. None if it can't be estimated, e.g. the Hub is unreachable.
+    """
+    client = get_redis_client()
+    footprint, cached_repo, computed_at, user_id = await asyncio.to_thread(
+        client.hmget, model_key(model_id), 'footprint', 'footprintRepo', 'footprintComputedAt', 'userId'
+    )
+    if footprint and cached_repo == repo and time.time() - float(computed_at or 0) < FOOTPRINT_TTL:
+        return json.loads(footprint)
+
+    try:
+        footprint = await estimate_footprint(repo)
+    except Exception as e:
+        logging.warning(f"Could not estimate the memory footprint of {repo}: {e}")
+        return None
+
+    # Don't recreate a model that was removed from the library meanwhile
+    if user_id and await asyncio.to_thread(client.exists, model_key(model_id)):
+        # Keys live in different slots, so this is a plain pipeline rather than a transaction
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(model_key(model_id), mapping={
+            "footprint": json.dumps(footprint),
+            "footprintRepo": repo,
+            "footprintComputedAt": int(time.time()),
+            "parameterCount": footprint["parameterCount"]
+        })
+        # The library shows the parameter count
+        pipe.incr(user_key(user_id, 'libraryVersion'))
+        await asyncio.to_thread(pipe.execute)
+    return footprint
+
+def schedule_footprint_estimate(model_id: str, repo: str):
+    """Warm the cache in the background when a model is added to a library"""
+    task = asyncio.get_running_loop().create_task(get_model_footprint(model_id, repo))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+# Background estimates, referenced so the tasks aren't garbage collected
+_background = set()
+
+def required_bytes(footprint: dict, payload: dict, weight_dtype: str) -> Optional[int]:
+    """Memory the assignment needs on a node that loads weights in weight_dtype, or None if unknown"""
+    if payload.get("backend") == "llama.cpp":
+        pattern = (payload.get("ggufFile") or DEFAULT_GGUF_PATTERN).lower()
+        # The node loads the first match in path order
+        matches = sorted(
+            name for name in footprint["ggufSizes"] if fnmatch.fnmatch(os.path.basename(name).lower(), pattern)
+        )
+        if not matches:
+            return None
+        weights = footprint["ggufSizes"][matches[0]]
+    else:
+        if not footprint["parameterCount"]:
+            return None
+        profile = QUANTIZATION_PROFILES.get(payload.get("quantization"), weight_dtype)
+        weights = footprint["bytes"].get(profile)
+        if weights is None:
+            return None
+    return int(weights * (1 + FOOTPRINT_OVERHEAD))
+
+def suggest_quantization(footprint: dict, payload: dict, device: str, usable: int) -> Optional[str]:
+    """The least lossy quantization profile that would fit, if any"""
+    if payload.get("backend") == "llama.cpp":
+        return None
+    for quantization in SUGGESTED_QUANTIZATIONS.get(device, ()):
+        required = required_bytes(footprint, {**payload, "quantization": quantization}, "float16")
+        if required is not None and required <= usable:
+            return quantization
+    return None
+
+async def check_assignment_fits(http: httpx.AsyncClient, node_data: dict, payload: dict):
+    """
+    Raise InsufficientMemoryError if the node can't hold the model, before it
+    downloads anything. Assignments go ahead when the node doesn't report its
+    memory or the footprint can't be estimated.
+    """
+    # The node answers that the model is already loaded without loading anything
+    if node_data.get('activeModelId') == payload["modelId"]:
+        return
+
+    try:
+        response = await http.get(f"{node_data.get('nodeUrl')}/memory", headers={"X-API-Key": node_data.get('apiKey', '')})
+        response.raise_for_status()
+        memory = response.json()
+    except httpx.HTTPError as e:
+        logging.info(f"Node {payload['nodeId']} didn't report its memory, skipping the fit check: {e}")
+        return
+    if memory.get("freeBytes") is None:
+        return
+
+    # The node downloads and loads the repo named by modelName
+    footprint = await get_model_footprint(payload["modelId"], payload["modelName"])
+    if not footprint:
+        return
+    required = required_bytes(footprint, payload, memory.get("weightDtype") or "float32")
+    if required is None:
+        return
+
+    usable = memory["freeBytes"]
+    if not payload.get("hotSwap"):
+        # The loaded model is unloaded before the new one loads
+        usable += memory.get("loadedModelBytes") or 0
+    if required > usable:
+        raise InsufficientMemoryError(required, usable, suggest_quantization(footprint, payload, memory.get("device"), usable))
@@ -0,0 +1,53 @@
+"""
+Redis key layout. The id in braces is the key's hash tag, so under Redis
+Cluster every key belonging to one node, user, model, rollout or setup token
+lives in the same slot and can be used together in one pipeline or Lua script.
+"""
+
+# Index of every registered node id, replacing KEYS/SCAN over node hashes
+NODES_INDEX = 'index:nodes'
+
+# modelName -> modelId, for completions that name a model instead of its id
+MODELS_BY_NAME = 'index:modelsByName'
+
+# Model ids with recorded demand, scored by the last minute seen
+DEMAND_MODELS = 'demand:models'
+
+SCHEDULER_LOCK = 'scheduler:lock'
+SCHEDULER_LAST_RUN = 'scheduler:lastRun'
+
+def node_key(node_id: str) -> str:
+    return f'node:{{{node_id}}}'
+
+def user_key(user_id: str, field: str) -> str:
+    """user:{id}:nodes, :nodeNames, :nodesVersion, :models, :libraryVersion, :rollouts"""
+    return f'user:{{{user_id}}}:{field}'
+
+def model_key(model_id: str) -> str:
+    return f'model:{{{model_id}}}'
+
+def model_nodes_key(model_id: str) -> str:
+    """Nodes whose active model is model_id, maintained by the nodes"""
+    return f'model:{{{model_id}}}:nodes'
+
+def setup_key(setup_token: str, field: str) -> str:
+    """setup:{token}:nodeId, :name, :url"""
+    return f'setup:{{{setup_token}}}:{field}'
+
+def rollout_key(rollout_id: str, field: str = '') -> str:
+    return f'rollout:{{{rollout_id}}}:{field}' if field else f'rollout:{{{rollout_id}}}'
+
+def demand_key(model_id: str, minute: int) -> str:
+    return f'demand:{{{model_id}}}:{minute}'
+
+# Usage events appended by the router, aggregated by the usage worker
+USAGE_STREAM = 'usage:events'
+USAGE_GROUP = 'usage-aggregators'
+
+def usage_key(kind: str, owner_id: str) -> str:
+    """usage:key:{api key id}, usage:node:{node id}, usage:host:{user id}"""
+    return f'usage:{kind}:{{{owner_id}}}'
+
+def rate_limit_key(key_id: str, model: str = '') -> str:
+    """Token buckets of an API key, and of the key for one model, in the key's slot"""
+    return f'ratelimit:{{{key_id}}}:{model}' if model else f'ratelimit:{{{key_id}}}'
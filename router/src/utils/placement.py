@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Optional
+
+import httpx #type: ignore
+
+from utils.redis import get_redis_client
+from utils.keys import node_key, model_key, demand_key, NODES_INDEX, DEMAND_MODELS, SCHEDULER_LOCK, SCHEDULER_LAST_RUN
+from utils.assignment import build_assignment_payload, send_assignment
+from utils.footprint import InsufficientMemoryError
+
+# Requests per minute one ready node is expected to absorb
+TARGET_RPM_PER_NODE = float(os.getenv("ROUTER_PLACEMENT_TARGET_RPM", "30"))
+
+# Minutes of demand the scheduler looks at
+DEMAND_WINDOW_MINUTES = int(os.getenv("ROUTER_PLACEMENT_WINDOW_MINUTES", "10"))
+
+# Seconds between scheduler runs; auto-assignment only happens when enabled
+SCHEDULER_INTERVAL = float(os.getenv("ROUTER_SCHEDULER_INTERVAL", "60"))
+AUTO_PLACEMENT = os.getenv("ROUTER_AUTO_PLACEMENT", "false").lower() in ("1", "true", "yes")
+
+# Demand buckets outlive the window so recent history can be replayed in simulation
+DEMAND_TTL_SECONDS = 6 * 3600
+
+# Statuses of a node that is bringing a model up, counted as capacity on its way
+LOADING_STATUSES = ("queued", "downloading", "loading", "benchmarking")
+
+# Identifies this worker when taking the scheduler lock
+WORKER_ID = str(uuid.uuid4())
+
+# Demand writes in flight, referenced so the tasks aren't garbage collected
+_demand_writes = set()
+
+def current_minute() -> int:
+    return int(time.time() // 60)
+
+def record_demand_sync(model_id: str, fields: dict):
+    minute = current_minute()
+    client = get_redis_client()
+    pipe = client.pipeline(transaction=False)
+    for field, amount in fields.items():
+        pipe.hincrby(demand_key(model_id, minute), field, int(amount))
+    pipe.expire(demand_key(model_id, minute), DEMAND_TTL_SECONDS)
+    pipe.zadd(DEMAND_MODELS, {model_id: minute})
+    pipe.execute()
+
+def record_demand(model_id: str, **fields):
+    """
+    Count a completion request against the model's per-minute demand bucket
+    (requests, notLoaded, atCapacity, latencyMs). Written in the background so
+    the request doesn't wait on it.
+    """
+    async def write():
+        try:
+            await asyncio.to_thread(record_demand_sync, model_id, fields)
+        except Exception as e:
+            logging.warning(f"Failed to record demand for {model_id}: {e}")
+
+    task = asyncio.get_running_loop().create_task(write())
+    _demand_writes.add(task)
+    task.add_done_callback(_demand_writes.discard)
+
+def get_demand(client, window_minutes: int = DEMAND_WINDOW_MINUTES, end_minute: Optional[int] = None) -> dict:
+    """Per-model totals over the window: requests, notLoaded, atCapacity, latencyMs"""
+    end_minute = end_minute or current_minute()
+    start_minute = end_minute - window_minutes + 1
+    model_ids = client.zrangebyscore(DEMAND_MODELS, start_minute, '+inf')
+
+    pipe = client.pipeline(transaction=False)
+    for model_id in model_ids:
+        for minute in range(start_minute, end_minute + 1):
+            pipe.hgetall(demand_key(model_id, minute))
+    buckets = pipe.execute()
+
+    demand = {}
+    for index, model_id in enumerate(model_ids):
+        totals = {"requests": 0, "notLoaded": 0, "atCapacity": 0, "latencyMs": 0}
+        for bucket in buckets[index * window_minutes:(index + 1) * window_minutes]:
+            for field in totals:
+                totals[field] += int(bucket.get(field, 0))
+        demand[model_id] = totals
+    return demand
+
+def get_fleet(client) -> list:
+    """Every registered node hash, read in one pipelined batch"""
+    pipe = client.pipeline(transaction=False)
+    for node_id in client.smembers(NODES_INDEX):
+        pipe.hgetall(node_key(node_id))
+    return [node for node in pipe.execute() if node.get('nodeId')]
+
+def is_idle(node: dict) -> bool:
+    """Online with no model loaded or on its way"""
+    return (
+        node.get('status') == 'active'
+        and not node.get('activeModelId')
+        and not node.get('pendingModelId')
+        and node.get('modelStatus', 'idle') in ('idle', 'error', '')
+    )
+
+def plan_placements(demand: dict, nodes: list, window_minutes: int, target_rpm: float = TARGET_RPM_PER_NODE) -> dict:
+    """
+    Compare each model's demand with its ready capacity.
+
+    Returns {"recommendations": [...], "assignments": [(nodeId, modelId), ...]}.
+    Recommendations cover every model with demand or nodes. Assignments only
+    use idle nodes whose owners opted in to autoAssign, most underserved
+    model first.
+    """
+    ready = {}
+    loading = {}
+    for node in nodes:
+        model_id = node.get('activeModelId')
+        if model_id and node.get('modelStatus') == 'ready' and node.get('qualified') != 'false':
+            ready[model_id] = ready.get(model_id, 0) + 1
+        elif model_id and node.get('modelStatus') in LOADING_STATUSES:
+            loading[model_id] = loading.get(model_id, 0) + 1
+        pending_id = node.get('pendingModelId')
+        if pending_id and node.get('pendingModelStatus') in LOADING_STATUSES:
+            loading[pending_id] = loading.get(pending_id, 0) + 1
+
+    recommendations = []
+    for model_id in set(demand) | set(ready) | set(loading):
+        stats = demand.get(model_id, {"requests": 0, "notLoaded": 0, "atCapacity": 0, "latencyMs": 0})
+        rate = stats["requests"] / max(window_minutes, 1)
+        ready_nodes = ready.get(model_id, 0)
+        loading_nodes = loading.get(model_id, 0)
+
+        needed = math.ceil(rate / target_rpm) if rate else 0
+        if stats["atCapacity"]:
+            needed = max(needed, ready_nodes + 1)
+
+        shortfall = needed - ready_nodes - loading_nodes
+        if shortfall > 0:
+            action = "add"
+        elif not rate and ready_nodes:
+            action = "release"
+        else:
+            action = "ok"
+
+        served = stats["requests"] - stats["notLoaded"] - stats["atCapacity"]
+        recommendations.append({
+            "modelId": model_id,
+            "requestsPerMinute": round(rate, 2),
+            "notLoaded": stats["notLoaded"],
+            "atCapacity": stats["atCapacity"],
+            "avgLatencyMs": round(stats["latencyMs"] / served, 1) if served > 0 else None,
+            "readyNodes": ready_nodes,
+            "loadingNodes": loading_nodes,
+            "neededNodes": needed,
+            "shortfall": max(shortfall, 0),
+            "action": action
+        })
+
+    # Unserved demand first, then the largest shortfall
+    recommendations.sort(key=lambda r: (-r["notLoaded"], -r["shortfall"], -r["requestsPerMinute"], r["modelId"]))
+
+    idle_nodes = sorted(
+        (node['nodeId'] for node in nodes if is_idle(node) and node.get('autoAssign') == 'true')
+    )
+    assignments = []
+    for recommendation in recommendations:
+        for _ in range(recommendation["shortfall"]):
+            if not idle_nodes:
+                break
+            assignments.append((idle_nodes.pop(0), recommendation["modelId"]))
+
+    return {"recommendations": recommendations, "assignments": assignments}
+
+async def apply_assignments(client, assignments: list, nodes: list) -> list:
+    """Send the scheduler's assignments through the nodes' /assign-model endpoint"""
+    nodes_by_id = {node['nodeId']: node for node in nodes}
+    model_ids = sorted({model_id for _, model_id in assignments})
+    pipe = client.pipeline(transaction=False)
+    for model_id in model_ids:
+        pipe.hgetall(model_key(model_id))
+    models = dict(zip(model_ids, await asyncio.to_thread(pipe.execute)))
+
+    async def assign(node_id: str, model_id: str) -> dict:
+        payload = build_assignment_payload(node_id, model_id, models.get(model_id, {}), {})
+        try:
+            await send_assignment(nodes_by_id[node_id], payload)
+            return {"nodeId": node_id, "modelId": model_id, "result": "sent"}
+        except httpx.HTTPError as e:
+            logging.warning(f"Scheduler failed to assign {model_id} to {node_id}: {e}")
+            return {"nodeId": node_id, "modelId": model_id, "result": str(e)}
+        except InsufficientMemoryError as e:
+            logging.info(f"Scheduler skipped assigning {model_id} to {node_id}: {e}")
+            return {"nodeId": node_id, "modelId": model_id, "result": str(e)}
+
+    return list(await asyncio.gather(*(
+        assign(node_id, model_id) for node_id, model_id in assignments if models.get(model_id)
+    )))
+
+async def run_scheduler_once(auto_assign: bool = AUTO_PLACEMENT) -> dict:
+    """Plan placements from current demand and, if enabled, assign idle opted-in nodes"""
+    client = get_redis_client()
+    demand = await asyncio.to_thread(get_demand, client)
+    nodes = await asyncio.to_thread(get_fleet, client)
+    plan = plan_placements(demand, nodes, DEMAND_WINDOW_MINUTES)
+
+    applied = []
+    if auto_assign and plan["assignments"]:
+        applied = await apply_assignments(client, plan["assignments"], nodes)
+
+    return {
+        "recommendations": plan["recommendations"],
+        "assignments": applied,
+        "ranAt": int(time.time())
+    }
+
+async def scheduler_loop():
+    """Run the scheduler every interval on whichever router worker holds the lock"""
+    while True:
+        try:
+            client = get_redis_client()
+            if await asyncio.to_thread(client.set, SCHEDULER_LOCK, WORKER_ID, nx=True, ex=int(SCHEDULER_INTERVAL)):
+                result = await run_scheduler_once()
+                # Only scheduled runs are recorded; /scheduler/recommendations is read-only
+                await asyncio.to_thread(client.set, SCHEDULER_LAST_RUN, json.dumps(result))
+                if result["assignments"]:
+                    logging.info(f"Scheduler assignments: {result['assignments']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Scheduler run failed: {e}")
+        await asyncio.sleep(SCHEDULER_INTERVAL)
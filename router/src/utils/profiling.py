@@ -0,0 +1,127 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter
+from typing import Optional
+
+# Upper bound on how long one profile may run
+PROFILE_MAX_SECONDS = float(os.getenv("ROUTER_PROFILE_MAX_SECONDS", "300"))
+
+# Shared secret for the profile endpoint, which is disabled while it is unset
+PROFILE_TOKEN = os.getenv("ROUTER_PROFILE_TOKEN")
+
+class LoopProfile:
+    """
+    One bounded profile of the event loop: runs until max_requests completions
+    have finished or the time is up, whichever comes first.
+
+    The router only waits on Redis and nodes, so its costs show up as time the
+    event loop is held without yielding. A heartbeat task measures how late the
+    loop wakes it; a watchdog thread samples the loop thread's stack whenever
+    the heartbeat is overdue, i.e. only the code that is blocking the loop.
+    """
+
+    def __init__(self, max_requests: Optional[int], seconds: float, interval: float):
+        self.max_requests = max_requests
+        self.seconds = seconds
+        self.interval = interval
+        self.requests = 0
+        self.started_at = time.time()
+        self.ended_at = None
+        self.loop_lags = []
+        self.blocked_stacks = Counter()
+        self.last_beat = time.monotonic()
+        self._loop_thread = threading.get_ident()
+        self._finished = asyncio.Event()
+        self._stopped = threading.Event()
+
+    def request_finished(self):
+        """Called on the event loop as each completion request finishes"""
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            self._finished.set()
+
+    async def heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.loop_lags.append(loop.time() - start - self.interval)
+            self.last_beat = time.monotonic()
+
+    def watch(self):
+        while not self._stopped.wait(self.interval):
+            if time.monotonic() - self.last_beat < 2 * self.interval:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.blocked_stacks[";".join(reversed(stack))] += 1
+
+    async def run(self) -> bytes:
+        watchdog = threading.Thread(target=self.watch, name="profile-watchdog", daemon=True)
+        watchdog.start()
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            await asyncio.wait_for(self._finished.wait(), timeout=self.seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            heartbeat.cancel()
+            self.ended_at = time.time()
+            self._stopped.set()
+            await asyncio.to_thread(watchdog.join)
+        return self.artifact()
+
+    def summary(self) -> dict:
+        lags = sorted(self.loop_lags)
+        return {
+            "startedAt": int(self.started_at),
+            "durationSeconds": round((self.ended_at or time.time()) - self.started_at, 3),
+            "requests": self.requests,
+            "blockedSamples": sum(self.blocked_stacks.values()),
+            "eventLoopLagMs": {
+                "p50": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+                "p99": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+                "max": round(lags[-1] * 1000, 2) if lags else 0.0
+            }
+        }
+
+    def artifact(self) -> bytes:
+        """A zip with summary.json and the blocking stacks collapsed, as read by flamegraph.pl and speedscope"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("summary.json", json.dumps(self.summary(), indent=2))
+            archive.writestr("blocked.folded", "".join(
+                f"{stack} {count}\n" for stack, count in self.blocked_stacks.most_common()
+            ))
+        return buffer.getvalue()
+
+# The running profile, if any. Request paths only check it for None.
+active_session: Optional[LoopProfile] = None
+
+def request_finished():
+    if active_session is not None:
+        active_session.request_finished()
+
+async def run_profile(max_requests: Optional[int], seconds: float, interval: float) -> tuple[bytes, dict]:
+    """Profile until the session ends and return (zip artifact, summary). One profile runs at a time."""
+    global active_session
+    if active_session is not None:
+        raise RuntimeError("A profile is already running")
+
+    session = LoopProfile(max_requests, seconds, interval)
+    active_session = session
+    try:
+        artifact = await session.run()
+    finally:
+        active_session = None
+    return artifact, session.summary()
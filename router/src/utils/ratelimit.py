@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+from utils.redis import get_redis_client
+from utils.keys import rate_limit_key
+
+# Per API key limits: requests and generated tokens per minute (0 disables).
+# Off by default: callers without an Authorization header share one bucket.
+KEY_RPM = float(os.getenv("ROUTER_RATE_LIMIT_RPM", "0"))
+KEY_TPM = float(os.getenv("ROUTER_RATE_LIMIT_TPM", "0"))
+
+# Per API key, per model limits (0 disables)
+MODEL_RPM = float(os.getenv("ROUTER_MODEL_RATE_LIMIT_RPM", "0"))
+MODEL_TPM = float(os.getenv("ROUTER_MODEL_RATE_LIMIT_TPM", "0"))
+
+# Requests a worker may take from a bucket at once when the bucket is more
+# than half full, then admit locally without Redis until used or expired
+LEASE_SIZE = int(os.getenv("ROUTER_RATE_LIMIT_LEASE_SIZE", "5"))
+LEASE_TTL = float(os.getenv("ROUTER_RATE_LIMIT_LEASE_TTL", "1.0"))
+
+# Each bucket hash holds a request level, a token level and when they were last
+# refilled. Both buckets share the API key's hash tag, so one script covers them.
+#
+# KEYS: key bucket, key+model bucket
+# ARGV: now (ms), then rpm, tpm for each bucket, lease size
+# Returns {granted requests, retry after (ms)}
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local lease = tonumber(ARGV[6])
+local buckets = {}
+
+for i = 1, 2 do
+    local rpm = tonumber(ARGV[i * 2])
+    local tpm = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', KEYS[i], 'requests', 'tokens', 'ts')
+    local elapsed = math.max(now - (tonumber(state[3]) or now), 0) / 60000
+    local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm)
+    local tokens = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm)
+    buckets[i] = {rpm = rpm, tpm = tpm, requests = requests, tokens = tokens}
+end
+
+local retry = 0
+for i = 1, 2 do
+    local b = buckets[i]
+    if b.rpm > 0 and b.requests < 1 then
+        retry = math.max(retry, (1 - b.requests) / b.rpm * 60000)
+    end
+    if b.tpm > 0 and b.tokens <= 0 then
+        retry = math.max(retry, (1 - b.tokens) / b.tpm * 60000)
+    end
+end
+
+local granted = 0
+if retry == 0 then
+    granted = lease
+    for i = 1, 2 do
+        local b = buckets[i]
+        if b.rpm > 0 then
+            granted = math.min(granted, math.max(math.floor(b.requests - b.rpm / 2), 1))
+        end
+    end
+    for i = 1, 2 do
+        local b = buckets[i]
+        if b.rpm > 0 then
+            b.requests = b.requests - granted
+        end
+    end
+end
+
+for i = 1, 2 do
+    local b = buckets[i]
+    if b.rpm > 0 or b.tpm > 0 then
+        redis.call('HSET', KEYS[i], 'requests', b.requests, 'tokens', b.tokens, 'ts', now)
+        redis.call('PEXPIRE', KEYS[i], 120000)
+    end
+end
+
+return {granted, math.ceil(retry)}
+"""
+
+# Charge generated tokens after the fact. Buckets may go into debt, which
+# blocks the key until it refills.
+#
+# KEYS: key bucket, key+model bucket
+# ARGV: now (ms), then rpm, tpm for each bucket, tokens
+# Returns the lowest token level left
+CHARGE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local charge = tonumber(ARGV[6])
+local lowest = nil
+
+for i = 1, 2 do
+    local rpm = tonumber(ARGV[i * 2])
+    local tpm = tonumber(ARGV[i * 2 + 1])
+    if tpm > 0 then
+        local state = redis.call('HMGET', KEYS[i], 'requests', 'tokens', 'ts')
+        local elapsed = math.max(now - (tonumber(state[3]) or now), 0) / 60000
+        local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm)
+        local tokens = math.max(math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm) - charge, -tpm)
+        redis.call('HSET', KEYS[i], 'requests', requests, 'tokens', tokens, 'ts', now)
+        redis.call('PEXPIRE', KEYS[i], 120000)
+        if lowest == nil or tokens < lowest then
+            lowest = tokens
+        end
+    end
+end
+
+return tostring(lowest or 0)
+"""
+
+class RateLimiter:
+    """
+    Token buckets per API key and per API key and model, kept in Redis so
+    every router worker shares them. Requests are admitted with one script
+    call; a worker whose buckets are well under their limits leases a few
+    requests at once and admits the next ones without Redis.
+    """
+
+    def __init__(self):
+        self.leases = {}  # (key id, model) -> (requests left, expires at)
+        self.lock = threading.Lock()
+        self.admit_script = None
+        self.charge_script = None
+
+    @property
+    def enabled(self) -> bool:
+        return any((KEY_RPM, KEY_TPM, MODEL_RPM, MODEL_TPM))
+
+    def scripts(self):
+        if self.admit_script is None:
+            client = get_redis_client()
+            self.admit_script = client.register_script(ADMIT_SCRIPT)
+            self.charge_script = client.register_script(CHARGE_SCRIPT)
+        return self.admit_script, self.charge_script
+
+    def take_lease(self, lease_key: tuple) -> bool:
+        with self.lock:
+            left, expires = self.leases.get(lease_key, (0, 0))
+            if left > 0 and time.monotonic() < expires:
+                self.leases[lease_key] = (left - 1, expires)
+                return True
+            return False
+
+    def bucket_args(self, key_id: str, model: str) -> tuple:
+        keys = [rate_limit_key(key_id), rate_limit_key(key_id, model)]
+        limits = [KEY_RPM, KEY_TPM, MODEL_RPM, MODEL_TPM]
+        return keys, limits
+
+    def admit(self, key_id: str, model: str) -> Optional[int]:
+        """None if the request may proceed, otherwise seconds until it may be retried"""
+        if not self.enabled:
+            return None
+
+        lease_key = (key_id, model)
+        if self.take_lease(lease_key):
+            return None
+
+        keys, limits = self.bucket_args(key_id, model)
+        try:
+            admit_script, _ = self.scripts()
+            granted, retry_ms = admit_script(keys=keys, args=[int(time.time() * 1000), *limits, LEASE_SIZE])
+        except Exception as e:
+            # Fail open: a Redis outage shouldn't stop completions
+            logging.warning(f"Rate limit check failed, admitting: {e}")
+            return None
+
+        if not granted:
+            return max(math.ceil(int(retry_ms) / 1000), 1)
+
+        if int(granted) > 1:
+            with self.lock:
+                self.leases[lease_key] = (int(granted) - 1, time.monotonic() + LEASE_TTL)
+        return None
+
+    def charge_tokens_sync(self, key_id: str, model: str, tokens: int):
+        if not (KEY_TPM or MODEL_TPM) or tokens <= 0:
+            return
+        keys, limits = self.bucket_args(key_id, model)
+        try:
+            _, charge_script = self.scripts()
+            lowest = float(charge_script(keys=keys, args=[int(time.time() * 1000), *limits, tokens]))
+        except Exception as e:
+            logging.warning(f"Failed to charge {tokens} tokens to {key_id}: {e}")
+            return
+
+        # Out of tokens: stop admitting from the lease so the next request checks Redis
+        if lowest <= 0:
+            with self.lock:
+                self.leases.pop((key_id, model), None)
+
+    def charge_tokens(self, key_id: str, model: str, tokens: int):
+        """Charge generated tokens in the background once the completion is done"""
+        task = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(self.charge_tokens_sync, key_id, model, tokens)
+        )
+        _charges.add(task)
+        task.add_done_callback(_charges.discard)
+
+# Charges in flight, referenced so the tasks aren't garbage collected
+_charges = set()
+
+rate_limiter = RateLimiter()
+
+async def enforce_rate_limit(key_id: str, model: str):
+    """Raise 429 with Retry-After if the API key is over its limits"""
+    if not rate_limiter.enabled:
+        return
+    # The script call is a blocking Redis round trip, kept off the event loop
+    retry_after = await asyncio.to_thread(rate_limiter.admit, key_id, model)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(retry_after)}
+        )
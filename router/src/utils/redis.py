@@ -1,9 +1,34 @@
 import redis
 import os
 
+# Clients are shared: a cluster client discovers the slot layout when created
+_client = None
+
+def redis_cluster_enabled() -> bool:
+    return os.getenv('REDIS_CLUSTER', 'false').lower() in ('1', 'true', 'yes')
+
 def get_redis_client():
     # Use environment variables for flexibility
     # Default to host.docker.internal for Docker, but allow override for local dev
+    # With REDIS_CLUSTER set, REDIS_HOST/REDIS_PORT is any node of the cluster
+    global _client
+    if _client is None:
+        host = os.getenv('REDIS_HOST', 'host.docker.internal')
+        port = int(os.getenv('REDIS_PORT', '6379'))
+        if redis_cluster_enabled():
+            from redis.cluster import RedisCluster
+            _client = RedisCluster(host=host, port=port, decode_responses=True)
+        else:
+            _client = redis.Redis(host=host, port=port, decode_responses=True)
+    return _client
+
+def get_async_redis_client():
+    """
+    asyncio client, for long-lived subscriptions that shouldn't hold a worker
+    thread. Pub/sub messages reach every node of a cluster, so a plain
+    connection to the configured node works in cluster mode too.
+    """
+    import redis.asyncio
     host = os.getenv('REDIS_HOST', 'host.docker.internal')
     port = int(os.getenv('REDIS_PORT', '6379'))
-    return redis.Redis(host=host, port=port, decode_responses=True)
\ No newline at end of file
+    return redis.asyncio.Redis(host=host, port=port, decode_responses=True)
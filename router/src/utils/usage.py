@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Optional
+
+from utils.redis import get_redis_client
+from utils.keys import USAGE_STREAM
+
+# Events are buffered in process and appended in batches this often
+FLUSH_INTERVAL = float(os.getenv("ROUTER_USAGE_FLUSH_INTERVAL", "0.05"))
+
+# Approximate stream length kept for the usage worker to catch up from
+STREAM_MAXLEN = int(os.getenv("ROUTER_USAGE_STREAM_MAXLEN", "1000000"))
+
+# Buffered events beyond this are dropped (and logged) rather than growing without bound
+MAX_BUFFERED = 100000
+
+def api_key_id(authorization: Optional[str]) -> str:
+    """Stable id for the caller's API key, so raw keys are never stored"""
+    if not authorization:
+        return "anonymous"
+    api_key = authorization.removeprefix("Bearer ").strip()
+    if not api_key:
+        return "anonymous"
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+class UsageRecorder:
+    """
+    Collects usage events from request handlers and appends them to the usage
+    stream in pipelined batches from a background task, so recording a
+    request costs a list append.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def record(self, event: dict):
+        if len(self.buffer) >= MAX_BUFFERED:
+            self.dropped += 1
+            return
+        self.buffer.append(event)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def write(self, events: list):
+        """Append events to the stream in one round trip"""
+        try:
+            pipe = get_redis_client().pipeline(transaction=False)
+            for event in events:
+                pipe.xadd(USAGE_STREAM, event, maxlen=STREAM_MAXLEN, approximate=True)
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Failed to record {len(events)} usage events: {e}")
+
+    def take(self) -> list:
+        """Swap out the buffer; called on the event loop so no append is lost"""
+        events, self.buffer = self.buffer, []
+        if self.dropped:
+            logging.warning(f"Dropped {self.dropped} usage events, the buffer was full")
+            self.dropped = 0
+        return events
+
+    async def run(self):
+        while self.buffer:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await asyncio.to_thread(self.write, self.take())
+
+    async def flush(self):
+        """Write out whatever is buffered, e.g. at shutdown"""
+        if self.buffer:
+            await asyncio.to_thread(self.write, self.take())
+
+usage_recorder = UsageRecorder()
+
+def record_usage(api_key: str, model_id: str, node_id: str, prompt_tokens: int, completion_tokens: int, latency_ms: int):
+    usage_recorder.record({
+        "apiKey": api_key,
+        "modelId": model_id,
+        "nodeId": node_id,
+        "promptTokens": prompt_tokens,
+        "completionTokens": completion_tokens,
+        "latencyMs": latency_ms,
+        "ts": int(time.time())
+    })
@@ -14,12 +14,22 @@ find_open_port() {
 PORT=$(find_open_port)
 NODE_NAME="node-$PORT"
 
+# Optional: pin the node to a set of host CPUs, e.g. CPUSET=0-7 ./scripts/add-node.sh
+# Torch sizes its thread pool to the CPUs the container is allowed to use
+CPU_ARGS=()
+if [ -n "$CPUSET" ]; then
+    CPU_ARGS=(--cpuset-cpus "$CPUSET")
+fi
+
 docker run -d \
+    "${CPU_ARGS[@]}" \
+    --stop-timeout 160 \
     --name "$NODE_NAME" \
     --hostname "$NODE_NAME" \
     --network gpu_gpu-net \
     --network-alias "$NODE_NAME" \
     -p $PORT:8005 \
+    -v gpu-model-store:/model-store \
     -e PUBLIC_IPADDR=localhost \
     -e EXTERNAL_PORT=$PORT \
     -e ROUTER_PUBLIC_IPADDR=localhost:5173 \
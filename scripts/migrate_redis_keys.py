@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Move an existing single-instance database to the hash-tagged key layout and
+build the indexes that replace KEYS scans. Safe to run more than once.
+
+    REDIS_HOST=localhost REDIS_PORT=6379 python scripts/migrate_redis_keys.py
+
+Run it against the single instance before pointing the services at a cluster
+(then move the data with `redis-cli --cluster import`). Stop the router and
+nodes first so nothing writes old-style keys meanwhile.
+"""
+
+import os
+import re
+
+import redis
+
+RENAMES = [
+    (re.compile(r'^node:([^{}:]+)$'), 'node:{{{0}}}'),
+    (re.compile(r'^model:([^{}:]+)$'), 'model:{{{0}}}'),
+    (re.compile(r'^user:([^{}:]+):(\w+)$'), 'user:{{{0}}}:{1}'),
+    (re.compile(r'^rollout:([^{}:]+)$'), 'rollout:{{{0}}}'),
+    (re.compile(r'^rollout:([^{}:]+):nodes$'), 'rollout:{{{0}}}:nodes'),
+    (re.compile(r'^demand:([^{}:]+):(\d+)$'), 'demand:{{{0}}}:{1}'),
+    (re.compile(r'^setup_token:(.+)$'), 'setup:{{{0}}}:nodeId'),
+    (re.compile(r'^setup_token_name:(.+)$'), 'setup:{{{0}}}:name'),
+    (re.compile(r'^setup_node_url:(.+)$'), 'setup:{{{0}}}:url'),
+]
+
+def main():
+    client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', '6379')),
+        decode_responses=True
+    )
+
+    renamed = 0
+    for key in client.scan_iter(count=1000):
+        for pattern, template in RENAMES:
+            match = pattern.match(key)
+            if match:
+                # RENAME keeps the TTL, so setup tokens still expire
+                client.rename(key, template.format(*match.groups()))
+                renamed += 1
+                break
+    print(f"Renamed {renamed} keys")
+
+    nodes = 0
+    for key in client.scan_iter(match='node:{*}', count=1000):
+        node = client.hgetall(key)
+        if not node.get('nodeId'):
+            continue
+        client.sadd('index:nodes', node['nodeId'])
+        if node.get('activeModelId'):
+            client.sadd(f"model:{{{node['activeModelId']}}}:nodes", node['nodeId'])
+        if node.get('userId') and node.get('nodeName'):
+            client.sadd(f"user:{{{node['userId']}}}:nodeNames", node['nodeName'])
+        nodes += 1
+    print(f"Indexed {nodes} nodes")
+
+    models = 0
+    for key in client.scan_iter(match='model:{*}', count=1000):
+        if key.endswith(':nodes'):
+            continue
+        model = client.hgetall(key)
+        if model.get('modelName') and model.get('modelId'):
+            client.hsetnx('index:modelsByName', model['modelName'], model['modelId'])
+            models += 1
+    print(f"Indexed {models} models")
+
+if __name__ == "__main__":
+    main()
@@ -13,21 +13,35 @@ docker ps -a --filter "name=node-" --format "{{.Names}}" | xargs -r docker rm -f
 # Clean up Redis keys
 redis-cli -h localhost -p 6379 --scan --pattern "node:*" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
 redis-cli -h localhost -p 6379 --scan --pattern "user:*:nodes" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
-redis-cli -h localhost -p 6379 --scan --pattern "setup_token:*" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
-redis-cli -h localhost -p 6379 --scan --pattern "setup_token_name:*" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
+redis-cli -h localhost -p 6379 --scan --pattern "user:*:nodeNames" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
+# Bump the dashboards' node versions so cached node lists aren't answered with 304
+redis-cli -h localhost -p 6379 --scan --pattern "user:*:nodesVersion" | xargs -r -n 1 redis-cli -h localhost -p 6379 incr > /dev/null 2>&1
+redis-cli -h localhost -p 6379 --scan --pattern "setup:*" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
+# Drop the removed nodes from the fleet index and the per-model node sets
+redis-cli -h localhost -p 6379 del index:nodes > /dev/null 2>&1
+redis-cli -h localhost -p 6379 --scan --pattern "model:*:nodes" | xargs -r redis-cli -h localhost -p 6379 del 2>/dev/null
 
 # Rebuild the node image
 docker build -t gpu-node:latest ./node
 
+# Optional: pin the nodes to a set of host CPUs, as in add-node.sh
+CPU_ARGS=()
+if [ -n "$CPUSET" ]; then
+    CPU_ARGS=(--cpuset-cpus "$CPUSET")
+fi
+
 # Restart the nodes that were previously running
 for PORT in "${NODES[@]}"; do
     NODE_NAME="node-$PORT"
     docker run -d \
+        "${CPU_ARGS[@]}" \
+        --stop-timeout 160 \
         --name "$NODE_NAME" \
         --hostname "$NODE_NAME" \
         --network gpu_gpu-net \
         --network-alias "$NODE_NAME" \
         -p $PORT:8005 \
+        -v gpu-model-store:/model-store \
         -e PUBLIC_IPADDR=localhost \
         -e EXTERNAL_PORT=$PORT \
         -e ROUTER_PUBLIC_IPADDR=localhost:5173 \
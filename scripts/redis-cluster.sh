@@ -0,0 +1,52 @@
+#!/bin/bash
+
+# Start or stop a local 6-process Redis Cluster (3 primaries, 3 replicas)
+# for testing the router and nodes with REDIS_CLUSTER=true
+#   ./scripts/redis-cluster.sh start
+#   REDIS_CLUSTER=true REDIS_HOST=127.0.0.1 REDIS_PORT=7000 python -m benchmarks.cluster_check
+#   ./scripts/redis-cluster.sh stop
+
+BASE_PORT=${BASE_PORT:-7000}
+CLUSTER_DIR=${CLUSTER_DIR:-/tmp/gpu-redis-cluster}
+PORTS=$(seq $BASE_PORT $((BASE_PORT + 5)))
+
+if ! command -v redis-server &> /dev/null; then
+    echo "Error: redis-server not found. Please install Redis."
+    echo "  macOS: brew install redis"
+    echo "  Ubuntu: sudo apt-get install redis-server"
+    exit 1
+fi
+
+case "$1" in
+    start)
+        for port in $PORTS; do
+            mkdir -p "$CLUSTER_DIR/$port"
+            redis-server --port $port \
+                --cluster-enabled yes \
+                --cluster-config-file "$CLUSTER_DIR/$port/nodes.conf" \
+                --dir "$CLUSTER_DIR/$port" \
+                --appendonly no \
+                --save "" \
+                --daemonize yes
+        done
+        sleep 1
+
+        NODES=""
+        for port in $PORTS; do
+            NODES="$NODES 127.0.0.1:$port"
+        done
+        redis-cli --cluster create $NODES --cluster-replicas 1 --cluster-yes
+        echo "✓ Redis Cluster running on ports $BASE_PORT-$((BASE_PORT + 5))"
+        ;;
+    stop)
+        for port in $PORTS; do
+            redis-cli -p $port shutdown nosave > /dev/null 2>&1
+        done
+        rm -rf "$CLUSTER_DIR"
+        echo "✓ Redis Cluster stopped"
+        ;;
+    *)
+        echo "Usage: $0 {start|stop}"
+        exit 1
+        ;;
+esac